@@ -0,0 +1,166 @@
+"""Lot allocation
+
+``allocate`` splits a batch of ``{product_id: quantity}`` demands over
+inventory lots and returns ``(picks, available)``: a list of
+``(lot, quantity)`` and the usable quantity per product. The lots are
+grouped by product once, so the cost is one sort per product rather than
+a scan of every lot for every order line. The strategies that need more
+than the lot itself load it with one query for the whole batch:
+
+- ``fefo`` (default): earliest expiry first, lots without an expiry last
+- ``fifo``: oldest stock first, by the lot's first inbound movement
+- ``closest_zone``: lots in ``zone`` first, then FEFO (plain FEFO when
+  no zone is given)
+- ``fewest_picks``: the smallest lot that covers the whole line, otherwise
+  the largest lots first
+
+Expired lots are skipped unless ``include_expired`` is set, and
+``reservations.reserve_stock`` does not count them as available
+(``Product_Stock.expired``). Ties fall back to FEFO and then location_id,
+so the same stock always gives the same picks.
+"""
+
+from collections import defaultdict, namedtuple
+from datetime import date
+from sqlalchemy import func
+from models import db, InventoryMovement, Location
+
+DEFAULT_STRATEGY = 'fefo'
+
+# load(lots, options) -> data shared by the batch (or None)
+# order(product_lots, quantity, data, options) -> lots in pick order
+Strategy = namedtuple('Strategy', ['load', 'order'])
+
+
+class UnknownStrategy(ValueError):
+    """Raised for an allocation strategy name that is not registered"""
+
+
+def _fefo_key(lot):
+    return (lot.expiry_date is None, lot.expiry_date or date.max,
+            lot.location_id)
+
+
+def _order_fefo(product_lots, quantity, data, options):
+    return sorted(product_lots, key=_fefo_key)
+
+
+def _load_first_receipts(lots, options):
+    """First inbound movement date per ``(product_id, location_id)``"""
+    if not lots:
+        return {}
+    rows = db.session.query(
+        InventoryMovement.product_id, InventoryMovement.location_id,
+        func.min(InventoryMovement.movement_date)
+    ).filter(
+        InventoryMovement.product_id.in_({lot.product_id for lot in lots}),
+        InventoryMovement.quantity > 0
+    ).group_by(
+        InventoryMovement.product_id, InventoryMovement.location_id
+    ).all()
+    return {(product_id, location_id): received
+            for product_id, location_id, received in rows}
+
+
+def _order_fifo(product_lots, quantity, data, options):
+    # Lots with no recorded receipt predate the movement log: oldest
+    return sorted(product_lots, key=lambda lot: (
+        data.get((lot.product_id, lot.location_id)) is not None,
+        data.get((lot.product_id, lot.location_id)) or date.min,
+        _fefo_key(lot)))
+
+
+def _load_zones(lots, options):
+    location_ids = {lot.location_id for lot in lots}
+    if not location_ids:
+        return {}
+    return dict(db.session.query(Location.location_id, Location.zone).filter(
+        Location.location_id.in_(location_ids)).all())
+
+
+def _order_closest_zone(product_lots, quantity, data, options):
+    zone = options.get('zone')
+    if zone is None:
+        return _order_fefo(product_lots, quantity, data, options)
+    return sorted(product_lots, key=lambda lot: (
+        data.get(lot.location_id) != zone, _fefo_key(lot)))
+
+
+def _order_fewest_picks(product_lots, quantity, data, options):
+    covering = [lot for lot in product_lots if lot.quantity >= quantity]
+    if covering:
+        best = min(covering, key=lambda lot: (lot.quantity, _fefo_key(lot)))
+        return [best]
+    return sorted(product_lots, key=lambda lot: (-lot.quantity, _fefo_key(lot)))
+
+
+STRATEGIES = {
+    'fefo': Strategy(None, _order_fefo),
+    'fifo': Strategy(_load_first_receipts, _order_fifo),
+    'closest_zone': Strategy(_load_zones, _order_closest_zone),
+    'fewest_picks': Strategy(None, _order_fewest_picks),
+}
+
+
+def get_strategy(name):
+    """Registered strategy for ``name`` (None means the default)"""
+    strategy = STRATEGIES.get(name or DEFAULT_STRATEGY)
+    if strategy is None:
+        raise UnknownStrategy(
+            f'Unknown allocation strategy: {name}. '
+            f'Use one of: {", ".join(STRATEGIES)}')
+    return strategy
+
+
+def is_usable(lot, today, include_expired=False):
+    return lot.quantity > 0 and (
+        include_expired or lot.expiry_date is None or lot.expiry_date >= today)
+
+
+def allocate(lots, requested, strategy=None, include_expired=False,
+             today=None, **options):
+    """Split ``{product_id: quantity}`` over ``lots`` with ``strategy``
+
+    Returns ``(picks, available)``. A product whose usable lots cannot
+    cover its demand gets every usable unit picked and an ``available``
+    below the request; callers compare the two (``find_shortage``).
+    """
+    strategy = get_strategy(strategy)
+    today = today or date.today()
+
+    lots_by_product = defaultdict(list)
+    for lot in lots:
+        if lot.product_id in requested and is_usable(lot, today,
+                                                     include_expired):
+            lots_by_product[lot.product_id].append(lot)
+
+    data = None
+    if strategy.load is not None:
+        data = strategy.load(
+            [lot for product_lots in lots_by_product.values()
+             for lot in product_lots], options)
+
+    picks = []
+    available = {}
+    for product_id, quantity in requested.items():
+        product_lots = lots_by_product[product_id]
+        available[product_id] = sum(lot.quantity for lot in product_lots)
+
+        ordered = strategy.order(product_lots, quantity, data, options)
+        if len(ordered) < len(product_lots):
+            # The strategy only proposed the best lots; keep the rest as
+            # FEFO fallback so a short proposal never causes a shortage
+            chosen = {id(lot) for lot in ordered}
+            ordered += sorted((lot for lot in product_lots
+                               if id(lot) not in chosen), key=_fefo_key)
+
+        remaining_qty = quantity
+        for lot in ordered:
+            if remaining_qty <= 0:
+                break
+            take = min(lot.quantity, remaining_qty)
+            picks.append((lot, take))
+            remaining_qty -= take
+
+    return picks, available
+
@@ -153,6 +153,20 @@ def create_demo_users():
         print(f"Error creating demo users: {e}")
 
 
+def current_user_id(default=None):
+    """User id from the request's bearer token, or ``default`` without one
+
+    Uses the payload ``require_auth`` stored when the endpoint is protected,
+    otherwise decodes the Authorization header itself.
+    """
+    payload = getattr(request, 'current_user', None)
+    if payload is None:
+        auth_header = request.headers.get('Authorization', '')
+        if auth_header.startswith('Bearer '):
+            payload = decode_jwt_token(auth_header.split(' ')[1])
+    return payload.get('user_id', default) if payload else default
+
+
 def require_auth(f):
     """Decorator to require authentication"""
     from functools import wraps
@@ -0,0 +1,283 @@
+"""Autocomplete for the frontend pickers
+
+``GET /api/autocomplete/<entity>?q=<prefix>&limit=10`` answers from an
+in-memory prefix index instead of the list endpoints. Each entity keeps a
+sorted array of ``(term, id)`` pairs; a lookup is one ``bisect`` plus a
+walk over the matching run, and returns only ``id``, ``label`` and
+``detail``.
+
+Terms are the lower-cased searchable fields and every word inside them, so
+``bolt`` finds "M3 Hex Bolt". An index is loaded from its table on first
+use and then updated in place from committed ORM writes (session hooks
+below). Core statements against an indexed table mark it stale and it is
+reloaded on the next lookup; one thread reloads while the others keep
+serving the previous index. Every worker process keeps its own copy, so
+indexes are also reloaded after ``AUTOCOMPLETE_MAX_AGE`` seconds to pick up
+writes made by other workers.
+"""
+
+import os
+import threading
+import time
+from bisect import bisect_left, insort
+from flask import Blueprint, request, jsonify
+from sqlalchemy import event
+from models import db, Product, Customer, Location, Supplier
+from auth import require_auth
+
+autocomplete_bp = Blueprint('autocomplete', __name__,
+                            url_prefix='/api/autocomplete')
+
+AUTOCOMPLETE_MAX_AGE = int(os.getenv('AUTOCOMPLETE_MAX_AGE', 300))
+DEFAULT_LIMIT = 10
+MAX_LIMIT = 50
+
+_CHANGES_KEY = 'autocomplete_changes'
+
+
+def _terms(values):
+    """Lower-cased field values plus each word that starts inside them"""
+    terms = set()
+    for value in values:
+        value = (value or '').strip().lower()
+        if not value:
+            continue
+        terms.add(value)
+        words = value.split()
+        for i in range(1, len(words)):
+            terms.add(' '.join(words[i:]))
+    return terms
+
+
+class PrefixIndex:
+    """Sorted ``(term, id)`` array with prefix lookup, thread-safe"""
+
+    def __init__(self, model, id_column, label_column, detail_column,
+                 search_columns):
+        self.model = model
+        self.id_column = id_column
+        self.label_column = label_column
+        self.detail_column = detail_column
+        self.search_columns = search_columns
+        self._lock = threading.Lock()
+        # Held for the duration of a reload, so only one thread rebuilds
+        self._load_lock = threading.Lock()
+        self._keys = []
+        self._items = {}
+        self._loaded_at = None
+        self._ready = False
+        # Changes committed while a reload runs, replayed onto its result
+        self._replay = None
+
+    def _columns(self):
+        return [self.id_column, self.label_column, self.detail_column,
+                *self.search_columns]
+
+    def _entry(self, row):
+        entry_id, label, detail, *values = row
+        return entry_id, {'id': entry_id, 'label': label,
+                          'detail': detail}, _terms(values)
+
+    def load(self):
+        """Rebuild the whole index from the table
+
+        Single-flight: while one thread reloads, the others keep answering
+        from the current index (they only wait for the very first load).
+        Upserts and removes committed during the reload are replayed onto
+        the new index, and a ``mark_stale`` during it leaves the new index
+        stale, since the reload may have read the table before that write.
+        """
+        if not self._load_lock.acquire(blocking=not self._ready):
+            return
+        try:
+            if self._ready and not self.is_stale():
+                return
+            with self._lock:
+                self._replay = []
+            items = {}
+            keys = []
+            try:
+                for row in db.session.query(*self._columns()).yield_per(10000):
+                    entry_id, payload, terms = self._entry(row)
+                    items[entry_id] = (payload, terms)
+                    keys.extend((term, entry_id) for term in terms)
+                keys.sort()
+            except Exception:
+                with self._lock:
+                    self._replay = None
+                raise
+            with self._lock:
+                replay, self._replay = self._replay, None
+                self._keys = keys
+                self._items = items
+                self._ready = True
+                self._loaded_at = time.monotonic()
+                for action, target in replay:
+                    if action == 'upsert':
+                        self._upsert_locked(*self._entry(target))
+                    elif action == 'remove':
+                        self._remove_locked(target)
+                    else:
+                        self._loaded_at = None
+        finally:
+            self._load_lock.release()
+
+    def is_stale(self):
+        return (self._loaded_at is None or
+                time.monotonic() - self._loaded_at > AUTOCOMPLETE_MAX_AGE)
+
+    def mark_stale(self):
+        with self._lock:
+            if self._replay is not None:
+                self._replay.append(('stale', None))
+            self._loaded_at = None
+
+    def _remove_locked(self, entry_id):
+        old = self._items.pop(entry_id, None)
+        if old is None:
+            return
+        for term in old[1]:
+            i = bisect_left(self._keys, (term, entry_id))
+            if i < len(self._keys) and self._keys[i] == (term, entry_id):
+                del self._keys[i]
+
+    def row_of(self, obj):
+        return [getattr(obj, column.key) for column in self._columns()]
+
+    def _upsert_locked(self, entry_id, payload, terms):
+        self._remove_locked(entry_id)
+        self._items[entry_id] = (payload, terms)
+        for term in terms:
+            insort(self._keys, (term, entry_id))
+
+    def upsert(self, row):
+        entry = self._entry(row)
+        with self._lock:
+            if self._replay is not None:
+                self._replay.append(('upsert', row))
+            if self._loaded_at is None:
+                return
+            self._upsert_locked(*entry)
+
+    def remove(self, entry_id):
+        with self._lock:
+            if self._replay is not None:
+                self._replay.append(('remove', entry_id))
+            self._remove_locked(entry_id)
+
+    def lookup(self, prefix, limit=DEFAULT_LIMIT):
+        """Up to ``limit`` entries with a term starting with ``prefix``"""
+        prefix = prefix.strip().lower()
+        if not prefix:
+            return []
+        results = []
+        seen = set()
+        with self._lock:
+            i = bisect_left(self._keys, (prefix,))
+            while i < len(self._keys) and len(results) < limit:
+                term, entry_id = self._keys[i]
+                if not term.startswith(prefix):
+                    break
+                if entry_id not in seen:
+                    seen.add(entry_id)
+                    results.append(self._items[entry_id][0])
+                i += 1
+        return results
+
+
+INDEXES = {
+    'products': PrefixIndex(Product, Product.product_id, Product.name,
+                            Product.category, (Product.name,)),
+    'customers': PrefixIndex(Customer, Customer.customer_id, Customer.name,
+                             Customer.contact,
+                             (Customer.name, Customer.contact)),
+    'locations': PrefixIndex(Location, Location.location_id,
+                             Location.location_code, Location.location_name,
+                             (Location.location_code, Location.location_name)),
+    'suppliers': PrefixIndex(Supplier, Supplier.supplier_id,
+                             Supplier.supplier_name, Supplier.contact_name,
+                             (Supplier.supplier_name, Supplier.contact_name)),
+}
+
+_INDEX_BY_TABLE = {index.model.__tablename__: index
+                   for index in INDEXES.values()}
+
+
+def _index_for(obj):
+    return _INDEX_BY_TABLE.get(getattr(obj, '__tablename__', None))
+
+
+@autocomplete_bp.route('/<entity>', methods=['GET'])
+@require_auth
+def autocomplete(entity):
+    """Top-N prefix matches for a picker"""
+    try:
+        index = INDEXES.get(entity)
+        if index is None:
+            return jsonify({
+                'success': False,
+                'error': f'Unknown entity. Use one of: {", ".join(INDEXES)}'
+            }), 404
+
+        limit = min(max(request.args.get('limit', DEFAULT_LIMIT, type=int), 1),
+                    MAX_LIMIT)
+        if index.is_stale():
+            index.load()
+
+        return jsonify({
+            'success': True,
+            'data': index.lookup(request.args.get('q', ''), limit)
+        })
+
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': f'Failed to autocomplete {entity}: {str(e)}'
+        }), 500
+
+
+def _pending_changes(session):
+    return session.info.setdefault(_CHANGES_KEY, [])
+
+
+@event.listens_for(db.session, 'after_flush')
+def _record_flushed_entries(session, flush_context):
+    changes = _pending_changes(session)
+    for obj in list(session.new) + list(session.dirty):
+        index = _index_for(obj)
+        if index is not None and obj not in session.deleted:
+            # Read the values now; objects are expired after the commit
+            changes.append(('upsert', index, index.row_of(obj)))
+    for obj in session.deleted:
+        index = _index_for(obj)
+        if index is not None:
+            changes.append(('remove', index,
+                            getattr(obj, index.id_column.key)))
+
+
+@event.listens_for(db.session, 'do_orm_execute')
+def _record_bulk_statements(orm_execute_state):
+    if not (orm_execute_state.is_insert or orm_execute_state.is_update
+            or orm_execute_state.is_delete):
+        return
+    table = getattr(orm_execute_state.statement, 'table', None)
+    index = _INDEX_BY_TABLE.get(getattr(table, 'name', None))
+    if index is not None:
+        _pending_changes(orm_execute_state.session).append(
+            ('stale', index, None))
+
+
+@event.listens_for(db.session, 'after_commit')
+def _apply_committed_entries(session):
+    for action, index, target in session.info.pop(_CHANGES_KEY, []):
+        if action == 'upsert':
+            index.upsert(target)
+        elif action == 'remove':
+            index.remove(target)
+        else:
+            index.mark_stale()
+
+
+@event.listens_for(db.session, 'after_rollback')
+def _discard_entries(session):
+    session.info.pop(_CHANGES_KEY, None)
@@ -3,6 +3,8 @@ from models import db, Customer, Order
 from auth import require_auth, require_role
 from sqlalchemy import func
 from datetime import datetime, timedelta
+from stats import customer_stats
+from search import apply_search, fuzzy_requested, CUSTOMER_SEARCH_COLUMNS
 
 customers_bp = Blueprint('customers', __name__, url_prefix='/api/customers')
 
@@ -18,11 +20,9 @@ def get_customers():
         query = Customer.query
 
         if search:
-            query = query.filter(
-                Customer.name.contains(search) |
-                Customer.contact.contains(search) |
-                Customer.address.contains(search)
-            )
+            query = apply_search(query, CUSTOMER_SEARCH_COLUMNS, search,
+                                 fuzzy_requested(request.args))
+        query = query.order_by(Customer.customer_id.asc())
 
         pagination = query.paginate(
             page=page,
@@ -30,9 +30,7 @@ def get_customers():
             error_out=False
         )
 
-        customers = []
-        for customer in pagination.items:
-            customers.append(customer.to_dict())
+        customers = Customer.to_dict_list(pagination.items)
 
         return jsonify({
             'success': True,
@@ -56,8 +54,10 @@ def get_customer(customer_id):
         customer = Customer.query.get_or_404(customer_id)
 
         # Get recent orders
+        recent_orders = Order.query.filter_by(customer_id=customer_id).order_by(
+            Order.order_date.desc()).limit(5).all()
         orders = []
-        for order in customer.orders[:5]:  # Last 5 orders
+        for order in recent_orders:  # Last 5 orders
             orders.append({
                 'order_id': order.order_id,
                 'order_date': order.order_date.isoformat(),
@@ -65,8 +65,8 @@ def get_customer(customer_id):
                 'ship_to': order.ship_to
             })
 
-        customer_data = customer.to_dict()
-        customer_data['total_orders'] = len(customer.orders)
+        customer_data = Customer.to_dict_list([customer])[0]
+        customer_data['total_orders'] = customer_data['orders_count']
         customer_data['recent_orders'] = orders
 
         return jsonify({
@@ -113,7 +113,7 @@ def create_customer():
 
         return jsonify({
             'success': True,
-            'data': customer.to_dict()
+            'data': Customer.to_dict_list([customer])[0]
         }), 201
 
     except Exception as e:
@@ -169,7 +169,7 @@ def update_customer(customer_id):
 
         return jsonify({
             'success': True,
-            'data': customer.to_dict()
+            'data': Customer.to_dict_list([customer])[0]
         })
 
     except Exception as e:
@@ -184,10 +184,11 @@ def delete_customer(customer_id):
         customer = Customer.query.get_or_404(customer_id)
 
         # Check if customer has orders
-        if customer.orders:
+        orders_count = Order.query.filter_by(customer_id=customer_id).count()
+        if orders_count:
             return jsonify({
                 'success': False,
-                'error': f'Cannot delete customer with {len(customer.orders)} existing orders'
+                'error': f'Cannot delete customer with {orders_count} existing orders'
             }), 400
 
         db.session.delete(customer)
@@ -259,18 +260,8 @@ def get_customer_orders(customer_id):
 def get_customer_stats():
     """Get customer statistics"""
     try:
-        # Total customers
-        total_customers = Customer.query.count()
-
-        # Active customers
-        active_customers = Customer.query.filter_by(status='active').count()
-
-        # New customers this month
-        today = datetime.now()
-        month_start = datetime(today.year, today.month, 1)
-        new_customers_month = Customer.query.filter(
-            Customer.created_at >= month_start
-        ).count()
+        # Totals, active and new-this-month counts in one scan
+        stats = customer_stats()
 
         # Customer by type
         customer_by_type = db.session.query(
@@ -307,9 +298,7 @@ def get_customer_stats():
         return jsonify({
             'success': True,
             'data': {
-                'total_customers': total_customers,
-                'active_customers': active_customers,
-                'new_customers_month': new_customers_month,
+                **stats,
                 'customer_by_type': type_breakdown,
                 'customer_by_level': level_breakdown,
                 'top_customers': top_customers_list
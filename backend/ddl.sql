@@ -1,3 +1,6 @@
+-- ngram FULLTEXT 索引不可套用預設停用詞表（含 a、i 等單字母，會丟掉大部分英文 bigram），建索引前關閉
+SET SESSION innodb_ft_enable_stopword = 0;
+
 -- 1. Product
 CREATE TABLE Product (
   product_id INT NOT NULL AUTO_INCREMENT,
@@ -6,15 +9,24 @@ CREATE TABLE Product (
   warranty_years INT NOT NULL,
   image_url VARCHAR(255),
   reorder_point NOT NULL DEFAULT 10, --安全庫存點
-  PRIMARY KEY (product_id)
+  PRIMARY KEY (product_id),
+  FULLTEXT INDEX ft_product_search (name, category) WITH PARSER ngram -- ?search= 全文檢索
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
 
 -- 2. Supplier
 CREATE TABLE Supplier (
   supplier_id INT NOT NULL AUTO_INCREMENT,
   supplier_name VARCHAR(100) NOT NULL,
-  contact VARCHAR(100),
-  PRIMARY KEY (supplier_id)
+  contact_name VARCHAR(100),
+  phone VARCHAR(20),
+  email VARCHAR(100),
+  address VARCHAR(255),
+  supplier_type VARCHAR(50),
+  status VARCHAR(20) DEFAULT 'active',
+  notes TEXT,
+  created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+  PRIMARY KEY (supplier_id),
+  FULLTEXT INDEX ft_supplier_search (supplier_name, contact_name, email) WITH PARSER ngram
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
 
 -- 2.1 Supplier_Product (Many-to-Many)
@@ -51,7 +63,8 @@ CREATE TABLE Customer (
   INDEX idx_customer_type (customer_type),
   INDEX idx_customer_level (customer_level),
   INDEX idx_customer_status (status),
-  INDEX idx_customer_email (email)
+  INDEX idx_customer_email (email),
+  FULLTEXT INDEX ft_customer_search (name, contact, address) WITH PARSER ngram
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
 
 -- 4. User
@@ -61,6 +74,7 @@ CREATE TABLE `User` (
   pwd_hash VARCHAR(255) NOT NULL,
   role_id INT NOT NULL,
   PRIMARY KEY (user_id),
+  FULLTEXT INDEX ft_user_search (account) WITH PARSER ngram,
   CONSTRAINT fk_user_role
     FOREIGN KEY (role_id) REFERENCES Role(role_id)
     ON DELETE RESTRICT ON UPDATE CASCADE
@@ -122,6 +136,7 @@ CREATE TABLE `Order` (
   INDEX idx_order_status (status),
   INDEX idx_order_priority (priority),
   INDEX idx_order_date (order_date),
+  INDEX idx_order_expected_delivery (expected_delivery_date),
   CONSTRAINT fk_ord_customer
     FOREIGN KEY (customer_id) REFERENCES Customer(customer_id)
     ON DELETE RESTRICT ON UPDATE CASCADE,
@@ -149,6 +164,13 @@ CREATE TABLE Order_Item (
     ON DELETE RESTRICT ON UPDATE CASCADE
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
 
+-- 7.2 Order_Number_Sequence
+CREATE TABLE Order_Number_Sequence (
+  name VARCHAR(50) NOT NULL,
+  next_value BIGINT NOT NULL DEFAULT 1, -- 下一個尚未發出的流水號，由 order_numbers.py 分段預留
+  PRIMARY KEY (name)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
 -- 8. Shipment
 CREATE TABLE Shipment (
   shipment_id INT NOT NULL AUTO_INCREMENT,
@@ -189,6 +211,7 @@ CREATE TABLE Location (
   location_type VARCHAR(50) NOT NULL DEFAULT 'storage',
   capacity INT NOT NULL DEFAULT 0,
   status VARCHAR(20) NOT NULL DEFAULT 'active',
+  current_stock INT NOT NULL DEFAULT 0, -- SUM(Inventory_Lot.quantity)，由 stock.py 維護
   notes TEXT,
   created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
   updated_at DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
@@ -196,7 +219,8 @@ CREATE TABLE Location (
   INDEX idx_location_code (location_code),
   INDEX idx_location_zone (zone),
   INDEX idx_location_type (location_type),
-  INDEX idx_location_status (status)
+  INDEX idx_location_status (status),
+  FULLTEXT INDEX ft_location_search (location_code, location_name, zone, shelf) WITH PARSER ngram
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
 
 -- 9.1 Inventory_Lot
@@ -205,9 +229,11 @@ CREATE TABLE Inventory_Lot (
   location_id INT NOT NULL,
   quantity INT NOT NULL DEFAULT 0,
   expiry_date DATE,
+  search_key VARCHAR(255), -- 產品名稱 + 儲位代碼/區域/層架，由 search.py 維護
   PRIMARY KEY (product_id, location_id),
   INDEX idx_il_product (product_id),
   INDEX idx_il_location (location_id),
+  FULLTEXT INDEX ft_lot_search (search_key) WITH PARSER ngram,
   CONSTRAINT fk_il_product
     FOREIGN KEY (product_id) REFERENCES Product(product_id)
     ON DELETE CASCADE ON UPDATE CASCADE,
@@ -216,6 +242,46 @@ CREATE TABLE Inventory_Lot (
     ON DELETE CASCADE ON UPDATE CASCADE
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
 
+-- 9.2 Product_Stock
+CREATE TABLE Product_Stock (
+  product_id INT NOT NULL,
+  on_hand INT NOT NULL DEFAULT 0,  -- SUM(Inventory_Lot.quantity)，由 stock.py 維護
+  reserved INT NOT NULL DEFAULT 0, -- 已保留給訂單但尚未揀貨的數量
+  expired INT NOT NULL DEFAULT 0,  -- 已過期批號中的數量，每日由 refresh_expired_stock.py 更新
+  PRIMARY KEY (product_id),
+  CONSTRAINT fk_ps_product
+    FOREIGN KEY (product_id) REFERENCES Product(product_id)
+    ON DELETE CASCADE ON UPDATE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+-- 9.3 Inventory_Reservation
+CREATE TABLE Inventory_Reservation (
+  reservation_id INT NOT NULL AUTO_INCREMENT,
+  order_id INT NOT NULL,
+  order_item_id INT NOT NULL,
+  product_id INT NOT NULL,
+  location_id INT,                                -- 揀貨後記錄出貨的儲位，保留中為 NULL
+  quantity INT NOT NULL,
+  status VARCHAR(20) NOT NULL DEFAULT 'reserved', -- reserved / picked / released（取消或刪除後保留，避免重複回補）
+  created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+  PRIMARY KEY (reservation_id),
+  INDEX idx_reservation_product_status (product_id, status, quantity),
+  INDEX idx_reservation_order (order_id),
+  INDEX idx_reservation_order_item (order_item_id),
+  CONSTRAINT fk_res_order
+    FOREIGN KEY (order_id) REFERENCES `Order`(order_id)
+    ON DELETE CASCADE ON UPDATE CASCADE,
+  CONSTRAINT fk_res_order_item
+    FOREIGN KEY (order_item_id) REFERENCES Order_Item(order_item_id)
+    ON DELETE CASCADE ON UPDATE CASCADE,
+  CONSTRAINT fk_res_product
+    FOREIGN KEY (product_id) REFERENCES Product(product_id)
+    ON DELETE RESTRICT ON UPDATE CASCADE,
+  CONSTRAINT fk_res_location
+    FOREIGN KEY (location_id) REFERENCES Location(location_id)
+    ON DELETE SET NULL ON UPDATE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
 -- 10. Scrap
 CREATE TABLE Scrap (
   scrap_id INT NOT NULL AUTO_INCREMENT,
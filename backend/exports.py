@@ -0,0 +1,272 @@
+from flask import Blueprint, Response, request, jsonify, stream_with_context
+from models import (db, Order, Customer, User, Shipment, ShippingVendor,
+                    InventoryLot, InventoryMovement, Product, Location, Scrap)
+from orders import filter_orders
+from shipments import filter_shipments
+from scrap import filter_scrap
+from inventory import filter_inventory_lots, filter_movements, NO_EXPIRY
+from sqlalchemy import func
+from datetime import date, datetime
+from decimal import Decimal
+from itertools import chain
+import csv
+import io
+import json
+
+exports_bp = Blueprint('exports', __name__, url_prefix='/api/exports')
+
+# Rows fetched per round trip from the server-side cursor
+EXPORT_BATCH_SIZE = 1000
+
+
+def _json_value(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    return value
+
+
+def _ndjson_lines(columns, rows):
+    for row in rows:
+        yield json.dumps(
+            {column: _json_value(value) for column, value in zip(columns, row)},
+            ensure_ascii=False
+        ) + '\n'
+
+
+def _csv_lines(columns, rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    def flush():
+        data = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate(0)
+        return data
+
+    writer.writerow(columns)
+    yield flush()
+    for row in rows:
+        writer.writerow([_json_value(value) for value in row])
+        yield flush()
+
+
+def stream_export(query, name):
+    """Stream ``query`` as NDJSON (default) or CSV (``?format=csv``)
+
+    Rows come from a server-side cursor in batches of EXPORT_BATCH_SIZE and
+    are written out one at a time, so memory stays flat however many rows
+    the export has.
+    """
+    export_format = request.args.get('format', 'ndjson').lower()
+    if export_format not in ('ndjson', 'csv'):
+        return jsonify({
+            'success': False,
+            'error': 'Invalid format. Use ndjson or csv'
+        }), 400
+
+    columns = [column['name'] for column in query.column_descriptions]
+
+    # Execute before the response starts so query errors still get a JSON
+    # error response instead of a truncated download
+    rows = iter(query.execution_options(
+        stream_results=True, yield_per=EXPORT_BATCH_SIZE))
+    first = next(rows, None)
+    if first is not None:
+        rows = chain([first], rows)
+
+    stamp = date.today().strftime('%Y%m%d')
+    if export_format == 'csv':
+        body, mimetype = _csv_lines(columns, rows), 'text/csv'
+    else:
+        body, mimetype = _ndjson_lines(columns, rows), 'application/x-ndjson'
+
+    return Response(
+        stream_with_context(body),
+        mimetype=mimetype,
+        headers={
+            'Content-Disposition':
+                f'attachment; filename={name}_{stamp}.{export_format}'
+        }
+    )
+
+
+@exports_bp.route('/orders', methods=['GET'])
+def export_orders():
+    """Export orders (same filters as GET /api/orders)"""
+    try:
+        query = db.session.query(
+            Order.order_id,
+            Order.order_number,
+            Order.order_date,
+            Order.expected_delivery_date,
+            Order.status,
+            Order.priority,
+            Order.customer_id,
+            Customer.name.label('customer_name'),
+            User.account.label('sales_rep'),
+            Order.ship_to,
+            Order.total_amount
+        ).join(Customer, Order.customer_id == Customer.customer_id
+               ).join(User, Order.user_id == User.user_id)
+        query = filter_orders(query, request.args).order_by(
+            Order.order_date.desc(), Order.order_id.desc())
+
+        return stream_export(query, 'orders')
+
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': f'Failed to export orders: {str(e)}'
+        }), 500
+
+
+@exports_bp.route('/shipments', methods=['GET'])
+def export_shipments():
+    """Export shipments (same filters as GET /api/shipments)"""
+    try:
+        query = db.session.query(
+            Shipment.shipment_id,
+            Shipment.tracking_no,
+            Shipment.ship_date,
+            Shipment.status,
+            Shipment.estimated_delivery_date,
+            Shipment.actual_delivery_date,
+            Shipment.shipping_method,
+            Shipment.order_id,
+            Order.order_number,
+            Shipment.shipping_vendor_id,
+            ShippingVendor.name.label('vendor_name')
+        ).join(Order, Shipment.order_id == Order.order_id
+               ).join(ShippingVendor,
+                      Shipment.shipping_vendor_id == ShippingVendor.user_id)
+        query = filter_shipments(query, request.args).order_by(
+            Shipment.ship_date.desc(), Shipment.shipment_id.desc())
+
+        return stream_export(query, 'shipments')
+
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': f'Failed to export shipments: {str(e)}'
+        }), 500
+
+
+@exports_bp.route('/scrap', methods=['GET'])
+def export_scrap():
+    """Export scrap records (same filters as GET /api/scrap)"""
+    try:
+        query = db.session.query(
+            Scrap.scrap_id,
+            Scrap.scrap_date,
+            Scrap.product_id,
+            Product.name.label('product_name'),
+            Scrap.location_id,
+            Location.location_code,
+            Scrap.quantity,
+            Scrap.reason,
+            Scrap.status,
+            Scrap.estimated_value,
+            Scrap.created_by
+        ).join(Product, Scrap.product_id == Product.product_id
+               ).join(Location, Scrap.location_id == Location.location_id)
+        try:
+            query = filter_scrap(query, request.args)
+        except ValueError as e:
+            return jsonify({
+                'success': False,
+                'error': str(e)
+            }), 400
+        query = query.order_by(Scrap.scrap_date.desc(), Scrap.scrap_id.desc())
+
+        return stream_export(query, 'scrap')
+
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': f'Failed to export scrap records: {str(e)}'
+        }), 500
+
+
+@exports_bp.route('/inventory', methods=['GET'])
+def export_inventory():
+    """Export inventory lots (same filters as GET /api/inventory)"""
+    try:
+        query = db.session.query(
+            InventoryLot.product_id,
+            Product.name.label('product_name'),
+            Product.category,
+            InventoryLot.location_id,
+            Location.location_code,
+            Location.zone,
+            Location.shelf,
+            InventoryLot.quantity,
+            InventoryLot.expiry_date
+        ).join(Product, InventoryLot.product_id == Product.product_id
+               ).join(Location, InventoryLot.location_id == Location.location_id)
+        query = filter_inventory_lots(query, request.args).order_by(
+            InventoryLot.quantity.asc(),
+            func.coalesce(InventoryLot.expiry_date, NO_EXPIRY).asc(),
+            InventoryLot.product_id.asc(),
+            InventoryLot.location_id.asc())
+
+        return stream_export(query, 'inventory')
+
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': f'Failed to export inventory: {str(e)}'
+        }), 500
+
+
+@exports_bp.route('/movements', methods=['GET'])
+def export_movements():
+    """Export inventory movements
+
+    Takes the GET /api/inventory/movements/<product_id> filters, with
+    ``product_id`` and ``movement_type`` as optional query parameters.
+    """
+    try:
+        product_id = request.args.get('product_id', type=int)
+        movement_type = request.args.get('movement_type')
+
+        query = db.session.query(
+            InventoryMovement.movement_id,
+            InventoryMovement.movement_date,
+            InventoryMovement.movement_type,
+            InventoryMovement.product_id,
+            InventoryMovement.location_id,
+            InventoryMovement.quantity,
+            InventoryMovement.previous_quantity,
+            InventoryMovement.new_quantity,
+            InventoryMovement.unit_cost,
+            InventoryMovement.total_value,
+            InventoryMovement.reference_type,
+            InventoryMovement.reference_number,
+            InventoryMovement.from_location_id,
+            InventoryMovement.to_location_id,
+            InventoryMovement.reason
+        )
+        if product_id:
+            query = query.filter(InventoryMovement.product_id == product_id)
+        if movement_type:
+            query = query.filter(
+                InventoryMovement.movement_type == movement_type)
+        try:
+            query = filter_movements(query, request.args)
+        except ValueError as e:
+            return jsonify({
+                'success': False,
+                'error': str(e)
+            }), 400
+        query = query.order_by(InventoryMovement.movement_date.asc(),
+                               InventoryMovement.movement_id.asc())
+
+        return stream_export(query, 'movements')
+
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': f'Failed to export inventory movements: {str(e)}'
+        }), 500
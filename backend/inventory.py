@@ -1,54 +1,109 @@
 from flask import Blueprint, request, jsonify
 from models import db, InventoryLot, Product, Location, InventoryMovement
 from datetime import datetime, date, timedelta
-from sqlalchemy import func, and_, desc
+from sqlalchemy import func, and_, bindparam, insert, select, tuple_, update
 from sqlalchemy.exc import IntegrityError
+from stats import inventory_stats
+from pagination import paginate_query, InvalidCursor
+from search import search_filter, fuzzy_requested, LOT_SEARCH_COLUMNS
+from auth import current_user_id
+from stock import (adjust_stock, apply_lot_delta, discard_empty_lots,
+                   ensure_lots, lock_lots, InsufficientStock, LotNotFound)
+
+# Sort value for lots without an expiry date (before any real date)
+NO_EXPIRY = date(1000, 1, 1)
+
+# Keys per IN query when resolving bulk payloads
+BULK_CHUNK_SIZE = 1000
 
 inventory_bp = Blueprint('inventory', __name__, url_prefix='/api/inventory')
 
 
+def filter_inventory_lots(query, args):
+    """Apply the inventory list filters in ``args`` to a query joined with Product and Location"""
+    product_filter = args.get('product_id', type=int)
+    location_filter = args.get('location_id', type=int)
+    zone_filter = args.get('zone', '').strip()
+    low_stock = args.get('low_stock', type=bool)
+    search = args.get('search', '').strip()
+
+    if product_filter:
+        query = query.filter(InventoryLot.product_id == product_filter)
+    if location_filter:
+        query = query.filter(InventoryLot.location_id == location_filter)
+    if zone_filter:
+        query = query.filter(Location.zone == zone_filter)
+    if low_stock:
+        # Consider low stock as quantity <= 10
+        query = query.filter(InventoryLot.quantity <= 10)
+    if search:
+        # Indexed precomputed key instead of concatenating the join per row
+        criterion, _ = search_filter(LOT_SEARCH_COLUMNS, search,
+                                     fuzzy_requested(args))
+        if criterion is not None:
+            query = query.filter(criterion)
+    return query
+
+
+def filter_movements(query, args):
+    """Apply the movement history filters in ``args``
+
+    Raises ValueError for a malformed date.
+    """
+    start_date = args.get('start_date')
+    end_date = args.get('end_date')
+    location_id = args.get('location_id', type=int)
+
+    if start_date:
+        try:
+            start_dt = datetime.strptime(start_date, '%Y-%m-%d')
+        except ValueError:
+            raise ValueError('Invalid start_date format. Use YYYY-MM-DD')
+        query = query.filter(InventoryMovement.movement_date >= start_dt)
+
+    if end_date:
+        try:
+            end_dt = datetime.strptime(
+                end_date, '%Y-%m-%d') + timedelta(days=1)
+        except ValueError:
+            raise ValueError('Invalid end_date format. Use YYYY-MM-DD')
+        query = query.filter(InventoryMovement.movement_date < end_dt)
+
+    if location_id:
+        query = query.filter(InventoryMovement.location_id == location_id)
+
+    return query
+
+
+def missing_lot_reference(product_id, location_id):
+    """Error message if the product or location does not exist, else None"""
+    if not db.session.get(Product, product_id):
+        return 'Product not found'
+    if not db.session.get(Location, location_id):
+        return 'Location not found'
+    return None
+
+
 @inventory_bp.route('', methods=['GET'])
 def get_inventory():
     """Get all inventory lots with pagination and filtering"""
     try:
-        page = request.args.get('page', 1, type=int)
-        per_page = request.args.get('per_page', 10, type=int)
-        product_filter = request.args.get('product_id', type=int)
-        location_filter = request.args.get('location_id', type=int)
-        zone_filter = request.args.get('zone', '').strip()
-        low_stock = request.args.get('low_stock', type=bool)
-        search = request.args.get('search', '').strip()
-
         # Build query with joins
         query = db.session.query(InventoryLot).join(Product).join(Location)
-
-        # Apply filters
-        if product_filter:
-            query = query.filter(InventoryLot.product_id == product_filter)
-        if location_filter:
-            query = query.filter(InventoryLot.location_id == location_filter)
-        if zone_filter:
-            query = query.filter(Location.zone == zone_filter)
-        if low_stock:
-            # Consider low stock as quantity <= 10
-            query = query.filter(InventoryLot.quantity <= 10)
-        if search:
-            query = query.filter(
-                func.concat(Product.name, ' ', Location.zone,
-                            ' ', Location.shelf).contains(search)
-            )
-
-        # Order by quantity (low stock first) then by expiry date
-        query = query.order_by(InventoryLot.quantity.asc(),
-                               InventoryLot.expiry_date.asc())
-
-        # Paginate
-        pagination = query.paginate(
-            page=page, per_page=per_page, error_out=False
-        )
+        query = filter_inventory_lots(query, request.args)
+
+        # Low stock first, then by expiry date (lots without one first, as
+        # MySQL sorts NULLs); page or cursor mode
+        items, pagination = paginate_query(query, [
+            (InventoryLot.quantity, False),
+            (func.coalesce(InventoryLot.expiry_date, NO_EXPIRY), False),
+            (InventoryLot.product_id, False),
+            (InventoryLot.location_id, False)
+        ], row_key=lambda lot: [lot.quantity, lot.expiry_date or NO_EXPIRY,
+                                lot.product_id, lot.location_id])
 
         inventory_lots = []
-        for lot in pagination.items:
+        for lot in items:
             # Determine stock status
             stock_status = 'Good'
             if lot.quantity <= 5:
@@ -86,16 +141,14 @@ def get_inventory():
         return jsonify({
             'success': True,
             'data': inventory_lots,
-            'pagination': {
-                'page': pagination.page,
-                'pages': pagination.pages,
-                'per_page': pagination.per_page,
-                'total': pagination.total,
-                'has_next': pagination.has_next,
-                'has_prev': pagination.has_prev
-            }
+            'pagination': pagination
         })
 
+    except InvalidCursor as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
     except Exception as e:
         return jsonify({
             'success': False,
@@ -343,45 +396,120 @@ def delete_inventory_lot(product_id, location_id):
 def bulk_update_inventory():
     """Bulk update multiple inventory lots"""
     try:
-        data = request.get_json()
+        data = request.get_json(silent=True)
 
-        if 'updates' not in data or not isinstance(data['updates'], list):
+        if (not isinstance(data, dict) or 'updates' not in data
+                or not isinstance(data['updates'], list)):
             return jsonify({
                 'success': False,
                 'error': 'Missing or invalid updates array'
             }), 400
 
-        updated_count = 0
         errors = []
+        changes = {}
 
-        for update in data['updates']:
+        # Validate every row up front; a later row for the same lot wins
+        for item in data['updates']:
+            if not isinstance(item, dict):
+                errors.append(f"Invalid update (expected an object): {item!r}")
+                continue
             try:
-                lot = InventoryLot.query.filter(
-                    and_(InventoryLot.product_id == update['product_id'],
-                         InventoryLot.location_id == update['location_id'])
-                ).first()
-
-                if lot:
-                    if 'quantity' in update:
-                        lot.quantity = update['quantity']
-                    if 'expiry_date' in update and update['expiry_date']:
-                        lot.expiry_date = datetime.strptime(
-                            update['expiry_date'], '%Y-%m-%d').date()
-                    updated_count += 1
-                else:
-                    errors.append(
-                        f"Lot not found: Product {update['product_id']}, Location {update['location_id']}")
+                key = (int(item['product_id']), int(item['location_id']))
+                quantity = None
+                if 'quantity' in item:
+                    quantity = int(item['quantity'])
+                    if quantity < 0:
+                        raise ValueError('quantity cannot be negative')
+                expiry_date = None
+                if 'expiry_date' in item and item['expiry_date']:
+                    expiry_date = datetime.strptime(
+                        item['expiry_date'], '%Y-%m-%d').date()
+                changes[key] = (quantity, expiry_date)
 
             except Exception as e:
                 errors.append(
-                    f"Error updating Product {update['product_id']}, Location {update['location_id']}: {str(e)}")
+                    f"Error updating Product {item.get('product_id')}, Location {item.get('location_id')}: {str(e)}")
+
+        # Resolve and lock the existing lots in a few IN queries
+        lot_table = InventoryLot.__table__
+        current = {}
+        keys = sorted(changes)
+        for i in range(0, len(keys), BULK_CHUNK_SIZE):
+            chunk = keys[i:i + BULK_CHUNK_SIZE]
+            rows = db.session.execute(
+                select(lot_table.c.product_id, lot_table.c.location_id,
+                       lot_table.c.quantity)
+                .where(tuple_(lot_table.c.product_id,
+                              lot_table.c.location_id).in_(chunk))
+                .order_by(lot_table.c.product_id, lot_table.c.location_id)
+                .with_for_update()
+            )
+            for product_id, location_id, quantity in rows:
+                current[(product_id, location_id)] = quantity
+
+        params = []
+        movements = []
+        lot_deltas = {}
+        now = datetime.utcnow()
+        reference_number = f'BULK-{datetime.now().strftime("%Y%m%d%H%M%S")}'
+        for key in keys:
+            if key not in current:
+                errors.append(
+                    f"Lot not found: Product {key[0]}, Location {key[1]}")
+                continue
+
+            quantity, expiry_date = changes[key]
+            params.append({
+                'b_product_id': key[0],
+                'b_location_id': key[1],
+                'b_quantity': quantity,
+                'b_expiry_date': expiry_date
+            })
 
+            previous_quantity = current[key]
+            if quantity is not None and quantity != previous_quantity:
+                lot_deltas[key] = quantity - previous_quantity
+                movements.append({
+                    'product_id': key[0],
+                    'location_id': key[1],
+                    'movement_type': 'adjustment',
+                    'quantity': quantity - previous_quantity,
+                    'previous_quantity': previous_quantity,
+                    'new_quantity': quantity,
+                    'reference_type': 'bulk_update',
+                    'reference_number': reference_number,
+                    'reason': data.get('reason', '批量調整'),
+                    'user_id': current_user_id(),
+                    'movement_date': now
+                })
+
+        # One executemany UPDATE; fields left out of a row keep their value
+        if params:
+            db.session.execute(
+                update(lot_table)
+                .where(and_(lot_table.c.product_id == bindparam('b_product_id'),
+                            lot_table.c.location_id == bindparam('b_location_id')))
+                .values(
+                    quantity=func.coalesce(
+                        bindparam('b_quantity'), lot_table.c.quantity),
+                    expiry_date=func.coalesce(
+                        bindparam('b_expiry_date', type_=db.Date),
+                        lot_table.c.expiry_date)
+                ),
+                params
+            )
+        if movements:
+            db.session.execute(insert(InventoryMovement), movements)
+        adjust_stock(lot_deltas)
+
+        updated_count = len(params)
         db.session.commit()
 
         return jsonify({
             'success': True,
             'message': f'Bulk update completed. Updated {updated_count} lots.',
             'updated_count': updated_count,
+            'movement_count': len(movements),
             'errors': errors
         })
 
@@ -399,52 +527,9 @@ def bulk_update_inventory():
 def get_inventory_stats():
     """Get inventory statistics"""
     try:
-        # Total inventory value (count items)
-        total_items = db.session.query(
-            func.sum(InventoryLot.quantity)).scalar() or 0
-
-        # Low stock items (quantity <= 10)
-        low_stock_items = db.session.query(func.count(InventoryLot.product_id)).filter(
-            InventoryLot.quantity <= 10
-        ).scalar()
-
-        # Critical stock items (quantity <= 5)
-        critical_stock_items = db.session.query(func.count(InventoryLot.product_id)).filter(
-            InventoryLot.quantity <= 5
-        ).scalar()
-
-        # Expired items
-        today = date.today()
-        expired_items = db.session.query(func.count(InventoryLot.product_id)).filter(
-            InventoryLot.expiry_date < today
-        ).scalar()
-
-        # Expiring soon (next 7 days)
-        week_ahead = today + timedelta(days=7)
-        expiring_soon = db.session.query(func.count(InventoryLot.product_id)).filter(
-            and_(InventoryLot.expiry_date >= today,
-                 InventoryLot.expiry_date <= week_ahead)
-        ).scalar()
-
-        # Total unique products in inventory
-        unique_products = db.session.query(func.count(
-            func.distinct(InventoryLot.product_id))).scalar()
-
-        # Total locations used
-        used_locations = db.session.query(func.count(
-            func.distinct(InventoryLot.location_id))).scalar()
-
         return jsonify({
             'success': True,
-            'data': {
-                'total_items': total_items,
-                'unique_products': unique_products,
-                'used_locations': used_locations,
-                'low_stock_items': low_stock_items,
-                'critical_stock_items': critical_stock_items,
-                'expired_items': expired_items,
-                'expiring_soon': expiring_soon
-            }
+            'data': inventory_stats()
         })
 
     except Exception as e:
@@ -543,6 +628,49 @@ def get_expiring_items():
         }), 500
 
 
+def parse_id(value):
+    """Integer id from a JSON value; numeric strings like "5" are accepted"""
+    if isinstance(value, bool) or (isinstance(value, float)
+                                   and not value.is_integer()):
+        raise ValueError(f'Invalid id: {value!r}')
+    return int(value)
+
+
+def signed_movement_quantity(movement_type, quantity):
+    """Movement quantity with the sign its type implies"""
+    quantity = int(quantity)
+    if movement_type in ['outbound', 'out']:
+        # Ensure negative for outbound
+        return -abs(quantity)
+    if movement_type in ['inbound', 'in']:
+        # Ensure positive for inbound
+        return abs(quantity)
+    # For adjustment, use the quantity as-is
+    return quantity
+
+
+def movement_values(data, quantity, previous_quantity, new_quantity):
+    """InventoryMovement column values for a movement payload"""
+    unit_cost = float(data.get('unit_cost', 0.0))
+    return {
+        'product_id': data['product_id'],
+        'location_id': data['location_id'],
+        'movement_type': data['movement_type'],
+        'quantity': quantity,
+        'previous_quantity': previous_quantity,
+        'new_quantity': new_quantity,
+        'unit_cost': unit_cost,
+        'total_value': abs(quantity) * unit_cost,
+        'reference_type': data.get('reference_type', 'manual'),
+        'reference_number': data.get(
+            'reference_number', f'MAN-{datetime.now().strftime("%Y%m%d%H%M%S")}'),
+        'reason': data.get('reason', '手動異動'),
+        'notes': data.get('notes', ''),
+        'user_id': current_user_id(),
+        'movement_date': datetime.utcnow()
+    }
+
+
 @inventory_bp.route('/movements', methods=['POST'])
 def create_inventory_movement():
     """Create a new inventory movement record"""
@@ -559,95 +687,397 @@ def create_inventory_movement():
                     'error': f'Missing required field: {field}'
                 }), 400
 
-        # Validate product and location exist
-        product = Product.query.get(data['product_id'])
-        if not product:
+        movement_quantity = signed_movement_quantity(
+            data['movement_type'], data['quantity'])
+
+        # Apply to the lot atomically in the database; product and location
+        # are only looked up when the write fails
+        try:
+            previous_quantity, new_quantity = apply_lot_delta(
+                data['product_id'], data['location_id'], movement_quantity)
+        except (IntegrityError, InsufficientStock, LotNotFound) as e:
+            db.session.rollback()
+            missing = missing_lot_reference(
+                data['product_id'], data['location_id'])
+            if missing or isinstance(e, LotNotFound):
+                return jsonify({
+                    'success': False,
+                    'error': missing or str(e)
+                }), 404
+            if isinstance(e, InsufficientStock):
+                return jsonify({
+                    'success': False,
+                    'error': str(e)
+                }), 400
+            raise
+
+        # Create movement record
+        movement = InventoryMovement(**movement_values(
+            data, movement_quantity, previous_quantity, new_quantity))
+
+        db.session.add(movement)
+        db.session.commit()
+
+        return jsonify({
+            'success': True,
+            'data': movement.to_dict(),
+            'message': '庫存異動記錄已建立'
+        })
+
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({
+            'success': False,
+            'error': f'Failed to create movement: {str(e)}'
+        }), 500
+
+
+@inventory_bp.route('/movements/batch', methods=['POST'])
+def create_inventory_movements_batch():
+    """Apply many movements in one transaction
+
+    ``mode`` is ``atomic`` (default: any failing row rolls back the whole
+    batch) or ``best_effort`` (each row runs in a savepoint, failing rows
+    are skipped). Every lot of the batch is created (for stock going in)
+    and locked in primary key order before the first write, and the
+    Location and Product_Stock counters are adjusted once at the end, so
+    concurrent batches queue on the same locks in the same order. Rows are
+    then applied in the order given.
+    """
+    try:
+        data = request.get_json()
+        rows = data.get('movements') if data else None
+        mode = (data or {}).get('mode', 'atomic')
+
+        if not isinstance(rows, list) or not rows:
             return jsonify({
                 'success': False,
-                'error': 'Product not found'
-            }), 404
+                'error': 'Missing or invalid movements array'
+            }), 400
+        if mode not in ('atomic', 'best_effort'):
+            return jsonify({
+                'success': False,
+                'error': 'Invalid mode. Use atomic or best_effort'
+            }), 400
 
-        location = Location.query.get(data['location_id'])
-        if not location:
+        required_fields = ['product_id',
+                           'location_id', 'movement_type', 'quantity']
+        results = []
+        valid = []
+        for index, row in enumerate(rows):
+            result = {'index': index, 'success': False}
+            results.append(result)
+
+            if not isinstance(row, dict):
+                result['error'] = 'Movement must be an object'
+                continue
+            missing = [field for field in required_fields if field not in row]
+            if missing:
+                result['error'] = f'Missing required field: {missing[0]}'
+                continue
+            try:
+                row = {**row,
+                       'product_id': parse_id(row['product_id']),
+                       'location_id': parse_id(row['location_id'])}
+            except (ValueError, TypeError):
+                result['error'] = 'Product and location ids must be integers'
+                continue
+            try:
+                quantity = signed_movement_quantity(
+                    row['movement_type'], row['quantity'])
+                # Built before anything is written, so a bad value fails
+                # the row instead of the request
+                values = movement_values(row, quantity, None, None)
+            except (ValueError, TypeError) as e:
+                result['error'] = str(e)
+                continue
+            valid.append((row, result, values))
+
+        # Validate every referenced product and location with two IN queries
+        product_ids = {row['product_id'] for row, _, _ in valid}
+        location_ids = {row['location_id'] for row, _, _ in valid}
+        known_products = {product_id for (product_id,) in db.session.query(
+            Product.product_id).filter(Product.product_id.in_(product_ids))}
+        known_locations = {location_id for (location_id,) in db.session.query(
+            Location.location_id).filter(Location.location_id.in_(location_ids))}
+
+        pending = []
+        for row, result, values in valid:
+            if row['product_id'] not in known_products:
+                result['error'] = 'Product not found'
+            elif row['location_id'] not in known_locations:
+                result['error'] = 'Location not found'
+            else:
+                pending.append((row, result, values))
+
+        # Create the lots stock goes into, then lock every lot of the batch
+        ensure_lots([(row['product_id'], row['location_id'])
+                     for row, _, values in pending if values['quantity'] > 0])
+        lock_lots([(row['product_id'], row['location_id'])
+                   for row, _, _ in pending])
+
+        counter_deltas = {}
+        movements = []
+        for row, result, values in pending:
+            try:
+                if mode == 'best_effort':
+                    with db.session.begin_nested():
+                        previous_quantity, new_quantity = apply_lot_delta(
+                            row['product_id'], row['location_id'],
+                            values['quantity'], counter_deltas)
+                else:
+                    previous_quantity, new_quantity = apply_lot_delta(
+                        row['product_id'], row['location_id'],
+                        values['quantity'], counter_deltas)
+            except ValueError as e:
+                result['error'] = str(e)
+                continue
+
+            values.update(previous_quantity=previous_quantity,
+                          new_quantity=new_quantity)
+            movements.append(values)
+            result.update({
+                'success': True,
+                'previous_quantity': previous_quantity,
+                'new_quantity': new_quantity
+            })
+
+        failed = [result for result in results if not result['success']]
+        if failed and mode == 'atomic':
+            db.session.rollback()
             return jsonify({
                 'success': False,
-                'error': 'Location not found'
-            }), 404
+                'error': f'{len(failed)} of {len(rows)} movements failed; nothing was applied',
+                'results': results
+            }), 400
 
-        # Get current inventory lot
-        current_lot = InventoryLot.query.filter(
-            and_(InventoryLot.product_id == data['product_id'],
-                 InventoryLot.location_id == data['location_id'])
-        ).first()
+        adjust_stock(counter_deltas)
+        if movements:
+            db.session.execute(insert(InventoryMovement), movements)
+        db.session.commit()
+
+        return jsonify({
+            'success': True,
+            'message': f'Applied {len(movements)} of {len(rows)} movements',
+            'applied_count': len(movements),
+            'failed_count': len(failed),
+            'results': results
+        })
 
-        previous_quantity = current_lot.quantity if current_lot else 0
-        movement_quantity = int(data['quantity'])
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({
+            'success': False,
+            'error': f'Failed to apply movements: {str(e)}'
+        }), 500
 
-        # Calculate new quantity based on movement type
-        if data['movement_type'] in ['outbound', 'out']:
-            # Ensure negative for outbound
-            movement_quantity = -abs(movement_quantity)
-        elif data['movement_type'] in ['inbound', 'in']:
-            # Ensure positive for inbound
-            movement_quantity = abs(movement_quantity)
-        # For adjustment, use the quantity as-is
 
-        new_quantity = previous_quantity + movement_quantity
+def transfer_movement_values(data, previous, new, reference_number):
+    """Paired InventoryMovement values (out of the source, into the destination)"""
+    quantity = int(data['quantity'])
+    unit_cost = float(data.get('unit_cost', 0.0))
+    common = {
+        'product_id': data['product_id'],
+        'movement_type': 'transfer',
+        'from_location_id': data['from_location_id'],
+        'to_location_id': data['to_location_id'],
+        'unit_cost': unit_cost,
+        'total_value': quantity * unit_cost,
+        'reference_type': 'transfer',
+        'reference_number': data.get('reference_number', reference_number),
+        'reason': data.get('reason', '庫位調撥'),
+        'notes': data.get('notes', ''),
+        'user_id': current_user_id(),
+        'movement_date': datetime.utcnow()
+    }
+    return [
+        {**common, 'location_id': data['from_location_id'],
+         'quantity': -quantity,
+         'previous_quantity': previous[0], 'new_quantity': new[0]},
+        {**common, 'location_id': data['to_location_id'],
+         'quantity': quantity,
+         'previous_quantity': previous[1], 'new_quantity': new[1]}
+    ]
+
+
+def move_lot_stock(row, quantity, counter_deltas):
+    """Take ``quantity`` out of the source lot and into the destination lot"""
+    source = apply_lot_delta(row['product_id'], row['from_location_id'],
+                             -quantity, counter_deltas)
+    destination = apply_lot_delta(row['product_id'], row['to_location_id'],
+                                  quantity, counter_deltas)
+    return source, destination
+
+
+@inventory_bp.route('/transfers', methods=['POST'])
+def create_inventory_transfers():
+    """Move stock between locations
+
+    Takes a single transfer (``product_id``, ``from_location_id``,
+    ``to_location_id``, ``quantity``) or ``{"transfers": [...], "mode": ...}``
+    with the same modes as the movement batch endpoint. Missing destination
+    lots are created first and every source and destination lot is then
+    locked in one statement before anything is moved; the Location and
+    Product_Stock counters are adjusted once at the end. Each transfer
+    writes a paired out/in movement in the same transaction.
+    """
+    try:
+        data = request.get_json() or {}
+        single = 'transfers' not in data
+        rows = [data] if single else data['transfers']
+        mode = 'atomic' if single else data.get('mode', 'atomic')
 
-        # Validate new quantity
-        if new_quantity < 0:
+        if not isinstance(rows, list) or not rows:
             return jsonify({
                 'success': False,
-                'error': 'Insufficient inventory for this movement'
+                'error': 'Missing or invalid transfers array'
+            }), 400
+        if mode not in ('atomic', 'best_effort'):
+            return jsonify({
+                'success': False,
+                'error': 'Invalid mode. Use atomic or best_effort'
             }), 400
 
-        # Create movement record
-        movement = InventoryMovement(
-            product_id=data['product_id'],
-            location_id=data['location_id'],
-            movement_type=data['movement_type'],
-            quantity=movement_quantity,
-            previous_quantity=previous_quantity,
-            new_quantity=new_quantity,
-            unit_cost=data.get('unit_cost', 0.0),
-            total_value=abs(movement_quantity) * data.get('unit_cost', 0.0),
-            reference_type=data.get('reference_type', 'manual'),
-            reference_number=data.get(
-                'reference_number', f'MAN-{datetime.now().strftime("%Y%m%d%H%M%S")}'),
-            reason=data.get('reason', '手動異動'),
-            notes=data.get('notes', ''),
-            user_id=1,  # TODO: Get from authentication
-            movement_date=datetime.utcnow()
-        )
+        # Validate shape, products and locations up front
+        required_fields = ['product_id', 'from_location_id',
+                           'to_location_id', 'quantity']
+        reference_number = f'TRF-{datetime.now().strftime("%Y%m%d%H%M%S")}'
+        results = []
+        valid = []
+        for index, row in enumerate(rows):
+            result = {'index': index, 'success': False}
+            results.append(result)
+            if not isinstance(row, dict):
+                result['error'] = 'Transfer must be an object'
+                continue
+            missing = [field for field in required_fields if field not in row]
+            if missing:
+                result['error'] = f'Missing required field: {missing[0]}'
+                continue
+            try:
+                row = {**row,
+                       'product_id': parse_id(row['product_id']),
+                       'from_location_id': parse_id(row['from_location_id']),
+                       'to_location_id': parse_id(row['to_location_id'])}
+            except (ValueError, TypeError):
+                result['error'] = 'Product and location ids must be integers'
+                continue
+            try:
+                if int(row['quantity']) <= 0:
+                    result['error'] = 'Quantity must be greater than 0'
+                    continue
+            except (ValueError, TypeError):
+                result['error'] = 'Quantity must be an integer'
+                continue
+            if row['from_location_id'] == row['to_location_id']:
+                result['error'] = 'Source and destination must differ'
+                continue
+            try:
+                # Built before anything is written, so a bad unit_cost
+                # fails the row instead of the request
+                values = transfer_movement_values(
+                    row, (None, None), (None, None), reference_number)
+            except (ValueError, TypeError):
+                result['error'] = 'unit_cost must be a number'
+                continue
+            valid.append((row, result, values))
+
+        product_ids = {row['product_id'] for row, _, _ in valid}
+        location_ids = {row[field] for row, _, _ in valid
+                        for field in ('from_location_id', 'to_location_id')}
+        known_products = {product_id for (product_id,) in db.session.query(
+            Product.product_id).filter(Product.product_id.in_(product_ids))}
+        known_locations = {location_id for (location_id,) in db.session.query(
+            Location.location_id).filter(Location.location_id.in_(location_ids))}
+
+        pending = []
+        for row, result, values in valid:
+            if row['product_id'] not in known_products:
+                result['error'] = 'Product not found'
+            elif (row['from_location_id'] not in known_locations
+                    or row['to_location_id'] not in known_locations):
+                result['error'] = 'Location not found'
+            else:
+                pending.append((row, result, values))
 
-        db.session.add(movement)
+        # Create the missing destination lots, then lock every lot involved
+        # in primary key order before the first write
+        created = ensure_lots([(row['product_id'], row['to_location_id'])
+                               for row, _, _ in pending])
+        lock_lots([(row['product_id'], row[field]) for row, _, _ in pending
+                   for field in ('from_location_id', 'to_location_id')])
 
-        # Update or create inventory lot
-        if current_lot:
-            current_lot.quantity = new_quantity
-        else:
-            # Create new lot if doesn't exist
-            new_lot = InventoryLot(
-                product_id=data['product_id'],
-                location_id=data['location_id'],
-                quantity=new_quantity,
-                expiry_date=None
-            )
-            db.session.add(new_lot)
+        counter_deltas = {}
+        movements = []
+        for row, result, values in pending:
+            quantity = int(row['quantity'])
+            row_deltas = {}
+            # A failed (guarded) decrement writes nothing, so the
+            # destination is only touched once the source has the stock
+            try:
+                if mode == 'best_effort':
+                    with db.session.begin_nested():
+                        source, destination = move_lot_stock(
+                            row, quantity, row_deltas)
+                else:
+                    source, destination = move_lot_stock(
+                        row, quantity, row_deltas)
+            except InsufficientStock:
+                result['error'] = 'Insufficient inventory at source location'
+                continue
+
+            for key, delta in row_deltas.items():
+                counter_deltas[key] = counter_deltas.get(key, 0) + delta
+            values[0].update(previous_quantity=source[0],
+                             new_quantity=source[1])
+            values[1].update(previous_quantity=destination[0],
+                             new_quantity=destination[1])
+            movements.extend(values)
+            result.update({
+                'success': True,
+                'from_quantity': source[1],
+                'to_quantity': destination[1]
+            })
+
+        failed = [result for result in results if not result['success']]
+        if failed and mode == 'atomic':
+            db.session.rollback()
+            if single:
+                return jsonify({
+                    'success': False,
+                    'error': failed[0]['error']
+                }), 400
+            return jsonify({
+                'success': False,
+                'error': f'{len(failed)} of {len(rows)} transfers failed; nothing was moved',
+                'results': results
+            }), 400
 
+        discard_empty_lots(created)
+        adjust_stock(counter_deltas)
+        if movements:
+            db.session.execute(insert(InventoryMovement), movements)
         db.session.commit()
 
+        if single:
+            return jsonify({
+                'success': True,
+                'message': '庫位調撥完成',
+                'data': results[0]
+            })
         return jsonify({
             'success': True,
-            'data': movement.to_dict(),
-            'message': '庫存異動記錄已建立'
+            'message': f'Applied {len(rows) - len(failed)} of {len(rows)} transfers',
+            'applied_count': len(rows) - len(failed),
+            'failed_count': len(failed),
+            'results': results
         })
 
     except Exception as e:
         db.session.rollback()
         return jsonify({
             'success': False,
-            'error': f'Failed to create movement: {str(e)}'
+            'error': f'Failed to transfer inventory: {str(e)}'
         }), 500
 
 
@@ -655,12 +1085,6 @@ def create_inventory_movement():
 def get_inventory_movements(product_id):
     """Get movement history for a specific product"""
     try:
-        page = request.args.get('page', 1, type=int)
-        per_page = request.args.get('per_page', 50, type=int)
-        start_date = request.args.get('start_date')
-        end_date = request.args.get('end_date')
-        location_id = request.args.get('location_id', type=int)
-
         # Validate product exists
         product = Product.query.get(product_id)
         if not product:
@@ -675,55 +1099,29 @@ def get_inventory_movements(product_id):
         )
 
         # Apply filters
-        if start_date:
-            try:
-                start_dt = datetime.strptime(start_date, '%Y-%m-%d')
-                query = query.filter(
-                    InventoryMovement.movement_date >= start_dt)
-            except ValueError:
-                return jsonify({
-                    'success': False,
-                    'error': 'Invalid start_date format. Use YYYY-MM-DD'
-                }), 400
-
-        if end_date:
-            try:
-                end_dt = datetime.strptime(
-                    end_date, '%Y-%m-%d') + timedelta(days=1)
-                query = query.filter(InventoryMovement.movement_date < end_dt)
-            except ValueError:
-                return jsonify({
-                    'success': False,
-                    'error': 'Invalid end_date format. Use YYYY-MM-DD'
-                }), 400
-
-        if location_id:
-            query = query.filter(InventoryMovement.location_id == location_id)
+        try:
+            query = filter_movements(query, request.args)
+        except ValueError as e:
+            return jsonify({
+                'success': False,
+                'error': str(e)
+            }), 400
 
-        # Order by movement date (newest first)
-        query = query.order_by(desc(InventoryMovement.movement_date))
-
-        # Paginate
-        pagination = query.paginate(
-            page=page, per_page=per_page, error_out=False
-        )
+        # Newest movement first; page or cursor mode
+        items, pagination = paginate_query(query, [
+            (InventoryMovement.movement_date, True),
+            (InventoryMovement.movement_id, True)
+        ], default_per_page=50)
 
         movements = []
-        for movement in pagination.items:
+        for movement in items:
             movement_dict = movement.to_dict()
             movements.append(movement_dict)
 
         return jsonify({
             'success': True,
             'data': movements,
-            'pagination': {
-                'page': pagination.page,
-                'pages': pagination.pages,
-                'per_page': pagination.per_page,
-                'total': pagination.total,
-                'has_next': pagination.has_next,
-                'has_prev': pagination.has_prev
-            },
+            'pagination': pagination,
             'product': {
                 'product_id': product.product_id,
                 'name': product.name,
@@ -731,6 +1129,11 @@ def get_inventory_movements(product_id):
             }
         })
 
+    except InvalidCursor as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
     except Exception as e:
         return jsonify({
             'success': False,
@@ -1,7 +1,9 @@
 from flask import Blueprint, request, jsonify
 from models import db, Location, InventoryLot, Product
-from sqlalchemy import func, or_
+from sqlalchemy import func, insert
 from sqlalchemy.exc import IntegrityError
+from stats import location_stats
+from search import apply_search, fuzzy_requested, LOCATION_SEARCH_COLUMNS
 
 locations_bp = Blueprint('locations', __name__, url_prefix='/api/locations')
 
@@ -29,14 +31,8 @@ def get_locations():
         if status_filter:
             query = query.filter(Location.status == status_filter)
         if search:
-            query = query.filter(
-                or_(
-                    Location.location_code.contains(search),
-                    Location.location_name.contains(search),
-                    Location.zone.contains(search),
-                    Location.shelf.contains(search)
-                )
-            )
+            query = apply_search(query, LOCATION_SEARCH_COLUMNS, search,
+                                 fuzzy_requested(request.args))
 
         # Order by zone, then shelf
         query = query.order_by(Location.zone.asc(), Location.shelf.asc())
@@ -46,10 +42,7 @@ def get_locations():
             page=page, per_page=per_page, error_out=False
         )
 
-        locations = []
-        for location in pagination.items:
-            location_data = location.to_dict()
-            locations.append(location_data)
+        locations = Location.to_dict_list(pagination.items)
 
         return jsonify({
             'success': True,
@@ -89,7 +82,7 @@ def get_location(location_id):
                     'expiry_date': lot.expiry_date.isoformat() if lot.expiry_date else None
                 })
 
-        location_data = location.to_dict()
+        location_data = Location.to_dict_list([location])[0]
         location_data['inventory_lots'] = inventory_lots
 
         return jsonify({
@@ -148,7 +141,7 @@ def create_location():
         return jsonify({
             'success': True,
             'message': 'Location created successfully',
-            'data': location.to_dict()
+            'data': Location.to_dict_list([location])[0]
         }), 201
 
     except IntegrityError as e:
@@ -206,7 +199,7 @@ def update_location(location_id):
         return jsonify({
             'success': True,
             'message': 'Location updated successfully',
-            'data': location.to_dict()
+            'data': Location.to_dict_list([location])[0]
         })
 
     except Exception as e:
@@ -261,26 +254,20 @@ def delete_location(location_id):
 def get_zones():
     """Get all distinct zones with statistics"""
     try:
-        zones = db.session.query(
-            Location.zone).distinct().order_by(Location.zone).all()
-        zone_list = [zone[0] for zone in zones]
-
         include_stats = request.args.get('include_stats', False, type=bool)
         if include_stats:
-            zone_stats = []
-            for zone_name in zone_list:
-                location_count = Location.query.filter(
-                    Location.zone == zone_name).count()
+            # Counts, capacity and stock for every zone in one grouped query
+            zone_rows = db.session.query(
+                Location.zone,
+                func.count(Location.location_id),
+                func.coalesce(func.sum(Location.capacity), 0),
+                func.coalesce(func.sum(Location.current_stock), 0)
+            ).group_by(Location.zone).order_by(Location.zone).all()
 
-                # Total capacity in this zone
-                total_capacity = db.session.query(func.sum(Location.capacity)).filter(
-                    Location.zone == zone_name
-                ).scalar() or 0
-
-                # Total items in this zone
-                total_items = db.session.query(func.sum(InventoryLot.quantity)).join(Location).filter(
-                    Location.zone == zone_name
-                ).scalar() or 0
+            zone_stats = []
+            for zone_name, location_count, total_capacity, total_items in zone_rows:
+                total_capacity = int(total_capacity)
+                total_items = int(total_items)
 
                 # Calculate utilization
                 utilization_rate = (
@@ -299,6 +286,10 @@ def get_zones():
                 'data': zone_stats
             })
         else:
+            zones = db.session.query(
+                Location.zone).distinct().order_by(Location.zone).all()
+            zone_list = [zone[0] for zone in zones]
+
             return jsonify({
                 'success': True,
                 'data': zone_list
@@ -339,20 +330,10 @@ def get_location_types():
 def get_location_stats():
     """Get overall location statistics"""
     try:
-        # Total locations
-        total_locations = Location.query.count()
-
-        # Active locations
-        active_locations = Location.query.filter(
-            Location.status == 'active').count()
-
-        # Total capacity
-        total_capacity = db.session.query(
-            func.sum(Location.capacity)).scalar() or 0
-
-        # Total current stock
-        total_stock = db.session.query(
-            func.sum(InventoryLot.quantity)).scalar() or 0
+        # Counts, capacity and stock in one scan
+        stats = location_stats()
+        total_capacity = stats['total_capacity']
+        total_stock = stats['total_stock']
 
         # Overall utilization
         overall_utilization = (
@@ -371,10 +352,7 @@ def get_location_stats():
         return jsonify({
             'success': True,
             'data': {
-                'total_locations': total_locations,
-                'active_locations': active_locations,
-                'total_capacity': total_capacity,
-                'total_stock': total_stock,
+                **stats,
                 'overall_utilization': round(overall_utilization, 1),
                 'status_distribution': dict(status_counts),
                 'type_distribution': dict(type_counts)
@@ -421,7 +399,7 @@ def get_location_inventory(location_id):
         return jsonify({
             'success': True,
             'data': {
-                'location': location.to_dict(),
+                'location': Location.to_dict_list([location])[0],
                 'inventory': inventory_items,
                 'pagination': {
                     'page': pagination.page,
@@ -441,73 +419,177 @@ def get_location_inventory(location_id):
         }), 500
 
 
+# Largest grid a single bulk-create request may generate
+MAX_GRID_LOCATIONS = 50000
+
+# Codes per IN query when checking for existing locations
+CODE_CHUNK_SIZE = 1000
+
+
+def _grid_range(spec, name):
+    """Inclusive ``[first, last]`` range from a grid spec, or None"""
+    bounds = spec.get(name)
+    if bounds is None:
+        return None
+    if not isinstance(bounds, list) or len(bounds) != 2:
+        raise ValueError(f'grid.{name} must be [first, last]')
+    first, last = int(bounds[0]), int(bounds[1])
+    if first > last:
+        raise ValueError(f'grid.{name} must be [first, last]')
+    return range(first, last + 1)
+
+
+def location_grid(spec):
+    """Expand a zone/aisle/shelf(/level) grid spec into location rows
+
+    ``{"zone": "A", "aisles": [1, 20], "shelves": [1, 50], "levels": [1, 4]}``
+    gives one location per combination (``levels`` is optional). Codes,
+    names and shelf labels come from ``code_format``, ``name_format`` and
+    ``shelf_format`` (``str.format`` with zone, aisle, shelf and level).
+    """
+    zones = spec.get('zone')
+    zones = zones if isinstance(zones, list) else [zones]
+    if not all(isinstance(zone, str) and zone.strip() for zone in zones):
+        raise ValueError('grid.zone is required')
+    aisles = _grid_range(spec, 'aisles')
+    shelves = _grid_range(spec, 'shelves')
+    if aisles is None or shelves is None:
+        raise ValueError('grid.aisles and grid.shelves are required')
+    levels = _grid_range(spec, 'levels')
+
+    size = len(zones) * len(aisles) * len(shelves) * len(levels or [None])
+    if size > MAX_GRID_LOCATIONS:
+        raise ValueError(
+            f'Grid would create {size} locations (max {MAX_GRID_LOCATIONS})')
+
+    suffix = '-{level:02d}' if levels else ''
+    code_format = spec.get(
+        'code_format', '{zone}-{aisle:02d}-{shelf:02d}' + suffix)
+    shelf_format = spec.get('shelf_format', '{aisle:02d}-{shelf:02d}' + suffix)
+    name_format = spec.get('name_format', '{zone}區 {aisle}走道 {shelf}層架' +
+                           (' {level}層' if levels else ''))
+
+    rows = []
+    for zone in zones:
+        for aisle in aisles:
+            for shelf in shelves:
+                for level in (levels or [None]):
+                    values = {'zone': zone.strip(), 'aisle': aisle,
+                              'shelf': shelf, 'level': level}
+                    rows.append({
+                        'location_code': code_format.format(**values),
+                        'location_name': name_format.format(**values),
+                        'zone': zone.strip(),
+                        'shelf': shelf_format.format(**values),
+                        'location_type': spec.get('location_type', 'storage'),
+                        'capacity': spec.get('capacity', 0),
+                        'status': spec.get('status', 'active'),
+                        'notes': spec.get('notes', '')
+                    })
+    return rows
+
+
 @locations_bp.route('/bulk-create', methods=['POST'])
 def bulk_create_locations():
-    """Create multiple locations at once"""
+    """Create multiple locations at once
+
+    Takes an explicit ``locations`` list, a ``grid`` spec (see
+    ``location_grid``) or both. Codes are checked against the payload and
+    the database up front and the new rows are inserted in bulk.
+    """
     try:
-        data = request.get_json()
+        data = request.get_json() or {}
 
-        if 'locations' not in data or not isinstance(data['locations'], list):
+        if 'locations' not in data and 'grid' not in data:
+            return jsonify({
+                'success': False,
+                'error': 'Missing or invalid locations array'
+            }), 400
+        if 'locations' in data and not isinstance(data['locations'], list):
             return jsonify({
                 'success': False,
                 'error': 'Missing or invalid locations array'
             }), 400
 
-        created_locations = []
-        errors = []
+        candidates = list(data.get('locations', []))
+        if 'grid' in data:
+            try:
+                candidates.extend(location_grid(data['grid']))
+            except (ValueError, TypeError, KeyError) as e:
+                return jsonify({
+                    'success': False,
+                    'error': f'Invalid grid: {str(e)}'
+                }), 400
 
-        for loc_data in data['locations']:
+        errors = []
+        rows = {}
+        required_fields = ['location_code', 'location_name', 'zone', 'shelf']
+        for loc_data in candidates:
             try:
-                # Check required fields
-                required_fields = ['location_code',
-                                   'location_name', 'zone', 'shelf']
-                for field in required_fields:
-                    if field not in loc_data:
-                        errors.append(
-                            f"Missing {field} in location: {loc_data}")
-                        continue
-
-                # Check if location already exists
-                existing = Location.query.filter(
-                    Location.location_code == loc_data['location_code']
-                ).first()
-
-                if existing:
+                missing = [field for field in required_fields
+                           if field not in loc_data]
+                if missing:
+                    errors.append(
+                        f"Missing {missing[0]} in location: {loc_data}")
+                    continue
+
+                location_code = loc_data['location_code'].strip()
+                # Keyed case-insensitively, like the column's collation
+                if location_code.casefold() in rows:
                     errors.append(
-                        f"Location code {loc_data['location_code']} already exists")
+                        f"Location code {location_code} is duplicated in the request")
                     continue
 
-                # Create location
-                location = Location(
-                    location_code=loc_data['location_code'].strip(),
-                    location_name=loc_data['location_name'].strip(),
-                    zone=loc_data['zone'].strip(),
-                    shelf=loc_data['shelf'].strip(),
-                    location_type=loc_data.get('location_type', 'storage'),
-                    capacity=loc_data.get('capacity', 0),
-                    status=loc_data.get('status', 'active'),
-                    notes=loc_data.get('notes', '')
-                )
-
-                db.session.add(location)
-                created_locations.append(location)
+                rows[location_code.casefold()] = {
+                    'location_code': location_code,
+                    'location_name': loc_data['location_name'].strip(),
+                    'zone': loc_data['zone'].strip(),
+                    'shelf': loc_data['shelf'].strip(),
+                    'location_type': loc_data.get('location_type', 'storage'),
+                    'capacity': loc_data.get('capacity', 0),
+                    'status': loc_data.get('status', 'active'),
+                    'notes': loc_data.get('notes', '')
+                }
 
             except Exception as e:
                 errors.append(f"Error creating location {loc_data}: {str(e)}")
 
-        if created_locations:
+        # Check every code against the database with chunked IN queries
+        codes = [row['location_code'] for row in rows.values()]
+        for i in range(0, len(codes), CODE_CHUNK_SIZE):
+            chunk = codes[i:i + CODE_CHUNK_SIZE]
+            for (location_code,) in db.session.query(
+                    Location.location_code).filter(
+                    Location.location_code.in_(chunk)):
+                errors.append(
+                    f"Location code {location_code} already exists")
+                rows.pop(location_code.casefold(), None)
+
+        # Bulk insert (executemany) in chunks
+        new_rows = list(rows.values())
+        for i in range(0, len(new_rows), CODE_CHUNK_SIZE):
+            db.session.execute(insert(Location),
+                               new_rows[i:i + CODE_CHUNK_SIZE])
+
+        if new_rows:
             db.session.commit()
 
         return jsonify({
             'success': True,
-            'message': f'Created {len(created_locations)} locations',
+            'message': f'Created {len(new_rows)} locations',
             'data': {
-                'created_count': len(created_locations),
+                'created_count': len(new_rows),
                 'error_count': len(errors),
                 'errors': errors
             }
         })
 
+    except IntegrityError as e:
+        db.session.rollback()
+        return jsonify({
+            'success': False,
+            'error': 'Database integrity error (a location code was created concurrently)'
+        }), 400
     except Exception as e:
         db.session.rollback()
         return jsonify({
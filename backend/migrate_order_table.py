@@ -1,14 +1,29 @@
 import mysql.connector
 from datetime import datetime
-import random
-import string
 
 
-def generate_order_number():
-    """Generate a unique order number"""
+def generate_order_numbers(cursor, count):
+    """Reserve ``count`` unique order numbers from Order_Number_Sequence
+
+    Uses the same sequence and format as order_numbers.py, so numbers given
+    out here never collide with the ones the API hands out.
+    """
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS Order_Number_Sequence (
+          name VARCHAR(50) NOT NULL,
+          next_value BIGINT NOT NULL DEFAULT 1,
+          PRIMARY KEY (name)
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4""")
+    cursor.execute(
+        "INSERT IGNORE INTO Order_Number_Sequence (name, next_value) VALUES ('order', 1)")
+    cursor.execute(
+        "UPDATE Order_Number_Sequence SET next_value = LAST_INSERT_ID(next_value + %s) WHERE name = 'order'",
+        (count,))
+    cursor.execute("SELECT LAST_INSERT_ID()")
+    end = cursor.fetchone()[0]
+
     timestamp = datetime.now().strftime("%Y%m%d")
-    random_suffix = ''.join(random.choices(string.digits, k=4))
-    return f"ORD{timestamp}{random_suffix}"
+    return [f"ORD{timestamp}{value:06d}" for value in range(end - count, end)]
 
 
 def migrate_order_table():
@@ -113,10 +128,13 @@ def migrate_order_table():
             "SELECT order_id FROM `Order` WHERE order_number IS NULL")
         orders_without_number = cursor.fetchall()
 
-        for (order_id,) in orders_without_number:
-            order_number = generate_order_number()
-            cursor.execute(
-                "UPDATE `Order` SET order_number = %s WHERE order_id = %s", (order_number, order_id))
+        if orders_without_number:
+            order_numbers = generate_order_numbers(
+                cursor, len(orders_without_number))
+            cursor.executemany(
+                "UPDATE `Order` SET order_number = %s WHERE order_id = %s",
+                [(order_number, order_id) for order_number, (order_id,)
+                 in zip(order_numbers, orders_without_number)])
 
         if orders_without_number:
             print(
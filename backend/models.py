@@ -22,6 +22,11 @@ user_role = db.Table('User_Role',
 
 class Product(db.Model):
     __tablename__ = 'Product'
+    __table_args__ = (
+        # ?search= full-text index, see search.py
+        db.Index('ft_product_search', 'name', 'category',
+                 mysql_prefix='FULLTEXT', mysql_with_parser='ngram'),
+    )
 
     product_id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     name = db.Column(db.String(100), nullable=False)
@@ -41,6 +46,11 @@ class Product(db.Model):
 
 class Supplier(db.Model):
     __tablename__ = 'Supplier'
+    __table_args__ = (
+        db.Index('ft_supplier_search',
+                 'supplier_name', 'contact_name', 'email',
+                 mysql_prefix='FULLTEXT', mysql_with_parser='ngram'),
+    )
 
     supplier_id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     supplier_name = db.Column(db.String(100), nullable=False)
@@ -60,6 +70,10 @@ class Supplier(db.Model):
 
 class Customer(db.Model):
     __tablename__ = 'Customer'
+    __table_args__ = (
+        db.Index('ft_customer_search', 'name', 'contact', 'address',
+                 mysql_prefix='FULLTEXT', mysql_with_parser='ngram'),
+    )
 
     customer_id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     name = db.Column(db.String(100), nullable=False)
@@ -79,8 +93,34 @@ class Customer(db.Model):
     # Relationships
     orders = db.relationship('Order', back_populates='customer')
 
-    def to_dict(self):
-        """Convert Customer object to dictionary"""
+    @staticmethod
+    def get_order_stats_map(customer_ids):
+        """Order count and latest order date for many customers in one query"""
+        customer_ids = list(set(customer_ids))
+        if not customer_ids:
+            return {}
+        rows = db.session.query(
+            Order.customer_id,
+            db.func.count(Order.order_id),
+            db.func.max(Order.order_date)
+        ).filter(
+            Order.customer_id.in_(customer_ids)
+        ).group_by(Order.customer_id).all()
+        stats_map = {customer_id: (0, None) for customer_id in customer_ids}
+        stats_map.update({customer_id: (count, latest)
+                          for customer_id, count, latest in rows})
+        return stats_map
+
+    def to_dict(self, order_stats=None):
+        """Convert Customer object to dictionary
+
+        ``order_stats`` is an ``(orders_count, latest_order_date)`` tuple as
+        returned by ``Customer.get_order_stats_map``.
+        """
+        if order_stats is None:
+            order_stats = Customer.get_order_stats_map(
+                [self.customer_id]).get(self.customer_id, (0, None))
+        orders_count, latest_order_date = order_stats
         return {
             'customer_id': self.customer_id,
             'name': self.name,
@@ -93,12 +133,20 @@ class Customer(db.Model):
             'tax_id': self.tax_id,
             'status': self.status,
             'notes': self.notes,
-            'orders_count': len(self.orders) if self.orders else 0,
-            'latest_order_date': max([order.order_date for order in self.orders], default=None).isoformat() if self.orders else None,
+            'orders_count': orders_count,
+            'latest_order_date': latest_order_date.isoformat() if latest_order_date else None,
             'created_at': self.created_at.isoformat() if self.created_at else None,
             'updated_at': self.updated_at.isoformat() if self.updated_at else None
         }
 
+    @staticmethod
+    def to_dict_list(customers):
+        """Serialize many customers with a single grouped order query"""
+        stats_map = Customer.get_order_stats_map(
+            customer.customer_id for customer in customers)
+        return [customer.to_dict(stats_map[customer.customer_id])
+                for customer in customers]
+
 
 class Role(db.Model):
     __tablename__ = 'Role'
@@ -114,6 +162,10 @@ class Role(db.Model):
 
 class User(db.Model):
     __tablename__ = 'User'
+    __table_args__ = (
+        db.Index('ft_user_search', 'account',
+                 mysql_prefix='FULLTEXT', mysql_with_parser='ngram'),
+    )
 
     user_id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     account = db.Column(db.String(50), nullable=False, unique=True)
@@ -145,6 +197,11 @@ class ShippingVendor(db.Model):
 
 class Order(db.Model):
     __tablename__ = 'Order'
+    __table_args__ = (
+        # Date filters are written as ranges so these can serve them
+        db.Index('idx_order_date', 'order_date'),
+        db.Index('idx_order_expected_delivery', 'expected_delivery_date'),
+    )
 
     order_id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     order_number = db.Column(db.String(50), nullable=False, unique=True)
@@ -221,8 +278,19 @@ class OrderItem(db.Model):
         }
 
 
+class OrderNumberSequence(db.Model):
+    __tablename__ = 'Order_Number_Sequence'
+
+    # One row per sequence; next_value is the first number not yet handed out
+    name = db.Column(db.String(50), primary_key=True)
+    next_value = db.Column(db.BigInteger, nullable=False, default=1)
+
+
 class Shipment(db.Model):
     __tablename__ = 'Shipment'
+    __table_args__ = (
+        db.Index('idx_ship_date', 'ship_date'),
+    )
 
     shipment_id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     ship_date = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
@@ -275,6 +343,11 @@ class Shipment(db.Model):
 
 class Location(db.Model):
     __tablename__ = 'Location'
+    __table_args__ = (
+        db.Index('ft_location_search',
+                 'location_code', 'location_name', 'zone', 'shelf',
+                 mysql_prefix='FULLTEXT', mysql_with_parser='ngram'),
+    )
 
     location_id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     location_code = db.Column(db.String(50), nullable=False, unique=True)
@@ -284,6 +357,8 @@ class Location(db.Model):
     location_type = db.Column(db.String(50), nullable=False, default='storage')
     capacity = db.Column(db.Integer, nullable=False, default=0)
     status = db.Column(db.String(20), nullable=False, default='active')
+    # Denormalized SUM(Inventory_Lot.quantity), maintained by stock.py
+    current_stock = db.Column(db.Integer, nullable=False, default=0)
     notes = db.Column(db.Text)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(
@@ -294,20 +369,43 @@ class Location(db.Model):
     scraps = db.relationship('Scrap', back_populates='location')
 
     def get_current_stock(self):
-        """Calculate total current stock in this location"""
-        total = db.session.query(db.func.sum(InventoryLot.quantity)).filter_by(
-            location_id=self.location_id).scalar()
-        return int(total or 0)
-
-    def get_utilization_rate(self):
+        """Return total current stock in this location"""
+        return int(self.current_stock or 0)
+
+    @staticmethod
+    def get_stock_map(location_ids=None):
+        """Calculate live stock from Inventory_Lot in one grouped query
+
+        Used to verify the maintained ``current_stock`` counters; pass
+        ``None`` to aggregate every location.
+        """
+        query = db.session.query(
+            InventoryLot.location_id, db.func.sum(InventoryLot.quantity)
+        )
+        stock_map = {}
+        if location_ids is not None:
+            location_ids = list(set(location_ids))
+            if not location_ids:
+                return {}
+            query = query.filter(InventoryLot.location_id.in_(location_ids))
+            stock_map = {location_id: 0 for location_id in location_ids}
+        rows = query.group_by(InventoryLot.location_id).all()
+        stock_map.update({location_id: int(total or 0)
+                          for location_id, total in rows})
+        return stock_map
+
+    def get_utilization_rate(self, current_stock=None):
         """Calculate utilization rate as percentage"""
         if self.capacity == 0:
             return 0.0
-        current_stock = self.get_current_stock()
+        if current_stock is None:
+            current_stock = self.get_current_stock()
         return round((current_stock / self.capacity) * 100, 1)
 
-    def to_dict(self):
+    def to_dict(self, current_stock=None):
         """Convert Location object to dictionary"""
+        if current_stock is None:
+            current_stock = self.get_current_stock()
         return {
             'location_id': self.location_id,
             'location_code': self.location_code,
@@ -318,15 +416,24 @@ class Location(db.Model):
             'capacity': self.capacity,
             'status': self.status,
             'notes': self.notes,
-            'current_stock': self.get_current_stock(),
-            'utilization_rate': self.get_utilization_rate(),
+            'current_stock': current_stock,
+            'utilization_rate': self.get_utilization_rate(current_stock),
             'created_at': self.created_at.isoformat() if self.created_at else None,
             'updated_at': self.updated_at.isoformat() if self.updated_at else None
         }
 
+    @staticmethod
+    def to_dict_list(locations):
+        """Serialize many locations without per-location stock queries"""
+        return [location.to_dict() for location in locations]
+
 
 class InventoryLot(db.Model):
     __tablename__ = 'Inventory_Lot'
+    __table_args__ = (
+        db.Index('ft_lot_search', 'search_key',
+                 mysql_prefix='FULLTEXT', mysql_with_parser='ngram'),
+    )
 
     product_id = db.Column(db.Integer, db.ForeignKey(
         'Product.product_id'), primary_key=True)
@@ -334,14 +441,73 @@ class InventoryLot(db.Model):
         'Location.location_id'), primary_key=True)
     quantity = db.Column(db.Integer, nullable=False, default=0)
     expiry_date = db.Column(db.Date)
+    # Product name + location code/zone/shelf, maintained by search.py
+    search_key = db.Column(db.String(255))
 
     # Relationships
     product = db.relationship('Product', back_populates='inventory_lots')
     location = db.relationship('Location', back_populates='inventory_lots')
 
 
+class ProductStock(db.Model):
+    """Per-product stock totals, maintained by stock.py
+
+    ``on_hand`` mirrors ``SUM(Inventory_Lot.quantity)`` for the product and
+    ``reserved`` is stock promised to orders but not yet picked. ``expired``
+    is the part of ``on_hand`` in lots past their expiry date, refreshed
+    daily by ``refresh_expired_stock.py``; it is not available to orders.
+    """
+    __tablename__ = 'Product_Stock'
+
+    product_id = db.Column(db.Integer, db.ForeignKey(
+        'Product.product_id', ondelete='CASCADE'), primary_key=True)
+    on_hand = db.Column(db.Integer, nullable=False, default=0)
+    reserved = db.Column(db.Integer, nullable=False, default=0)
+    expired = db.Column(db.Integer, nullable=False, default=0)
+
+
+class InventoryReservation(db.Model):
+    """Stock promised to an order item, see reservations.py
+
+    ``reserved`` rows hold quantity against the product (counted in
+    ``Product_Stock.reserved``) without touching any lot. Picking turns them
+    into ``picked`` rows, one per lot the stock was taken from, so a later
+    cancellation can put it back where it came from.
+    """
+    __tablename__ = 'Inventory_Reservation'
+    __table_args__ = (
+        # Covers SUM(quantity) per product and status for reconciliation
+        db.Index('idx_reservation_product_status',
+                 'product_id', 'status', 'quantity'),
+        db.Index('idx_reservation_order', 'order_id'),
+        db.Index('idx_reservation_order_item', 'order_item_id'),
+    )
+
+    reservation_id = db.Column(db.Integer, primary_key=True,
+                               autoincrement=True)
+    order_id = db.Column(db.Integer, db.ForeignKey(
+        'Order.order_id', ondelete='CASCADE'), nullable=False)
+    order_item_id = db.Column(db.Integer, db.ForeignKey(
+        'Order_Item.order_item_id', ondelete='CASCADE'), nullable=False)
+    product_id = db.Column(db.Integer, db.ForeignKey(
+        'Product.product_id'), nullable=False)
+    # Lot the stock was picked from; NULL while only reserved
+    location_id = db.Column(db.Integer, db.ForeignKey(
+        'Location.location_id', ondelete='SET NULL'))
+    quantity = db.Column(db.Integer, nullable=False)
+    # 'reserved', 'picked' or 'released' (kept after cancel/delete so stock
+    # is not returned twice)
+    status = db.Column(db.String(20), nullable=False, default='reserved')
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
 class InventoryMovement(db.Model):
     __tablename__ = 'Inventory_Movement'
+    __table_args__ = (
+        # Movement history is listed per product, newest first
+        db.Index('idx_movement_product_date',
+                 'product_id', 'movement_date', 'movement_id'),
+    )
 
     movement_id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     product_id = db.Column(db.Integer, db.ForeignKey(
@@ -415,6 +581,9 @@ class InventoryMovement(db.Model):
 
 class Scrap(db.Model):
     __tablename__ = 'Scrap'
+    __table_args__ = (
+        db.Index('idx_scrap_date', 'scrap_date'),
+    )
 
     scrap_id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     product_id = db.Column(db.Integer, db.ForeignKey(
@@ -0,0 +1,98 @@
+"""Order number allocation
+
+Numbers come from the ``Order_Number_Sequence`` table. Each process reserves
+a block of ``BLOCK_SIZE`` values with one short transaction on its own
+connection (``UPDATE ... SET next_value = next_value + n``; the row lock
+serializes concurrent reservations) and hands them out from memory. Numbers
+are unique across workers and increasing within a worker; a worker that
+exits leaves the rest of its block unused.
+
+The request's transaction never touches the sequence row, so orders do not
+queue behind each other and a rolled-back order cannot release a number
+that someone else then reuses.
+"""
+
+import os
+import threading
+from datetime import datetime
+from sqlalchemy import select, update, insert
+from sqlalchemy.exc import IntegrityError
+from models import db, OrderNumberSequence
+
+BLOCK_SIZE = 100
+ORDER_SEQUENCE = 'order'
+
+
+def format_order_number(value, when=None):
+    """``ORD`` + date + zero-padded sequence value, e.g. ORD20250101000042"""
+    when = when or datetime.now()
+    return f"ORD{when.strftime('%Y%m%d')}{value:06d}"
+
+
+def reserve_block(size, name=ORDER_SEQUENCE):
+    """Reserve ``size`` consecutive values and return the first one"""
+    table = OrderNumberSequence.__table__
+    for _ in range(2):
+        with db.engine.begin() as connection:
+            updated = connection.execute(
+                update(table)
+                .where(table.c.name == name)
+                .values(next_value=table.c.next_value + size)
+            ).rowcount
+            if updated:
+                end = connection.execute(
+                    select(table.c.next_value).where(table.c.name == name)
+                ).scalar_one()
+                return end - size
+        try:
+            with db.engine.begin() as connection:
+                connection.execute(
+                    insert(table).values(name=name, next_value=size + 1))
+            return 1
+        except IntegrityError:
+            # Another worker created the row first; reserve from it
+            continue
+    raise RuntimeError(f'Could not reserve order numbers from {name}')
+
+
+class OrderNumberAllocator:
+    """Hands out sequence values from reserved blocks, thread-safe"""
+
+    def __init__(self, block_size=BLOCK_SIZE, name=ORDER_SEQUENCE):
+        self.block_size = block_size
+        self.name = name
+        self._lock = threading.Lock()
+        self._next = 0
+        self._end = 0
+        self._pid = None
+
+    def allocate_values(self, count=1):
+        """Return ``count`` unique sequence values"""
+        values = []
+        with self._lock:
+            if self._pid != os.getpid():
+                # Never share a block with a forked worker
+                self._next = self._end = 0
+                self._pid = os.getpid()
+            while len(values) < count:
+                if self._next >= self._end:
+                    size = max(self.block_size, count - len(values))
+                    self._next = reserve_block(size, self.name)
+                    self._end = self._next + size
+                take = min(count - len(values), self._end - self._next)
+                values.extend(range(self._next, self._next + take))
+                self._next += take
+        return values
+
+    def allocate(self, count=1):
+        """Return ``count`` formatted order numbers"""
+        now = datetime.now()
+        return [format_order_number(value, now)
+                for value in self.allocate_values(count)]
+
+
+order_numbers = OrderNumberAllocator()
+
+
+def next_order_number():
+    return order_numbers.allocate()[0]
@@ -1,49 +1,86 @@
 from flask import Blueprint, request, jsonify
-from models import db, Order, OrderItem, Customer, User, Product, InventoryLot
+from models import (db, Order, OrderItem, Customer, User, Product, InventoryLot,
+                    Shipment)
+from collections import defaultdict
 from datetime import datetime
 from sqlalchemy import func
 from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import contains_eager, selectinload
+from stats import order_stats
+from pagination import paginate_query, InvalidCursor
+from stock import InsufficientStock
+from allocation import allocate, UnknownStrategy
+from reservations import (reserve_stock, record_reservations, pick_order,
+                          release_order_items, delete_reservations,
+                          CANCELLED_STATUSES, SHIPPED_STATUSES)
+from order_numbers import next_order_number
 
 orders_bp = Blueprint('orders', __name__, url_prefix='/api/orders')
 
 
+def is_positive_quantity(value):
+    """True for a positive int (JSON booleans are not quantities)"""
+    return isinstance(value, int) and not isinstance(value, bool) and value > 0
+
+
+def is_closed_order(order):
+    """Cancelled, shipped or with a shipment: its items no longer change stock"""
+    return (order.status.lower() in CANCELLED_STATUSES + SHIPPED_STATUSES
+            or Shipment.query.filter_by(order_id=order.order_id).first()
+            is not None)
+
+
+def filter_orders(query, args):
+    """Apply the order list filters in ``args`` to a query joined with Customer"""
+    status_filter = args.get('status')
+    customer_filter = args.get('customer_id', type=int)
+    search = args.get('search', '').strip()
+
+    if status_filter:
+        query = query.filter(Order.status == status_filter)
+    if customer_filter:
+        query = query.filter(Order.customer_id == customer_filter)
+    if search:
+        query = query.filter(
+            func.concat(Customer.name, ' ', Order.ship_to).contains(search)
+        )
+    return query
+
+
 @orders_bp.route('', methods=['GET'])
 def get_orders():
     """Get all orders with pagination and filtering"""
     try:
-        page = request.args.get('page', 1, type=int)
-        per_page = request.args.get('per_page', 10, type=int)
-        status_filter = request.args.get('status')
-        customer_filter = request.args.get('customer_id', type=int)
-        search = request.args.get('search', '').strip()
-
-        # Build query
-        query = db.session.query(Order).join(Customer).join(User)
-
-        # Apply filters
-        if status_filter:
-            query = query.filter(Order.status == status_filter)
-        if customer_filter:
-            query = query.filter(Order.customer_id == customer_filter)
-        if search:
-            query = query.filter(
-                func.concat(Customer.name, ' ', Order.ship_to).contains(search)
-            )
-
-        # Order by most recent first
-        query = query.order_by(Order.order_date.desc())
-
-        # Paginate
-        pagination = query.paginate(
-            page=page, per_page=per_page, error_out=False
+        # Build query; customer and user come from the joins, items and
+        # shipments are batch-loaded per page so the query count stays fixed
+        query = db.session.query(Order).join(Customer).join(User).options(
+            contains_eager(Order.customer),
+            contains_eager(Order.user),
+            selectinload(Order.order_items).selectinload(OrderItem.product),
+            selectinload(Order.shipments).selectinload(
+                Shipment.shipping_vendor)
         )
+        query = filter_orders(query, request.args)
+
+        # Most recent first; page or cursor mode
+        items, pagination = paginate_query(query, [
+            (Order.order_date, True),
+            (Order.order_id, True)
+        ])
+
+        # Total item quantity for every order on the page in one grouped query
+        order_ids = [order.order_id for order in items]
+        total_items_map = {}
+        if order_ids:
+            total_items_map = dict(db.session.query(
+                OrderItem.order_id, func.sum(OrderItem.quantity)
+            ).filter(
+                OrderItem.order_id.in_(order_ids)
+            ).group_by(OrderItem.order_id).all())
 
         orders = []
-        for order in pagination.items:
-            # Calculate total items
-            total_items = db.session.query(func.sum(OrderItem.quantity)).filter(
-                OrderItem.order_id == order.order_id
-            ).scalar() or 0
+        for order in items:
+            total_items = int(total_items_map.get(order.order_id) or 0)
 
             # Get order items for frontend
             order_items = []
@@ -97,17 +134,15 @@ def get_orders():
         return jsonify({
             'success': True,
             'data': orders,
-            'total': pagination.total,
-            'pagination': {
-                'page': pagination.page,
-                'pages': pagination.pages,
-                'per_page': pagination.per_page,
-                'total': pagination.total,
-                'has_next': pagination.has_next,
-                'has_prev': pagination.has_prev
-            }
+            'total': pagination['total'],
+            'pagination': pagination
         })
 
+    except InvalidCursor as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
     except Exception as e:
         return jsonify({
             'success': False,
@@ -193,31 +228,53 @@ def create_order():
                 'error': 'Order must contain at least one item'
             }), 400
 
-        # Check inventory availability for all items first
+        # Every line must reserve a positive quantity: a zero or negative
+        # one would lower Product_Stock.reserved for the other lines
         for item_data in data['order_items']:
-            product = Product.query.get(item_data['product_id'])
-            if not product:
+            if not isinstance(item_data, dict) or 'product_id' not in item_data:
                 return jsonify({
                     'success': False,
-                    'error': f'Product not found: {item_data["product_id"]}'
-                }), 404
-
-            # Check total available inventory
-            available_qty = db.session.query(func.sum(InventoryLot.quantity)).filter(
-                InventoryLot.product_id == item_data['product_id']
-            ).scalar() or 0
-
-            if available_qty < item_data['quantity']:
+                    'error': 'Each order item needs a product_id and quantity'
+                }), 400
+            if not is_positive_quantity(item_data.get('quantity')):
                 return jsonify({
                     'success': False,
-                    'error': f'Insufficient inventory for {product.name}. Available: {available_qty}, Required: {item_data["quantity"]}'
+                    'error': 'Quantity must be a positive integer'
                 }), 400
 
+        # Requested quantity per product (a product may be on several lines)
+        requested = defaultdict(int)
+        for item_data in data['order_items']:
+            requested[item_data['product_id']] += item_data['quantity']
+
+        # Validate all products in one query
+        products = {
+            product.product_id: product
+            for product in Product.query.filter(
+                Product.product_id.in_(list(requested))).all()
+        }
+        for product_id in requested:
+            if product_id not in products:
+                return jsonify({
+                    'success': False,
+                    'error': f'Product not found: {product_id}'
+                }), 404
+
+        # Reserve against the per-product totals; the lots are only touched
+        # when the order is picked
+        shortage = reserve_stock(requested)
+        if shortage is not None:
+            product_id, available_qty = shortage
+            db.session.rollback()
+            return jsonify({
+                'success': False,
+                'error': f'Insufficient inventory for {products[product_id].name}. Available: {available_qty}, Required: {requested[product_id]}'
+            }), 400
+
         # Generate order number if not provided
         order_number = data.get('order_number')
         if not order_number:
-            timestamp = datetime.now().strftime("%Y%m%d%H%M")
-            order_number = f"ORD{timestamp}"
+            order_number = next_order_number()
 
         # Calculate total amount from order items
         total_amount = sum(
@@ -260,33 +317,18 @@ def create_order():
         db.session.add(order)
         db.session.flush()  # Get order_id
 
-        # Create order items and update inventory
-        for item_data in data['order_items']:
-            order_item = OrderItem(
+        # Create order items
+        order_items = [
+            OrderItem(
                 order_id=order.order_id,
                 product_id=item_data['product_id'],
                 quantity=item_data['quantity'],
                 unit_price=item_data.get('unit_price', 0.0)
-            )
-            db.session.add(order_item)
-
-            # Reduce inventory using FIFO (First In, First Out)
-            remaining_qty = item_data['quantity']
-            inventory_lots = InventoryLot.query.filter(
-                InventoryLot.product_id == item_data['product_id'],
-                InventoryLot.quantity > 0
-            ).order_by(InventoryLot.expiry_date.asc()).all()
-
-            for lot in inventory_lots:
-                if remaining_qty <= 0:
-                    break
-
-                if lot.quantity >= remaining_qty:
-                    lot.quantity -= remaining_qty
-                    remaining_qty = 0
-                else:
-                    remaining_qty -= lot.quantity
-                    lot.quantity = 0
+            ) for item_data in data['order_items']
+        ]
+        db.session.add_all(order_items)
+        db.session.flush()  # Get order_item_ids
+        record_reservations(order_items)
 
         db.session.commit()
 
@@ -322,8 +364,7 @@ def update_order(order_id):
             new_status = data['status']
 
             # Prevent setting status to 'shipped' without a shipment
-            if new_status.lower() in ['shipped', '已出貨']:
-                from models import Shipment
+            if new_status.lower() in SHIPPED_STATUSES:
                 existing_shipment = Shipment.query.filter_by(
                     order_id=order_id).first()
                 if not existing_shipment:
@@ -332,6 +373,24 @@ def update_order(order_id):
                         'error': 'Cannot set order status to shipped without creating a shipment first. Please create a shipment record.'
                     }), 400
 
+            # Cancelling releases the order's stock, so a cancelled order
+            # cannot be reopened and a shipped one cannot be cancelled
+            was_cancelled = order.status.lower() in CANCELLED_STATUSES
+            cancelling = new_status.lower() in CANCELLED_STATUSES
+            if was_cancelled and not cancelling:
+                return jsonify({
+                    'success': False,
+                    'error': 'Cannot reopen a cancelled order. Please create a new order.'
+                }), 400
+            if cancelling and not was_cancelled:
+                if (order.status.lower() in SHIPPED_STATUSES
+                        or Shipment.query.filter_by(order_id=order_id).first()):
+                    return jsonify({
+                        'success': False,
+                        'error': 'Cannot cancel an order that has been shipped'
+                    }), 400
+                release_order_items(order.order_items)
+
             order.status = new_status
         if 'ship_to' in data:
             order.ship_to = data['ship_to']
@@ -373,28 +432,12 @@ def delete_order(order_id):
                 'error': 'Cannot delete order with current status'
             }), 400
 
-        # Restore inventory from order items before deletion
-        for item in order.order_items:
-            # Find the best location to restore inventory (first available location)
-            location = InventoryLot.query.filter(
-                InventoryLot.product_id == item.product_id
-            ).first()
-
-            if location:
-                location.quantity += item.quantity
-            else:
-                # Create new inventory lot if none exists
-                # Use first available location
-                from models import Location
-                first_location = Location.query.first()
-                if first_location:
-                    new_lot = InventoryLot(
-                        product_id=item.product_id,
-                        location_id=first_location.location_id,
-                        quantity=item.quantity
-                    )
-                    db.session.add(new_lot)
+        # Release reserved stock and return picked stock before deletion
+        release_order_items(order.order_items)
+        delete_reservations(order.order_items)
 
+        for item in order.order_items:
+            db.session.delete(item)
         db.session.delete(order)
         db.session.commit()
 
@@ -448,12 +491,25 @@ def add_order_item(order_id):
         order = Order.query.get_or_404(order_id)
         data = request.get_json()
 
+        # A cancelled order is never released again and a shipped one is
+        # gone, so stock reserved for a new item would never come back
+        if is_closed_order(order):
+            return jsonify({
+                'success': False,
+                'error': 'Cannot add items to a cancelled or shipped order'
+            }), 400
+
         # Validate required fields
         if 'product_id' not in data or 'quantity' not in data:
             return jsonify({
                 'success': False,
                 'error': 'Missing required fields: product_id, quantity'
             }), 400
+        if not is_positive_quantity(data['quantity']):
+            return jsonify({
+                'success': False,
+                'error': 'Quantity must be a positive integer'
+            }), 400
 
         # Validate product exists
         product = Product.query.get(data['product_id'])
@@ -463,12 +519,11 @@ def add_order_item(order_id):
                 'error': 'Product not found'
             }), 404
 
-        # Check inventory availability
-        available_qty = db.session.query(func.sum(InventoryLot.quantity)).filter(
-            InventoryLot.product_id == data['product_id']
-        ).scalar() or 0
-
-        if available_qty < data['quantity']:
+        # Reserve the quantity against the product total
+        shortage = reserve_stock({data['product_id']: data['quantity']})
+        if shortage is not None:
+            available_qty = shortage[1]
+            db.session.rollback()
             return jsonify({
                 'success': False,
                 'error': f'Insufficient inventory. Available: {available_qty}, Required: {data["quantity"]}'
@@ -482,24 +537,8 @@ def add_order_item(order_id):
         )
 
         db.session.add(order_item)
-
-        # Update inventory using FIFO
-        remaining_qty = data['quantity']
-        inventory_lots = InventoryLot.query.filter(
-            InventoryLot.product_id == data['product_id'],
-            InventoryLot.quantity > 0
-        ).order_by(InventoryLot.expiry_date.asc()).all()
-
-        for lot in inventory_lots:
-            if remaining_qty <= 0:
-                break
-
-            if lot.quantity >= remaining_qty:
-                lot.quantity -= remaining_qty
-                remaining_qty = 0
-            else:
-                remaining_qty -= lot.quantity
-                lot.quantity = 0
+        db.session.flush()  # Get order_item_id
+        record_reservations([order_item])
 
         db.session.commit()
 
@@ -522,25 +561,17 @@ def delete_order_item(item_id):
     """Delete an order item"""
     try:
         item = OrderItem.query.get_or_404(item_id)
+        order = Order.query.get(item.order_id)
+        # The picked goods of a shipped order have left the warehouse
+        if order is not None and is_closed_order(order):
+            return jsonify({
+                'success': False,
+                'error': 'Cannot delete items of a cancelled or shipped order'
+            }), 400
 
-        # Restore inventory
-        location = InventoryLot.query.filter(
-            InventoryLot.product_id == item.product_id
-        ).first()
-
-        if location:
-            location.quantity += item.quantity
-        else:
-            # Create new inventory lot if none exists
-            from models import Location
-            first_location = Location.query.first()
-            if first_location:
-                new_lot = InventoryLot(
-                    product_id=item.product_id,
-                    location_id=first_location.location_id,
-                    quantity=item.quantity
-                )
-                db.session.add(new_lot)
+        # Release the item's reservation or return its picked stock
+        release_order_items([item])
+        delete_reservations([item])
 
         db.session.delete(item)
         db.session.commit()
@@ -557,6 +588,88 @@ def delete_order_item(item_id):
             'error': f'Failed to delete order item: {str(e)}'
         }), 500
 
+@orders_bp.route('/<int:order_id>/pick', methods=['POST'])
+def pick_order_stock(order_id):
+    """Take the order's reserved stock out of the lots
+
+    Optional body: ``strategy`` (fefo, fifo, closest_zone, fewest_picks)
+    and ``zone`` for closest_zone.
+    """
+    try:
+        Order.query.get_or_404(order_id)
+        data = request.get_json(silent=True) or {}
+        picked = pick_order(order_id, data.get('strategy'),
+                            zone=data.get('zone'))
+        db.session.commit()
+
+        return jsonify({
+            'success': True,
+            'message': 'Order picked successfully',
+            'data': {'order_id': order_id, 'picked_quantity': picked}
+        })
+
+    except (InsufficientStock, UnknownStrategy) as e:
+        db.session.rollback()
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({
+            'success': False,
+            'error': f'Failed to pick order: {str(e)}'
+        }), 500
+
+
+@orders_bp.route('/<int:order_id>/allocation', methods=['GET'])
+def preview_order_allocation(order_id):
+    """Lots the order's items would be picked from (nothing is locked)"""
+    try:
+        order = Order.query.get_or_404(order_id)
+
+        requested = defaultdict(int)
+        for item in order.order_items:
+            requested[item.product_id] += item.quantity
+
+        lots = InventoryLot.query.filter(
+            InventoryLot.product_id.in_(list(requested)),
+            InventoryLot.quantity > 0
+        ).all() if requested else []
+        picks, available = allocate(lots, requested,
+                                    request.args.get('strategy'),
+                                    zone=request.args.get('zone'))
+
+        return jsonify({
+            'success': True,
+            'data': {
+                'order_id': order_id,
+                'picks': [{
+                    'product_id': lot.product_id,
+                    'location_id': lot.location_id,
+                    'expiry_date': lot.expiry_date.isoformat() if lot.expiry_date else None,
+                    'quantity': quantity
+                } for lot, quantity in picks],
+                'shortages': [{
+                    'product_id': product_id,
+                    'requested': quantity,
+                    'available': available[product_id]
+                } for product_id, quantity in requested.items()
+                    if available[product_id] < quantity]
+            }
+        })
+
+    except UnknownStrategy as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': f'Failed to preview allocation: {str(e)}'
+        }), 500
+
 # Statistics endpoints
 
 
@@ -600,27 +713,9 @@ def get_order_shipments(order_id):
 def get_order_stats():
     """Get order statistics"""
     try:
-        total_orders = Order.query.count()
-        pending_orders = Order.query.filter(Order.status == 'Pending').count()
-        shipped_orders = Order.query.filter(Order.status == 'Shipped').count()
-        cancelled_orders = Order.query.filter(
-            Order.status == 'Cancelled').count()
-
-        # Recent orders (last 7 days)
-        from datetime import timedelta
-        week_ago = datetime.utcnow() - timedelta(days=7)
-        recent_orders = Order.query.filter(
-            Order.order_date >= week_ago).count()
-
         return jsonify({
             'success': True,
-            'data': {
-                'total_orders': total_orders,
-                'pending_orders': pending_orders,
-                'shipped_orders': shipped_orders,
-                'cancelled_orders': cancelled_orders,
-                'recent_orders': recent_orders
-            }
+            'data': order_stats()
         })
 
     except Exception as e:
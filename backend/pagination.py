@@ -0,0 +1,160 @@
+"""Shared pagination for the list endpoints
+
+Two modes, selected from the request arguments:
+
+* page mode (default): ``?page=N&per_page=M`` with LIMIT/OFFSET, same as
+  ``paginate()``. ``?with_total=false`` skips the ``COUNT(*)``.
+* cursor mode: ``?cursor=`` (empty for the first page, then the
+  ``next_cursor`` of the previous response). Rows are found by seeking past
+  the last row's sort key instead of skipping OFFSET rows, so every page
+  costs the same. The total is only counted with ``?with_total=true``.
+
+Sort keys are ``(column, descending)`` pairs that must end with the primary
+key so every row has a unique position.
+"""
+
+import base64
+import json
+from datetime import date, datetime
+from decimal import Decimal
+from flask import request
+from sqlalchemy import and_, or_
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def _encode_value(value):
+    if isinstance(value, datetime):
+        return {'dt': value.isoformat()}
+    if isinstance(value, date):
+        return {'d': value.isoformat()}
+    if isinstance(value, Decimal):
+        return {'n': str(value)}
+    return value
+
+
+def _decode_value(value):
+    if isinstance(value, dict):
+        if 'dt' in value:
+            return datetime.fromisoformat(value['dt'])
+        if 'd' in value:
+            return date.fromisoformat(value['d'])
+        if 'n' in value:
+            return Decimal(value['n'])
+    return value
+
+
+def encode_cursor(values):
+    payload = json.dumps([_encode_value(value) for value in values])
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor, size):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if not isinstance(values, list) or len(values) != size:
+            raise ValueError
+        return [_decode_value(value) for value in values]
+    except (ValueError, TypeError):
+        raise InvalidCursor('Invalid cursor')
+
+
+def _order_by(sort_keys):
+    return [column.desc() if descending else column.asc()
+            for column, descending in sort_keys]
+
+
+def _seek_condition(sort_keys, values):
+    """Rows strictly after ``values`` in ``sort_keys`` order
+
+    Expanded as ``a < x OR (a = x AND b < y) ...`` with the leading column
+    also bounded on its own so the index range scan starts at the cursor.
+    """
+    branches = []
+    for i, (column, descending) in enumerate(sort_keys):
+        equal = [sort_keys[j][0] == values[j] for j in range(i)]
+        past = column < values[i] if descending else column > values[i]
+        branches.append(and_(*equal, past))
+    leading, descending = sort_keys[0]
+    bound = leading <= values[0] if descending else leading >= values[0]
+    return and_(bound, or_(*branches))
+
+
+def _flag(name, default):
+    value = request.args.get(name)
+    if value is None:
+        return default
+    return value.lower() in ('1', 'true', 'yes')
+
+
+def paginate_query(query, sort_keys, default_per_page=10, row_key=None):
+    """Paginate ``query`` according to the request arguments
+
+    ``row_key(item)`` returns an item's sort key values (defaults to reading
+    each sort column's attribute name from the item).
+
+    Returns ``(items, pagination)`` where ``pagination`` is the response
+    envelope shared by every list endpoint.
+    """
+    per_page = request.args.get('per_page', default_per_page, type=int)
+    per_page = max(per_page, 1)
+    cursor = request.args.get('cursor')
+    ordered = query.order_by(*_order_by(sort_keys))
+
+    if cursor is None:
+        page = max(request.args.get('page', 1, type=int), 1)
+        if _flag('with_total', True):
+            pagination = ordered.paginate(
+                page=page, per_page=per_page, error_out=False
+            )
+            return pagination.items, {
+                'page': pagination.page,
+                'pages': pagination.pages,
+                'per_page': pagination.per_page,
+                'total': pagination.total,
+                'has_next': pagination.has_next,
+                'has_prev': pagination.has_prev
+            }
+
+        rows = ordered.offset((page - 1) * per_page).limit(per_page + 1).all()
+        return rows[:per_page], {
+            'page': page,
+            'pages': None,
+            'per_page': per_page,
+            'total': None,
+            'has_next': len(rows) > per_page,
+            'has_prev': page > 1
+        }
+
+    seek_query = ordered
+    if cursor:
+        values = decode_cursor(cursor, len(sort_keys))
+        seek_query = ordered.filter(_seek_condition(sort_keys, values))
+
+    rows = seek_query.limit(per_page + 1).all()
+    items = rows[:per_page]
+    has_next = len(rows) > per_page
+
+    next_cursor = None
+    if has_next and items:
+        if row_key is None:
+            def row_key(item):
+                return [getattr(item, column.key)
+                        for column, _ in sort_keys]
+        next_cursor = encode_cursor(row_key(items[-1]))
+
+    total = None
+    if _flag('with_total', False):
+        total = query.order_by(None).count()
+
+    return items, {
+        'cursor': cursor,
+        'next_cursor': next_cursor,
+        'per_page': per_page,
+        'total': total,
+        'has_next': has_next,
+        'has_prev': bool(cursor)
+    }
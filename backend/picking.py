@@ -0,0 +1,196 @@
+"""Wave picking
+
+``POST /api/picking/waves`` batches many orders into one pick wave. The
+orders' reserved stock (``Inventory_Reservation``) is allocated as a single
+demand per product (allocation.py), the allocated lines are consolidated
+per product and location, and the pick list is sorted in walking order
+(zone, shelf, location code). Each pick line keeps its per-order split, so
+pickers can sort the goods into orders at the pack station.
+
+The wave is built from a fixed number of set-based queries (orders,
+reservations, lots, locations, products) however many orders it holds.
+Without ``"pick": true`` it is only a preview and nothing is locked; with
+it the wave is picked in one transaction (``pick_orders``). Orders that
+need a product the lots cannot cover are left out of the pick and listed
+in ``skipped_order_ids``, with the products in ``shortages``.
+"""
+
+from collections import defaultdict
+from flask import Blueprint, request, jsonify
+from models import db, Order, InventoryLot, InventoryReservation, Location, Product
+from allocation import allocate, DEFAULT_STRATEGY
+from reservations import RESERVED, pick_orders, split_picks
+from stock import InsufficientStock
+from auth import require_auth
+
+picking_bp = Blueprint('picking', __name__, url_prefix='/api/picking')
+
+DEFAULT_WAVE_SIZE = 50
+MAX_WAVE_SIZE = 500
+
+
+def select_wave_orders(order_ids=None, limit=DEFAULT_WAVE_SIZE):
+    """Order ids for the wave: the given ones, or the oldest pending orders
+
+    Pending means ``v_orders_pending`` (status 'pending') with stock still
+    reserved; orders are taken by expected delivery date, then order date.
+    Raises ValueError unless ``order_ids`` is a list of at most
+    ``MAX_WAVE_SIZE`` integers.
+    """
+    if order_ids is not None and not isinstance(order_ids, list):
+        raise ValueError('order_ids must be a list of integers')
+    if order_ids:
+        if not all(isinstance(order_id, int) and not isinstance(order_id, bool)
+                   for order_id in order_ids):
+            raise ValueError('order_ids must be a list of integers')
+        order_ids = list(dict.fromkeys(order_ids))
+        if len(order_ids) > MAX_WAVE_SIZE:
+            raise ValueError(
+                f'A wave holds at most {MAX_WAVE_SIZE} orders; got {len(order_ids)}')
+        return order_ids
+
+    reserved = db.session.query(InventoryReservation.order_id).filter(
+        InventoryReservation.order_id == Order.order_id,
+        InventoryReservation.status == RESERVED
+    ).exists()
+    rows = db.session.query(Order.order_id).filter(
+        Order.status == 'pending', reserved
+    ).order_by(
+        Order.expected_delivery_date.is_(None),
+        Order.expected_delivery_date, Order.order_date, Order.order_id
+    ).limit(limit).all()
+    return [order_id for (order_id,) in rows]
+
+
+def load_wave_reservations(order_ids):
+    """The orders' reserved rows, in reservation order"""
+    if not order_ids:
+        return []
+    return InventoryReservation.query.filter(
+        InventoryReservation.order_id.in_(order_ids),
+        InventoryReservation.status == RESERVED
+    ).order_by(InventoryReservation.reservation_id).all()
+
+
+def build_pick_list(lines):
+    """Consolidate picked lines per (product, location) in walking order"""
+    stops = {}
+    for line in lines:
+        key = (line['product_id'], line['location_id'])
+        stop = stops.setdefault(key, {
+            'product_id': line['product_id'],
+            'location_id': line['location_id'],
+            'quantity': 0,
+            'orders': []
+        })
+        stop['quantity'] += line['quantity']
+        stop['orders'].append({
+            'order_id': line['order_id'],
+            'order_item_id': line['order_item_id'],
+            'quantity': line['quantity']
+        })
+    if not stops:
+        return []
+
+    location_ids = {location_id for _, location_id in stops}
+    locations = {row.location_id: row for row in db.session.query(
+        Location.location_id, Location.location_code, Location.zone,
+        Location.shelf
+    ).filter(Location.location_id.in_(location_ids))}
+    names = dict(db.session.query(Product.product_id, Product.name).filter(
+        Product.product_id.in_({product_id for product_id, _ in stops})))
+
+    for stop in stops.values():
+        location = locations.get(stop['location_id'])
+        stop['location_code'] = location.location_code if location else None
+        stop['zone'] = location.zone if location else None
+        stop['shelf'] = location.shelf if location else None
+        stop['product_name'] = names.get(stop['product_id'])
+
+    pick_list = sorted(stops.values(), key=lambda stop: (
+        stop['zone'] or '', stop['shelf'] or '', stop['location_code'] or '',
+        stop['product_id']))
+    for sequence, stop in enumerate(pick_list, 1):
+        stop['sequence'] = sequence
+    return pick_list
+
+
+@picking_bp.route('/waves', methods=['POST'])
+@require_auth
+def create_wave():
+    """Build (and optionally pick) a wave from pending orders
+
+    Body (all optional): ``order_ids``, ``limit`` (when no ids are given),
+    ``strategy``, ``zone`` and ``pick``.
+    """
+    try:
+        data = request.get_json(silent=True) or {}
+        strategy = data.get('strategy') or DEFAULT_STRATEGY
+        zone = data.get('zone')
+        try:
+            limit = min(max(int(data.get('limit', DEFAULT_WAVE_SIZE)), 1),
+                        MAX_WAVE_SIZE)
+        except (ValueError, TypeError):
+            return jsonify({
+                'success': False,
+                'error': 'limit must be an integer'
+            }), 400
+
+        order_ids = select_wave_orders(data.get('order_ids'), limit)
+
+        if data.get('pick'):
+            # Orders that need a short product stay reserved and are
+            # reported in skipped_order_ids; the rest of the wave is picked
+            shortages = []
+            lines = pick_orders(order_ids, strategy, shortages, zone=zone)
+            db.session.commit()
+        else:
+            reservations = load_wave_reservations(order_ids)
+            requested = defaultdict(int)
+            for reservation in reservations:
+                requested[reservation.product_id] += reservation.quantity
+
+            lots = InventoryLot.query.filter(
+                InventoryLot.product_id.in_(list(requested)),
+                InventoryLot.quantity > 0
+            ).all() if requested else []
+            picks, available = allocate(lots, requested, strategy, zone=zone)
+            lines = split_picks(reservations, picks)
+            shortages = [{
+                'product_id': product_id,
+                'requested': quantity,
+                'available': available[product_id]
+            } for product_id, quantity in requested.items()
+                if available[product_id] < quantity]
+
+        pick_list = build_pick_list(lines)
+        picked_orders = {line['order_id'] for line in lines}
+
+        return jsonify({
+            'success': True,
+            'data': {
+                'picked': bool(data.get('pick')),
+                'strategy': strategy,
+                'order_ids': [order_id for order_id in order_ids
+                              if order_id in picked_orders],
+                'skipped_order_ids': [order_id for order_id in order_ids
+                                      if order_id not in picked_orders],
+                'stop_count': len(pick_list),
+                'total_quantity': sum(stop['quantity'] for stop in pick_list),
+                'pick_list': pick_list,
+                'shortages': shortages
+            }
+        })
+
+    except (InsufficientStock, ValueError) as e:
+        db.session.rollback()
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({
+            'success': False,
+            'error': f'Failed to create pick wave: {str(e)}'
+        }), 500
@@ -1,6 +1,7 @@
 from flask import Blueprint, request, jsonify
 from models import db, Product, Supplier, supplier_product
 from auth import require_auth, require_role
+from search import apply_search, fuzzy_requested, PRODUCT_SEARCH_COLUMNS
 
 products_bp = Blueprint('products', __name__, url_prefix='/api/products')
 
@@ -16,10 +17,9 @@ def get_products():
         query = Product.query
 
         if search:
-            query = query.filter(
-                Product.name.contains(search) |
-                Product.category.contains(search)
-            )
+            query = apply_search(query, PRODUCT_SEARCH_COLUMNS, search,
+                                 fuzzy_requested(request.args))
+        query = query.order_by(Product.product_id.asc())
 
         pagination = query.paginate(
             page=page,
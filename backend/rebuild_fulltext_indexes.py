@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+Rebuild the ngram FULLTEXT search indexes without InnoDB's stopword list
+Indexes built with the default list drop every ngram containing a stopword
+("a", "i", ...), so ?search= silently misses rows. Adds indexes (and the
+columns they cover) missing from databases built from an older ddl.sql,
+e.g. ft_supplier_search, then drops and recreates the existing ones with
+innodb_ft_enable_stopword = 0
+
+Usage:
+    python rebuild_fulltext_indexes.py                 # add missing + rebuild all
+    python rebuild_fulltext_indexes.py --missing-only  # only add missing ones
+"""
+
+import sys
+from sqlalchemy import inspect, text
+from sqlalchemy.schema import CreateColumn
+from app import create_app
+from models import db
+from search import FULLTEXT_SESSION_SQL
+
+
+def fulltext_indexes():
+    """FULLTEXT indexes declared in models.py, as ``(table, index)``"""
+    return [(table, index)
+            for table in db.metadata.sorted_tables
+            for index in sorted(table.indexes, key=lambda index: index.name)
+            if index.dialect_options['mysql']['prefix'] == 'FULLTEXT']
+
+
+def add_missing_columns(connection, table, index):
+    """Add columns the index covers that the live table does not have yet"""
+    existing = {column['name']
+                for column in inspect(connection).get_columns(table.name)}
+    for column in index.columns:
+        if column.name not in existing:
+            ddl = CreateColumn(column).compile(dialect=connection.dialect)
+            connection.execute(text(f'ALTER TABLE `{table.name}` ADD COLUMN {ddl}'))
+            print(f"✅ Added {table.name}.{column.name}")
+
+
+def main():
+    rebuild = '--missing-only' not in sys.argv
+    app = create_app()
+
+    with app.app_context():
+        with db.engine.connect() as connection:
+            connection.execute(text(FULLTEXT_SESSION_SQL))
+            inspector = inspect(connection)
+
+            for table, index in fulltext_indexes():
+                if not inspector.has_table(table.name):
+                    print(f"⚠️ {table.name} does not exist, skipping {index.name}")
+                    continue
+
+                existing = {existing_index['name'] for existing_index
+                            in inspector.get_indexes(table.name)}
+                if index.name in existing:
+                    if not rebuild:
+                        continue
+                    print(f"🔄 Rebuilding {index.name} on {table.name}...")
+                    index.drop(connection)
+                else:
+                    add_missing_columns(connection, table, index)
+                    print(f"🔄 Creating {index.name} on {table.name}...")
+                index.create(connection)
+                connection.commit()
+                print(f"✅ {index.name} built without stopwords")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""
+Rebuild the precomputed Inventory_Lot.search_key column
+Adds the column and its FULLTEXT index to older databases, then recomputes
+every lot's key from its product and location
+
+Usage:
+    python rebuild_search_keys.py
+"""
+
+import sys
+from sqlalchemy import inspect, text
+from app import create_app
+from models import db
+from search import refresh_lot_search_keys, FULLTEXT_SESSION_SQL
+
+
+def ensure_search_key_column():
+    """Add Inventory_Lot.search_key (and its index) to databases created before it existed"""
+    inspector = inspect(db.engine)
+    columns = [column['name']
+               for column in inspector.get_columns('Inventory_Lot')]
+    if 'search_key' not in columns:
+        db.session.execute(text(
+            "ALTER TABLE Inventory_Lot ADD COLUMN search_key VARCHAR(255) AFTER expiry_date"))
+        db.session.commit()
+        print("✅ Added search_key column to Inventory_Lot")
+
+    indexes = [index['name']
+               for index in inspector.get_indexes('Inventory_Lot')]
+    if 'ft_lot_search' not in indexes:
+        # Build the index without stopwords, whatever the server default
+        db.session.execute(text(FULLTEXT_SESSION_SQL))
+        db.session.execute(text(
+            "ALTER TABLE Inventory_Lot ADD FULLTEXT INDEX ft_lot_search (search_key) WITH PARSER ngram"))
+        db.session.commit()
+        print("✅ Added ft_lot_search index to Inventory_Lot")
+    else:
+        print("ℹ️ ft_lot_search exists; run rebuild_fulltext_indexes.py if it "
+              "was built with InnoDB's default stopwords")
+
+
+def main():
+    app = create_app()
+
+    with app.app_context():
+        ensure_search_key_column()
+
+        print("🔍 Recomputing inventory lot search keys...")
+        updated = refresh_lot_search_keys(all_lots=True)
+        db.session.commit()
+        print(f"✅ Rebuilt search keys for {updated} inventory lots")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+Nightly slotting analysis
+Ranks SKUs by pick velocity and prints the recommended moves between
+storage and forward-pick locations (see slotting.py); nothing is moved
+
+Usage:
+    python recommend_slotting.py
+    python recommend_slotting.py --window-days 30 --cover-days 7 --limit 100
+    python recommend_slotting.py --csv slotting_moves.csv
+"""
+
+import argparse
+import csv
+import sys
+import time
+from app import create_app
+from slotting import (recommend_moves, DEFAULT_WINDOW_DAYS,
+                      DEFAULT_COVER_DAYS, DEFAULT_MOVE_LIMIT)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Recommend slotting moves')
+    parser.add_argument('--window-days', type=int, default=DEFAULT_WINDOW_DAYS,
+                        help='days of order history used for velocity')
+    parser.add_argument('--cover-days', type=int, default=DEFAULT_COVER_DAYS,
+                        help='days of demand to move into a forward location')
+    parser.add_argument('--limit', type=int, default=DEFAULT_MOVE_LIMIT,
+                        help='maximum number of moves')
+    parser.add_argument('--csv', help='also write the moves to this CSV file')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    app = create_app()
+
+    with app.app_context():
+        print("🔍 Computing pick velocity and slotting moves...")
+        started = time.perf_counter()
+        moves = recommend_moves(args.window_days, args.cover_days, args.limit)
+        elapsed = time.perf_counter() - started
+
+    for move in moves:
+        print(f"{move['rank']:>4}. {move['action']:<7} "
+              f"{move['product_name'] or move['product_id']} x{move['quantity']} "
+              f"{move['from_location_code']} -> {move['to_location_code']} "
+              f"({move['picks_per_day']} picks/day)")
+
+    if args.csv and moves:
+        with open(args.csv, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.DictWriter(f, fieldnames=list(moves[0]))
+            writer.writeheader()
+            writer.writerows(moves)
+        print(f"📄 Wrote {len(moves)} moves to {args.csv}")
+
+    print(f"✅ {len(moves)} slotting moves recommended in {elapsed:.2f}s")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
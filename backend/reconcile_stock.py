@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Reconcile maintained stock counters with the Inventory_Lot table
+Adds the counter column and Product_Stock table to older databases,
+reports drift in Location.current_stock and Product_Stock.on_hand and
+repairs it
+
+Usage:
+    python reconcile_stock.py            # detect and repair
+    python reconcile_stock.py --dry-run  # detect only
+"""
+
+import sys
+from sqlalchemy import inspect, text
+from app import create_app
+from models import db, ProductStock, InventoryReservation
+from stock import (reconcile_location_stock, reconcile_product_stock,
+                   refresh_expired_stock)
+
+
+def ensure_stock_columns():
+    """Add Location.current_stock, Product_Stock.expired and the Product_Stock and Inventory_Reservation tables to older databases"""
+    columns = [column['name']
+               for column in inspect(db.engine).get_columns('Location')]
+    if 'current_stock' not in columns:
+        db.session.execute(text(
+            "ALTER TABLE Location ADD COLUMN current_stock INT NOT NULL DEFAULT 0 AFTER status"))
+        db.session.commit()
+        print("✅ Added current_stock column to Location")
+
+    for model in (ProductStock, InventoryReservation):
+        if not inspect(db.engine).has_table(model.__tablename__):
+            model.__table__.create(db.engine)
+            print(f"✅ Created {model.__tablename__} table")
+
+    columns = [column['name']
+               for column in inspect(db.engine).get_columns('Product_Stock')]
+    if 'expired' not in columns:
+        db.session.execute(text(
+            "ALTER TABLE Product_Stock ADD COLUMN expired INT NOT NULL DEFAULT 0 AFTER reserved"))
+        db.session.commit()
+        print("✅ Added expired column to Product_Stock")
+
+
+def main():
+    repair = '--dry-run' not in sys.argv
+    app = create_app()
+
+    with app.app_context():
+        ensure_stock_columns()
+
+        checks = [
+            ('Location', 'location_id', 'Location.current_stock',
+             reconcile_location_stock),
+            ('Product', 'product_id', 'Product_Stock.on_hand',
+             reconcile_product_stock),
+        ]
+        total_drift = 0
+        for label, key, counter, reconcile in checks:
+            print(f"🔍 Checking {counter} against Inventory_Lot...")
+            drift = reconcile(repair=repair)
+            total_drift += len(drift)
+
+            if not drift:
+                print(f"✅ All {counter} counters are in sync")
+                continue
+
+            for row in drift:
+                print(
+                    f"⚠️ {label} {row[key]}: stored {row['stored']}, actual {row['actual']}")
+                if row.get('stored_reserved') != row.get('actual_reserved'):
+                    print(
+                        f"   reserved: stored {row['stored_reserved']}, actual {row['actual_reserved']}")
+
+            if repair:
+                print(f"🔧 Repaired {len(drift)} {counter} counters")
+            else:
+                print(f"❌ {len(drift)} {counter} counters out of sync (dry run)")
+
+        if repair:
+            changed = refresh_expired_stock()
+            print(f"✅ Refreshed Product_Stock.expired ({changed} changed)")
+
+        return 0 if repair or not total_drift else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,32 @@
+#!/usr/bin/env python3
+"""
+Nightly expired stock refresh
+Recomputes Product_Stock.expired (stock in lots past their expiry date),
+which order reservations do not count as available; run it shortly after
+midnight
+
+Usage:
+    python refresh_expired_stock.py
+"""
+
+import sys
+import time
+from app import create_app
+from stock import refresh_expired_stock
+
+
+def main():
+    app = create_app()
+
+    with app.app_context():
+        print("🔍 Recomputing expired stock per product...")
+        started = time.perf_counter()
+        changed = refresh_expired_stock()
+        elapsed = time.perf_counter() - started
+
+    print(f"✅ Updated Product_Stock.expired for {changed} products in {elapsed:.2f}s")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
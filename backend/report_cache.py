@@ -0,0 +1,223 @@
+"""Result cache for the report views
+
+``reports.execute_view_query`` runs ``SELECT * FROM <view>`` and several of
+the views join Order_Item against the whole order history, so results are
+kept here for a per-view TTL.
+
+An entry is also dropped as soon as a committed transaction has written one
+of the tables its view reads (``VIEW_DEPENDENCIES``). Writes are picked up
+by an engine ``after_execute`` hook, so ORM flushes, Core statements (the
+stock.py counter updates) and ``text()`` SQL are all seen, whether they run
+through the session or on a plain connection; they are applied when that
+connection commits. A result loaded while an invalidation happened is
+returned but not cached. Entries are keyed by date and earlier days are
+pruned. The cache lives in the process, so every worker keeps its own copy.
+"""
+
+import re
+import threading
+import time
+from datetime import date
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.sql.dml import UpdateBase
+from sqlalchemy.sql.elements import TextClause
+
+DEFAULT_TTL = 300
+
+# 依賴訂單歷史的重量級 view 可以放久一點，寫入時會主動失效
+VIEW_TTL = {
+    'v_idle_inventory_60d': 900,
+    'v_product_days_of_supply': 900,
+    'v_product_scrap_rate': 900,
+    'v_fast_moving_top10': 600,
+    'v_sales_30d': 600,
+    'v_shipments_today': 60,
+    'v_orders_unshipped_today': 60,
+}
+
+# view -> 讀取的資料表
+VIEW_DEPENDENCIES = {
+    'v_shipments_today': {'Shipment'},
+    'v_orders_pending': {'Order'},
+    'v_orders_arrived_today': {'Order'},
+    'v_orders_unshipped_today': {'Order', 'Shipment'},
+    'v_orders_delayed_shipping': {'Order', 'Shipment'},
+    'v_orders_to_ship_this_week': {'Order'},
+    'v_avg_order_processing_time': {'Order', 'Shipment'},
+    'v_sales_30d': {'Order', 'Order_Item'},
+    'v_orders_status_7d': {'Order'},
+    'v_avg_order_value_by_cust_type': {'Order', 'Customer'},
+    'v_customer_last_order': {'Customer', 'Order'},
+    'v_fast_moving_top10': {'Order', 'Order_Item', 'Product'},
+    'v_inventory_expired': {'Inventory_Lot', 'Product', 'Location'},
+    'v_low_stock': {'Inventory_Lot', 'Product', 'Location'},
+    'v_products_out_of_stock': {'Product', 'Inventory_Lot', 'Product_Stock'},
+    'v_lot_expiry_alert': {'Inventory_Lot', 'Product'},
+    'v_idle_inventory_60d': {'Inventory_Lot', 'Product', 'Order_Item', 'Order'},
+    'v_inventory_by_category': {'Product', 'Inventory_Lot', 'Product_Stock'},
+    'v_product_days_of_supply': {'Order', 'Order_Item', 'Product', 'Inventory_Lot',
+                                 'Product_Stock'},
+    'v_product_scrap_rate': {'Order', 'Order_Item', 'Scrap', 'Product'},
+    'v_scrap_cost_month': {'Scrap'},
+    'v_locations_over_capacity': {'Location', 'Inventory_Lot'},
+    'v_supplier_product_variants': {'Supplier', 'Supplier_Product'},
+    'v_vendor_delay_cnt': {'Shipment', 'Shipping_Vendor'},
+}
+
+_WRITTEN_TABLES_KEY = 'report_cache_written_tables'
+
+# text() 寫入語句的目標資料表
+_TEXT_WRITE = re.compile(
+    r'^\s*(?:INSERT\s+(?:IGNORE\s+)?INTO|REPLACE\s+INTO|UPDATE|DELETE\s+FROM)'
+    r'\s+[`"]?(\w+)', re.IGNORECASE)
+_TEXT_DDL = re.compile(r'^\s*(?:ALTER|DROP|TRUNCATE|CREATE|RENAME)\b',
+                       re.IGNORECASE)
+
+
+class ReportCache:
+    """Thread-safe view result cache with TTL and table-based invalidation"""
+
+    def __init__(self):
+        self._entries = {}
+        self._lock = threading.Lock()
+        # Bumped by every invalidation; see ``set``
+        self._generation = 0
+        self._day = None
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def make_key(view_name, params=None):
+        # The views compare against CURDATE(), so results never carry over
+        # to the next day
+        return (view_name, tuple(sorted((params or {}).items())),
+                date.today().isoformat())
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                self.hits += 1
+                return entry[1]
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def generation(self):
+        with self._lock:
+            return self._generation
+
+    def set(self, key, value, generation=None):
+        """Store ``value`` unless an invalidation happened since ``generation``
+
+        Pass ``generation()`` as read before running the loader, so a result
+        that may predate a committed write is never cached.
+        """
+        ttl = VIEW_TTL.get(key[0], DEFAULT_TTL)
+        with self._lock:
+            if generation is not None and generation != self._generation:
+                return False
+            if key[2] != self._day:
+                # A new day: entries keyed by earlier dates can never hit
+                self._day = key[2]
+                for old_key in [old_key for old_key in self._entries
+                                if old_key[2] != key[2]]:
+                    del self._entries[old_key]
+            self._entries[key] = (time.monotonic() + ttl, value)
+            return True
+
+    def invalidate_tables(self, tables=None):
+        """Drop every entry whose view reads one of ``tables`` (None: all)"""
+        with self._lock:
+            self._generation += 1
+            if tables is None:
+                stale = list(self._entries)
+            else:
+                tables = set(tables)
+                stale = [key for key in self._entries
+                         if VIEW_DEPENDENCIES.get(key[0], tables) & tables]
+            for key in stale:
+                del self._entries[key]
+            self.invalidations += len(stale)
+        return len(stale)
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'invalidations': self.invalidations,
+                'hit_rate': round(self.hits / lookups * 100, 1) if lookups else 0
+            }
+
+
+report_cache = ReportCache()
+
+
+def cached_view_query(view_name, loader, params=None):
+    """Return ``loader()`` for ``view_name``, served from the cache when fresh"""
+    key = ReportCache.make_key(view_name, params)
+    data = report_cache.get(key)
+    if data is None:
+        generation = report_cache.generation()
+        data = loader()
+        report_cache.set(key, data, generation)
+    return data
+
+
+def written_tables(statement):
+    """Tables ``statement`` writes: a set, or None when it cannot be told"""
+    if isinstance(statement, UpdateBase):
+        table = getattr(statement, 'table', None)
+        name = getattr(table, 'name', None)
+        return {name} if name else None
+    if isinstance(statement, TextClause):
+        statement = statement.text
+    if isinstance(statement, str):
+        match = _TEXT_WRITE.match(statement)
+        if match:
+            return {match.group(1)}
+        if _TEXT_DDL.match(statement):
+            return None
+    return set()
+
+
+def _pending_tables(connection):
+    # connection.info lives with the DBAPI connection, so tables written
+    # through the session and through a raw connection end up together
+    return connection.info.setdefault(_WRITTEN_TABLES_KEY, set())
+
+
+@event.listens_for(Engine, 'after_execute')
+def _record_written_tables(connection, clauseelement, multiparams, params,
+                           execution_options, result):
+    tables = written_tables(clauseelement)
+    if tables is None:
+        connection.info[_WRITTEN_TABLES_KEY] = None
+        return
+    if tables and connection.info.get(_WRITTEN_TABLES_KEY, set()) is not None:
+        _pending_tables(connection).update(tables)
+
+
+@event.listens_for(Engine, 'commit')
+def _invalidate_written_tables(connection):
+    if _WRITTEN_TABLES_KEY not in connection.info:
+        return
+    tables = connection.info.pop(_WRITTEN_TABLES_KEY)
+    if tables is None or tables:
+        report_cache.invalidate_tables(tables)
+
+
+@event.listens_for(Engine, 'rollback')
+def _discard_written_tables(connection):
+    connection.info.pop(_WRITTEN_TABLES_KEY, None)
@@ -1,20 +1,105 @@
 # reports.py
-from flask import Blueprint, jsonify, request
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+from flask import Blueprint, jsonify, request, current_app
 from sqlalchemy import text
 from app import db
+from report_cache import report_cache, cached_view_query
 
 reports_bp = Blueprint('reports', __name__, url_prefix='/api/reports')
 
 # Utility function to execute view queries
 
 
-def execute_view_query(view_name):
-    try:
-        query = text(f"SELECT * FROM {view_name}")
-        result = db.session.execute(query)
-        return [dict(row._mapping) for row in result]
-    except Exception as e:
-        raise e
+def _load_view(view_name, timeout=None):
+    """Rows of ``view_name``; ``timeout`` (seconds) is enforced by MySQL"""
+    hint = ''
+    if timeout and db.engine.dialect.name == 'mysql':
+        # The server aborts the statement itself, so a slow view never
+        # keeps a connection (or a summary worker) busy past the deadline
+        hint = f'/*+ MAX_EXECUTION_TIME({int(timeout * 1000)}) */ '
+    query = text(f"SELECT {hint}* FROM {view_name}")
+    result = db.session.execute(query)
+    return [dict(row._mapping) for row in result]
+
+
+def execute_view_query(view_name, use_cache=True, timeout=None):
+    """Rows of ``view_name``, served from the report cache when fresh"""
+    if not use_cache:
+        return _load_view(view_name, timeout)
+    return cached_view_query(view_name,
+                             lambda: _load_view(view_name, timeout))
+
+
+# Summary endpoints run their views concurrently on a bounded pool per app
+# (``REPORT_SUMMARY_WORKERS``, default 4); each worker pushes its own app
+# context and so gets its own session/connection
+_summary_pool_lock = threading.Lock()
+
+
+def _summary_pool(app):
+    pool = app.extensions.get('report_summary_pool')
+    if pool is None:
+        with _summary_pool_lock:
+            pool = app.extensions.get('report_summary_pool')
+            if pool is None:
+                pool = ThreadPoolExecutor(
+                    max_workers=app.config.get('REPORT_SUMMARY_WORKERS', 4),
+                    thread_name_prefix='report-summary')
+                app.extensions['report_summary_pool'] = pool
+    return pool
+
+
+def _view_query_in_context(app, view_name, timeout):
+    with app.app_context():
+        return execute_view_query(view_name, timeout=timeout)
+
+
+def run_view_queries(views, timeout=None):
+    """Run ``{key: view_name}`` concurrently
+
+    Returns ``(results, errors)``. A view that fails or does not finish
+    within ``timeout`` seconds (``REPORT_SUMMARY_TIMEOUT``, default 10) gets
+    an empty list in ``results`` and a message in ``errors``. On MySQL the
+    same limit is sent with the query (``MAX_EXECUTION_TIME``), so a view
+    that times out is also stopped on the server and frees its worker.
+    """
+    app = current_app._get_current_object()
+    if timeout is None:
+        timeout = app.config.get('REPORT_SUMMARY_TIMEOUT', 10)
+
+    pool = _summary_pool(app)
+    futures = {
+        key: pool.submit(_view_query_in_context, app, view_name, timeout)
+        for key, view_name in views.items()
+    }
+    done, _ = wait(futures.values(), timeout=timeout)
+
+    results, errors = {}, {}
+    for key, future in futures.items():
+        if future not in done:
+            # Only stops a query that has not started; running ones are
+            # aborted by MAX_EXECUTION_TIME
+            future.cancel()
+            results[key], errors[key] = [], f'Timed out after {timeout}s'
+        elif future.exception() is not None:
+            results[key], errors[key] = [], str(future.exception())
+        else:
+            results[key] = future.result()
+
+    if errors and len(errors) == len(futures):
+        raise RuntimeError('; '.join(f'{views[key]}: {error}'
+                                     for key, error in errors.items()))
+    return results, errors
+
+
+def summary_response(data, errors):
+    """Summary payload, flagged as partial when some views failed"""
+    response = {'success': True, 'data': data}
+    if errors:
+        response['partial'] = True
+        response['errors'] = errors
+    return jsonify(response)
 
 # ========== INVENTORY REPORTS ==========
 
@@ -280,26 +365,29 @@ def get_supplier_product_variants():
 def get_inventory_summary():
     """Get comprehensive inventory summary"""
     try:
-        expired = execute_view_query('v_inventory_expired')
-        low_stock = execute_view_query('v_low_stock')
-        out_of_stock = execute_view_query('v_products_out_of_stock')
-        over_capacity = execute_view_query('v_locations_over_capacity')
-
-        return jsonify({
-            'success': True,
-            'data': {
-                'expired_items': expired,
-                'low_stock_items': low_stock,
-                'out_of_stock_products': out_of_stock,
-                'over_capacity_locations': over_capacity,
-                'summary': {
-                    'expired_count': len(expired),
-                    'low_stock_count': len(low_stock),
-                    'out_of_stock_count': len(out_of_stock),
-                    'over_capacity_count': len(over_capacity)
-                }
-            }
+        views, errors = run_view_queries({
+            'expired': 'v_inventory_expired',
+            'low_stock': 'v_low_stock',
+            'out_of_stock': 'v_products_out_of_stock',
+            'over_capacity': 'v_locations_over_capacity'
         })
+        expired = views['expired']
+        low_stock = views['low_stock']
+        out_of_stock = views['out_of_stock']
+        over_capacity = views['over_capacity']
+
+        return summary_response({
+            'expired_items': expired,
+            'low_stock_items': low_stock,
+            'out_of_stock_products': out_of_stock,
+            'over_capacity_locations': over_capacity,
+            'summary': {
+                'expired_count': len(expired),
+                'low_stock_count': len(low_stock),
+                'out_of_stock_count': len(out_of_stock),
+                'over_capacity_count': len(over_capacity)
+            }
+        }, errors)
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
@@ -308,26 +396,29 @@ def get_inventory_summary():
 def get_orders_summary():
     """Get comprehensive orders summary"""
     try:
-        pending = execute_view_query('v_orders_pending')
-        unshipped_today = execute_view_query('v_orders_unshipped_today')
-        delayed = execute_view_query('v_orders_delayed_shipping')
-        this_week = execute_view_query('v_orders_to_ship_this_week')
-
-        return jsonify({
-            'success': True,
-            'data': {
-                'pending_orders': pending,
-                'unshipped_today': unshipped_today,
-                'delayed_orders': delayed,
-                'this_week_shipments': this_week,
-                'summary': {
-                    'pending_count': len(pending),
-                    'unshipped_today_count': len(unshipped_today),
-                    'delayed_count': len(delayed),
-                    'this_week_count': len(this_week)
-                }
-            }
+        views, errors = run_view_queries({
+            'pending': 'v_orders_pending',
+            'unshipped_today': 'v_orders_unshipped_today',
+            'delayed': 'v_orders_delayed_shipping',
+            'this_week': 'v_orders_to_ship_this_week'
         })
+        pending = views['pending']
+        unshipped_today = views['unshipped_today']
+        delayed = views['delayed']
+        this_week = views['this_week']
+
+        return summary_response({
+            'pending_orders': pending,
+            'unshipped_today': unshipped_today,
+            'delayed_orders': delayed,
+            'this_week_shipments': this_week,
+            'summary': {
+                'pending_count': len(pending),
+                'unshipped_today_count': len(unshipped_today),
+                'delayed_count': len(delayed),
+                'this_week_count': len(this_week)
+            }
+        }, errors)
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
@@ -336,23 +427,25 @@ def get_orders_summary():
 def get_sales_summary():
     """Get comprehensive sales summary"""
     try:
-        sales_30d = execute_view_query('v_sales_30d')
-        fast_moving = execute_view_query('v_fast_moving_top10')
-        avg_order_value = execute_view_query('v_avg_order_value_by_cust_type')
-
-        return jsonify({
-            'success': True,
-            'data': {
-                'sales_30d': sales_30d,
-                'fast_moving_products': fast_moving,
-                'avg_order_value_by_type': avg_order_value,
-                'summary': {
-                    'sales_days_count': len(sales_30d),
-                    'top_products_count': len(fast_moving),
-                    'customer_types_count': len(avg_order_value)
-                }
-            }
+        views, errors = run_view_queries({
+            'sales_30d': 'v_sales_30d',
+            'fast_moving': 'v_fast_moving_top10',
+            'avg_order_value': 'v_avg_order_value_by_cust_type'
         })
+        sales_30d = views['sales_30d']
+        fast_moving = views['fast_moving']
+        avg_order_value = views['avg_order_value']
+
+        return summary_response({
+            'sales_30d': sales_30d,
+            'fast_moving_products': fast_moving,
+            'avg_order_value_by_type': avg_order_value,
+            'summary': {
+                'sales_days_count': len(sales_30d),
+                'top_products_count': len(fast_moving),
+                'customer_types_count': len(avg_order_value)
+            }
+        }, errors)
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
@@ -361,22 +454,39 @@ def get_sales_summary():
 def get_financial_summary():
     """Get comprehensive financial summary"""
     try:
-        scrap_cost = execute_view_query('v_scrap_cost_month')
-        scrap_rate = execute_view_query('v_product_scrap_rate')
-        avg_order_value = execute_view_query('v_avg_order_value_by_cust_type')
-
-        return jsonify({
-            'success': True,
-            'data': {
-                'monthly_scrap_cost': scrap_cost,
-                'product_scrap_rates': scrap_rate,
-                'avg_order_values': avg_order_value,
-                'summary': {
-                    'scrap_cost_records': len(scrap_cost),
-                    'products_with_scrap': len(scrap_rate),
-                    'customer_segments': len(avg_order_value)
-                }
-            }
+        views, errors = run_view_queries({
+            'scrap_cost': 'v_scrap_cost_month',
+            'scrap_rate': 'v_product_scrap_rate',
+            'avg_order_value': 'v_avg_order_value_by_cust_type'
         })
+        scrap_cost = views['scrap_cost']
+        scrap_rate = views['scrap_rate']
+        avg_order_value = views['avg_order_value']
+
+        return summary_response({
+            'monthly_scrap_cost': scrap_cost,
+            'product_scrap_rates': scrap_rate,
+            'avg_order_values': avg_order_value,
+            'summary': {
+                'scrap_cost_records': len(scrap_cost),
+                'products_with_scrap': len(scrap_rate),
+                'customer_segments': len(avg_order_value)
+            }
+        }, errors)
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
+
+# ========== CACHE ==========
+
+
+@reports_bp.route('/cache/stats')
+def get_report_cache_stats():
+    """Get report cache hit/miss counters"""
+    return jsonify({'success': True, 'data': report_cache.stats()})
+
+
+@reports_bp.route('/cache/clear', methods=['POST'])
+def clear_report_cache():
+    """Drop every cached report result"""
+    report_cache.clear()
+    return jsonify({'success': True, 'message': 'Report cache cleared'})
@@ -0,0 +1,274 @@
+"""Order stock reservations
+
+Placing an order no longer touches the lots. ``reserve_stock`` locks the
+products' ``Product_Stock`` rows (one narrow row per SKU, in product_id
+order), checks ``on_hand - reserved - expired`` and raises ``reserved``;
+each order item gets an ``Inventory_Reservation`` row. Lots are only read
+and decremented when the order is picked:
+
+- ``pick_orders`` takes the reserved quantity from the lots chosen by an
+  allocation strategy (allocation.py, FEFO by default), lowers
+  ``reserved`` and turns the reservation rows into ``picked`` rows, one
+  per lot.
+- ``release_order_items`` undoes either state when an order or item is
+  cancelled: reserved quantity is handed back to ``Product_Stock.reserved``,
+  picked quantity goes back into the lots it was taken from.
+
+Lock order matches stock.py: lots first, then the Location and Product_Stock
+counters. Reserving only locks Product_Stock rows, so it never waits on lot
+locks held by movements or picks.
+"""
+
+from collections import defaultdict
+from sqlalchemy import delete, insert, select
+from models import db, InventoryLot, InventoryReservation, ProductStock
+from stock import (InsufficientStock, adjust_reserved_stock,
+                   create_product_stock_rows, deduct_lots, ensure_lots,
+                   lock_lots, lock_product_lots)
+from allocation import allocate, get_strategy
+
+RESERVED = 'reserved'
+PICKED = 'picked'
+RELEASED = 'released'
+
+# Order statuses (lower-cased) that end the order's hold on stock
+CANCELLED_STATUSES = ['cancelled', '已取消']
+SHIPPED_STATUSES = ['shipped', '已出貨']
+
+
+def find_shortage(requested, available):
+    """First ``(product_id, available)`` that cannot cover ``requested``, or None"""
+    for product_id, quantity in requested.items():
+        if available.get(product_id, 0) < quantity:
+            return product_id, available.get(product_id, 0)
+    return None
+
+
+def reserve_stock(requested):
+    """Reserve ``{product_id: quantity}``; returns the shortage or None
+
+    The Product_Stock rows are locked (``SELECT ... FOR UPDATE`` in
+    product_id order) so two orders cannot both claim the same units.
+    Stock in expired lots (``Product_Stock.expired``) is not available:
+    ``on_hand`` counts it, but picking (``allocation.is_usable``) never takes
+    it. On a shortage nothing is reserved and ``(product_id, available)`` is
+    returned.
+    """
+    table = ProductStock.__table__
+    lock = (select(table.c.product_id,
+                   table.c.on_hand - table.c.reserved - table.c.expired)
+            .where(table.c.product_id.in_(sorted(requested)))
+            .order_by(table.c.product_id)
+            .with_for_update())
+    rows = db.session.execute(lock).all()
+    if len(rows) < len(requested):
+        # Products without a Product_Stock row yet: create them from their
+        # lots instead of reporting no stock
+        create_product_stock_rows({product_id: 0 for product_id in requested})
+        rows = db.session.execute(lock).all()
+    shortage = find_shortage(requested, dict(rows))
+    if shortage is None:
+        adjust_reserved_stock(requested)
+    return shortage
+
+
+def _lock_reservations(*criteria):
+    """Lock the reservations matching ``criteria`` by primary key
+
+    The ids are read first and then locked with a primary key lookup, so
+    no gap locks are held on the secondary indexes that new orders insert
+    into. ``criteria`` are checked again on the locked rows.
+    """
+    ids = [reservation_id for (reservation_id,) in db.session.query(
+        InventoryReservation.reservation_id).filter(*criteria)]
+    if not ids:
+        return []
+    return InventoryReservation.query.filter(
+        InventoryReservation.reservation_id.in_(ids), *criteria
+    ).order_by(InventoryReservation.reservation_id).with_for_update().all()
+
+
+def record_reservations(order_items):
+    """Insert a ``reserved`` row for each (flushed) order item"""
+    rows = [{
+        'order_id': item.order_id,
+        'order_item_id': item.order_item_id,
+        'product_id': item.product_id,
+        'quantity': item.quantity,
+        'status': RESERVED
+    } for item in order_items if item.quantity]
+    if rows:
+        db.session.execute(insert(InventoryReservation), rows)
+
+
+def split_picks(reservations, picks):
+    """Hand each reservation its share of the product's picks, in order
+
+    Returns one ``{order_id, order_item_id, product_id, location_id,
+    quantity}`` dict per (reservation, lot) pair. ``picks`` must cover the
+    reservations (see ``find_shortage``).
+    """
+    picks_by_product = defaultdict(list)
+    for lot, quantity in picks:
+        picks_by_product[lot.product_id].append([lot.location_id, quantity])
+    lines = []
+    for reservation in reservations:
+        remaining = reservation.quantity
+        product_picks = picks_by_product[reservation.product_id]
+        while remaining and product_picks:
+            pick = product_picks[0]
+            take = min(pick[1], remaining)
+            lines.append({
+                'order_id': reservation.order_id,
+                'order_item_id': reservation.order_item_id,
+                'product_id': reservation.product_id,
+                'location_id': pick[0],
+                'quantity': take
+            })
+            remaining -= take
+            pick[1] -= take
+            if not pick[1]:
+                product_picks.pop(0)
+    return lines
+
+
+def pick_orders(order_ids, strategy=None, shortages=None, **options):
+    """Take the reserved stock of ``order_ids`` out of the lots together
+
+    The orders' demand is allocated as one batch: one lock query for the
+    reservations, one for the lots. ``strategy`` and ``options`` are passed
+    to ``allocation.allocate``. Returns the picked lines (``split_picks``).
+    Raises InsufficientStock when the usable (unexpired) lots no longer hold
+    enough, e.g. stock was scrapped, moved out or expired after the order
+    was placed. With a ``shortages`` list the orders that need a short
+    product are left reserved instead, and a ``{product_id, requested,
+    available}`` dict is appended for each short product.
+    """
+    reservations = _lock_reservations(
+        InventoryReservation.order_id.in_(list(order_ids)),
+        InventoryReservation.status == RESERVED)
+    if not reservations:
+        return []
+
+    requested = defaultdict(int)
+    for reservation in reservations:
+        requested[reservation.product_id] += reservation.quantity
+
+    get_strategy(strategy)
+    lots = lock_product_lots(requested)
+    picks, available = allocate(lots, requested, strategy, **options)
+    shortage = find_shortage(requested, available)
+    if shortage is not None and shortages is not None:
+        short = {product_id for product_id, quantity in requested.items()
+                 if available[product_id] < quantity}
+        shortages.extend({
+            'product_id': product_id,
+            'requested': requested[product_id],
+            'available': available[product_id]
+        } for product_id in sorted(short))
+        # Every remaining product was covered with the larger demand, so
+        # allocating again over the same locked lots cannot come up short
+        skipped = {reservation.order_id for reservation in reservations
+                   if reservation.product_id in short}
+        reservations = [reservation for reservation in reservations
+                        if reservation.order_id not in skipped]
+        requested = defaultdict(int)
+        for reservation in reservations:
+            requested[reservation.product_id] += reservation.quantity
+        if not reservations:
+            return []
+        picks, available = allocate(lots, requested, strategy, **options)
+        shortage = None
+    if shortage is not None:
+        raise InsufficientStock(
+            f'Insufficient inventory to pick product {shortage[0]}. '
+            f'Usable on hand: {shortage[1]}, Reserved: {requested[shortage[0]]}')
+
+    lines = split_picks(reservations, picks)
+    deduct_lots(picks)
+    adjust_reserved_stock({product_id: -quantity
+                           for product_id, quantity in requested.items()})
+
+    db.session.execute(delete(InventoryReservation).where(
+        InventoryReservation.reservation_id.in_(
+            [reservation.reservation_id for reservation in reservations])))
+    db.session.execute(insert(InventoryReservation),
+                       [dict(line, status=PICKED) for line in lines])
+    return lines
+
+
+def pick_order(order_id, strategy=None, **options):
+    """``pick_orders`` for one order; returns the number of units picked"""
+    lines = pick_orders([order_id], strategy, **options)
+    return sum(line['quantity'] for line in lines)
+
+
+def release_order_items(order_items):
+    """Give back the stock held by ``order_items``
+
+    Reserved quantity is released from ``Product_Stock.reserved``; picked
+    quantity is put back into the lots it was picked from (recreating a lot
+    that has since been removed). Their rows become ``released``, so
+    releasing twice is a no-op until ``delete_reservations`` drops them with
+    the order item. Items placed before reservations existed have no rows; their
+    stock was taken at order time and goes back into the product's first
+    lot, if it still has one.
+    """
+    order_items = list(order_items)
+    if not order_items:
+        return
+    reservations = _lock_reservations(
+        InventoryReservation.order_item_id.in_(
+            [item.order_item_id for item in order_items]))
+
+    released = defaultdict(int)
+    restocked = defaultdict(int)
+    for reservation in reservations:
+        if reservation.status == RESERVED:
+            released[reservation.product_id] += reservation.quantity
+        elif (reservation.status == PICKED
+              and reservation.location_id is not None):
+            restocked[(reservation.product_id,
+                       reservation.location_id)] += reservation.quantity
+        reservation.status = RELEASED
+
+    tracked = {reservation.order_item_id for reservation in reservations}
+    legacy = [item for item in order_items
+              if item.order_item_id not in tracked and item.quantity]
+    if legacy:
+        first_lots = dict(db.session.query(
+            InventoryLot.product_id, db.func.min(InventoryLot.location_id)
+        ).filter(
+            InventoryLot.product_id.in_({item.product_id for item in legacy})
+        ).group_by(InventoryLot.product_id).all())
+        for item in legacy:
+            if item.product_id in first_lots:
+                restocked[(item.product_id,
+                           first_lots[item.product_id])] += item.quantity
+        # Leave a released row behind so the stock is not returned twice
+        db.session.execute(insert(InventoryReservation), [{
+            'order_id': item.order_id,
+            'order_item_id': item.order_item_id,
+            'product_id': item.product_id,
+            'quantity': item.quantity,
+            'status': RELEASED
+        } for item in legacy])
+
+    # Back into the lots through the ORM; the stock.py flush hooks adjust
+    # the Location and Product_Stock counters
+    ensure_lots(restocked)
+    lots = {(lot.product_id, lot.location_id): lot
+            for lot in lock_lots(restocked)}
+    for key, quantity in sorted(restocked.items()):
+        lots[key].quantity += quantity
+
+    adjust_reserved_stock({product_id: -quantity
+                           for product_id, quantity in released.items()})
+
+
+def delete_reservations(order_items):
+    """Drop the reservation rows of order items that are being deleted"""
+    item_ids = [item.order_item_id for item in order_items]
+    if item_ids:
+        db.session.execute(delete(InventoryReservation).where(
+            InventoryReservation.order_item_id.in_(item_ids)))
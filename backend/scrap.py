@@ -3,81 +3,85 @@ from models import db, Scrap, Product, Location, InventoryLot
 from datetime import datetime, date
 from sqlalchemy import func, and_
 from sqlalchemy.exc import IntegrityError
+from stats import scrap_stats
+from pagination import paginate_query, InvalidCursor
 
 scrap_bp = Blueprint('scrap', __name__, url_prefix='/api/scrap')
 
 
+def filter_scrap(query, args):
+    """Apply the scrap list filters in ``args`` to a query joined with Product
+
+    Raises ValueError for a malformed date.
+    """
+    product_filter = args.get('product_id', type=int)
+    location_filter = args.get('location_id', type=int)
+    search = args.get('search', '').strip()
+    date_from = args.get('date_from')
+    date_to = args.get('date_to')
+
+    if product_filter:
+        query = query.filter(Scrap.product_id == product_filter)
+    if location_filter:
+        query = query.filter(Scrap.location_id == location_filter)
+    if search:
+        query = query.filter(
+            func.concat(Product.name, ' ', Scrap.reason).contains(search)
+        )
+
+    # Date range filter
+    if date_from:
+        try:
+            from_date = datetime.strptime(date_from, '%Y-%m-%d').date()
+        except ValueError:
+            raise ValueError('Invalid date_from format. Use YYYY-MM-DD')
+        query = query.filter(Scrap.scrap_date >= from_date)
+
+    if date_to:
+        try:
+            to_date = datetime.strptime(date_to, '%Y-%m-%d').date()
+        except ValueError:
+            raise ValueError('Invalid date_to format. Use YYYY-MM-DD')
+        query = query.filter(Scrap.scrap_date <= to_date)
+
+    return query
+
+
 @scrap_bp.route('', methods=['GET'])
 def get_scrap_records():
     """Get all scrap records with pagination and filtering"""
     try:
-        page = request.args.get('page', 1, type=int)
-        per_page = request.args.get('per_page', 10, type=int)
-        product_filter = request.args.get('product_id', type=int)
-        location_filter = request.args.get('location_id', type=int)
-        search = request.args.get('search', '').strip()
-        date_from = request.args.get('date_from')
-        date_to = request.args.get('date_to')
-
         # Build query with joins
         query = db.session.query(Scrap).join(Product).join(Location)
+        try:
+            query = filter_scrap(query, request.args)
+        except ValueError as e:
+            return jsonify({
+                'success': False,
+                'error': str(e)
+            }), 400
 
-        # Apply filters
-        if product_filter:
-            query = query.filter(Scrap.product_id == product_filter)
-        if location_filter:
-            query = query.filter(Scrap.location_id == location_filter)
-        if search:
-            query = query.filter(
-                func.concat(Product.name, ' ', Scrap.reason).contains(search)
-            )
-
-        # Date range filter
-        if date_from:
-            try:
-                from_date = datetime.strptime(date_from, '%Y-%m-%d').date()
-                query = query.filter(Scrap.scrap_date >= from_date)
-            except ValueError:
-                return jsonify({
-                    'success': False,
-                    'error': 'Invalid date_from format. Use YYYY-MM-DD'
-                }), 400
-
-        if date_to:
-            try:
-                to_date = datetime.strptime(date_to, '%Y-%m-%d').date()
-                query = query.filter(Scrap.scrap_date <= to_date)
-            except ValueError:
-                return jsonify({
-                    'success': False,
-                    'error': 'Invalid date_to format. Use YYYY-MM-DD'
-                }), 400
-
-        # Order by most recent scrap date first
-        query = query.order_by(Scrap.scrap_date.desc())
-
-        # Paginate
-        pagination = query.paginate(
-            page=page, per_page=per_page, error_out=False
-        )
+        # Most recent scrap date first; page or cursor mode
+        items, pagination = paginate_query(query, [
+            (Scrap.scrap_date, True),
+            (Scrap.scrap_id, True)
+        ])
 
         scrap_records = []
-        for scrap in pagination.items:
+        for scrap in items:
             scrap_records.append(scrap.to_dict())
 
         return jsonify({
             'success': True,
             'data': scrap_records,
-            'pagination': {
-                'page': pagination.page,
-                'pages': pagination.pages,
-                'per_page': pagination.per_page,
-                'total': pagination.total,
-                'has_next': pagination.has_next,
-                'has_prev': pagination.has_prev
-            }
+            'pagination': pagination
         })
 
+    except InvalidCursor as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
     except Exception as e:
         return jsonify({
             'success': False,
@@ -393,12 +397,8 @@ def process_scrap_record(scrap_id):
 def get_scrap_stats():
     """Get scrap statistics"""
     try:
-        # Total scrapped items
-        total_scrapped = db.session.query(
-            func.sum(Scrap.quantity)).scalar() or 0
-
-        # Total scrap records
-        total_records = Scrap.query.count()
+        # Totals, recent/monthly figures and status counts in one scan
+        stats = scrap_stats()
 
         # Scrap by category
         category_stats = db.session.query(
@@ -416,29 +416,6 @@ def get_scrap_stats():
             } for stat in category_stats
         ]
 
-        # Recent scrap (last 30 days)
-        from datetime import timedelta
-        thirty_days_ago = date.today() - timedelta(days=30)
-        recent_scrap = db.session.query(func.sum(Scrap.quantity)).filter(
-            Scrap.scrap_date >= thirty_days_ago
-        ).scalar() or 0
-
-        # This month's scrap count
-        today = date.today()
-        month_start = date(today.year, today.month, 1)
-        monthly_scrap = db.session.query(func.count(Scrap.scrap_id)).filter(
-            Scrap.scrap_date >= month_start
-        ).scalar() or 0
-
-        # Status-based counts
-        pending_count = Scrap.query.filter_by(status='待處理').count()
-        processing_count = Scrap.query.filter_by(status='處理中').count()
-        processed_count = Scrap.query.filter_by(status='已處理').count()
-
-        # Total estimated value
-        total_estimated_value = db.session.query(
-            func.sum(Scrap.estimated_value)).scalar() or 0
-
         # Top scrap reasons
         reason_stats = db.session.query(
             Scrap.reason,
@@ -474,14 +451,8 @@ def get_scrap_stats():
         return jsonify({
             'success': True,
             'data': {
-                'total_scrapped': total_scrapped,
-                'total_records': total_records,
-                'recent_scrap_30days': recent_scrap,
-                'monthly_scrap': monthly_scrap,
-                'pending_count': pending_count,
-                'processing_count': processing_count,
-                'processed_count': processed_count,
-                'total_estimated_value': float(total_estimated_value),
+                **stats,
+                'total_estimated_value': float(stats['total_estimated_value']),
                 'category_breakdown': category_breakdown,
                 'top_reasons': top_reasons,
                 'top_locations': top_locations
@@ -0,0 +1,178 @@
+"""Full-text search for the list endpoints
+
+Searchable columns are covered by MySQL ``FULLTEXT ... WITH PARSER ngram``
+indexes (declared in models.py), so ``?search=`` is answered from the index
+instead of a ``LIKE '%term%'`` scan. The ngram parser splits text into
+2-character tokens, which works for Chinese names as well as codes and
+e-mail addresses, and InnoDB keeps the index in sync on every write.
+
+Two modes, both ranked by MATCH relevance:
+
+- prefix (default): every word in the term must appear; ``+word*`` in
+  BOOLEAN MODE, which with ngram tokens matches the word anywhere in the
+  column (like the old ``contains``) and prefixes shorter than a token.
+  Codes and e-mail addresses (tokens with punctuation inside) are matched
+  as a ``+"phrase"``, i.e. as that exact text.
+- fuzzy (``?fuzzy=true``): NATURAL LANGUAGE MODE, rows sharing any ngram
+  with the term, best overlap first, so typos and partial words still match.
+
+The column list passed to ``search_filter`` must match a FULLTEXT index
+exactly; use the ``*_SEARCH_COLUMNS`` tuples below.
+
+InnoDB's ngram parser drops every token that contains a stopword, and the
+default list has single letters such as "a" and "i", so most English
+bigrams would never be indexed. The indexes must therefore be created with
+``innodb_ft_enable_stopword = 0`` (the stopword list is fixed when an index
+is built): app.py runs ``FULLTEXT_SESSION_SQL`` on every MySQL connection,
+ddl.sql sets it before its CREATE TABLEs, and ``rebuild_fulltext_indexes.py``
+rebuilds indexes of older databases without stopwords.
+
+Inventory lots are searched by product name and location, which live in
+other tables. ``Inventory_Lot.search_key`` holds that text precomputed
+(``lot_search_key``) so it can be indexed. The session flush hook below
+refreshes it for new lots and when a product is renamed or a location's
+code/zone/shelf changes; ``apply_lot_delta`` refreshes lots it creates with
+Core statements. ``rebuild_search_keys.py`` backfills older databases.
+"""
+
+import re
+from sqlalchemy import event, func, inspect, or_, select, tuple_, update
+from sqlalchemy.dialects.mysql import match
+from models import db, Product, Supplier, Customer, Location, User, InventoryLot
+
+PRODUCT_SEARCH_COLUMNS = (Product.name, Product.category)
+SUPPLIER_SEARCH_COLUMNS = (Supplier.supplier_name, Supplier.contact_name,
+                           Supplier.email)
+CUSTOMER_SEARCH_COLUMNS = (Customer.name, Customer.contact, Customer.address)
+LOCATION_SEARCH_COLUMNS = (Location.location_code, Location.location_name,
+                           Location.zone, Location.shelf)
+USER_SEARCH_COLUMNS = (User.account,)
+LOT_SEARCH_COLUMNS = (InventoryLot.search_key,)
+
+# Location attributes that are part of a lot's search key
+_LOCATION_KEY_ATTRIBUTES = ('location_code', 'zone', 'shelf')
+
+# Run on each MySQL connection so FULLTEXT indexes it builds keep every ngram
+FULLTEXT_SESSION_SQL = 'SET SESSION innodb_ft_enable_stopword = 0'
+
+# Words only; drops the BOOLEAN MODE operators (+ - < > ( ) ~ * " @)
+_WORD = re.compile(r'\w+')
+# Punctuation around a token ("bolt," or "(A-01)") is not part of it
+_EDGE_PUNCTUATION = re.compile(r'^\W+|\W+$')
+
+
+def boolean_prefix_query(term):
+    """``'abc A-01-02'`` -> ``'+abc* +"A-01-02"'``, or '' if there are no words
+
+    A plain word becomes a required prefix. A token with punctuation
+    inside (a location code, an e-mail address) becomes a required phrase,
+    so it matches that exact text like the old ``contains`` did, instead of
+    each fragment anywhere in the row.
+    """
+    parts = []
+    for token in term.split():
+        token = _EDGE_PUNCTUATION.sub('', token)
+        if not token:
+            continue
+        if _WORD.fullmatch(token):
+            parts.append(f'+{token}*')
+        else:
+            parts.append('+"{}"'.format(token.replace('"', '')))
+    return ' '.join(parts)
+
+
+def search_filter(columns, term, fuzzy=False):
+    """Return ``(criterion, relevance)`` for ``term`` over ``columns``
+
+    Filter with ``criterion`` and order by ``relevance.desc()``. Returns
+    ``(None, None)`` when the term has nothing to search for.
+    """
+    term = (term or '').strip()
+    if fuzzy:
+        words = ' '.join(_WORD.findall(term))
+        if not words:
+            return None, None
+        relevance = match(*columns, against=words).in_natural_language_mode()
+    else:
+        words = boolean_prefix_query(term)
+        if not words:
+            return None, None
+        relevance = match(*columns, against=words).in_boolean_mode()
+    return relevance > 0, relevance
+
+
+def apply_search(query, columns, term, fuzzy=False):
+    """Filter ``query`` by ``term`` and rank the matches first
+
+    Any ``order_by`` added afterwards breaks ties between equally
+    relevant rows.
+    """
+    criterion, relevance = search_filter(columns, term, fuzzy)
+    if criterion is None:
+        return query
+    return query.filter(criterion).order_by(relevance.desc())
+
+
+def fuzzy_requested(args):
+    return args.get('fuzzy', 'false').lower() in ('1', 'true', 'yes')
+
+
+def lot_search_key(lot_table=None):
+    """Correlated scalar subquery computing a lot's search key"""
+    lot_table = lot_table if lot_table is not None else InventoryLot.__table__
+    return select(
+        func.concat(Product.name, ' ', Location.location_code, ' ',
+                    Location.zone, ' ', Location.shelf)
+    ).where(
+        Product.product_id == lot_table.c.product_id,
+        Location.location_id == lot_table.c.location_id
+    ).scalar_subquery()
+
+
+def refresh_lot_search_keys(product_ids=(), location_ids=(), lot_keys=(),
+                            all_lots=False, connection=None):
+    """Recompute search_key for the matching lots in one UPDATE
+
+    Selects lots of ``product_ids``, lots at ``location_ids`` and the
+    ``(product_id, location_id)`` pairs in ``lot_keys``, or every lot with
+    ``all_lots=True``. Returns the number of rows updated.
+    """
+    table = InventoryLot.__table__
+    conditions = []
+    if product_ids:
+        conditions.append(table.c.product_id.in_(sorted(product_ids)))
+    if location_ids:
+        conditions.append(table.c.location_id.in_(sorted(location_ids)))
+    if lot_keys:
+        conditions.append(tuple_(table.c.product_id, table.c.location_id)
+                          .in_(sorted(lot_keys)))
+    if not conditions and not all_lots:
+        return 0
+
+    statement = update(table).values(search_key=lot_search_key(table))
+    if not all_lots:
+        statement = statement.where(or_(*conditions))
+    connection = connection or db.session.connection()
+    return connection.execute(statement).rowcount
+
+
+def _changed(obj, attributes):
+    state = inspect(obj)
+    return any(state.attrs[name].history.has_changes() for name in attributes)
+
+
+@event.listens_for(db.session, 'after_flush')
+def _refresh_changed_lot_search_keys(session, flush_context):
+    # new/dirty and attribute history still describe the flushed changes here
+    product_ids, location_ids, lot_keys = set(), set(), set()
+    for obj in session.new:
+        if isinstance(obj, InventoryLot):
+            lot_keys.add((obj.product_id, obj.location_id))
+    for obj in session.dirty:
+        if isinstance(obj, Product) and _changed(obj, ('name',)):
+            product_ids.add(obj.product_id)
+        elif (isinstance(obj, Location)
+              and _changed(obj, _LOCATION_KEY_ATTRIBUTES)):
+            location_ids.add(obj.location_id)
+    refresh_lot_search_keys(product_ids, location_ids, lot_keys,
+                            connection=session.connection())
@@ -3,47 +3,51 @@ from models import db, Shipment, Order, ShippingVendor, User
 from datetime import datetime
 from sqlalchemy import func
 from sqlalchemy.exc import IntegrityError
+from stats import shipment_stats
+from pagination import paginate_query, InvalidCursor
+from stock import InsufficientStock
+from reservations import pick_order, CANCELLED_STATUSES, SHIPPED_STATUSES
 
 shipments_bp = Blueprint('shipments', __name__, url_prefix='/api/shipments')
 
 
+def filter_shipments(query, args):
+    """Apply the shipment list filters in ``args`` to a query joined with ShippingVendor"""
+    status_filter = args.get('status')
+    vendor_filter = args.get('shipping_vendor_id', type=int)
+    order_filter = args.get('order_id', type=int)
+    search = args.get('search', '').strip()
+
+    if status_filter:
+        query = query.filter(Shipment.status == status_filter)
+    if vendor_filter:
+        query = query.filter(Shipment.shipping_vendor_id == vendor_filter)
+    if order_filter:
+        query = query.filter(Shipment.order_id == order_filter)
+    if search:
+        query = query.filter(
+            func.concat(Shipment.tracking_no, ' ',
+                        ShippingVendor.name).contains(search)
+        )
+    return query
+
+
 @shipments_bp.route('', methods=['GET'])
 def get_shipments():
     """Get all shipments with pagination and filtering"""
     try:
-        page = request.args.get('page', 1, type=int)
-        per_page = request.args.get('per_page', 10, type=int)
-        status_filter = request.args.get('status')
-        vendor_filter = request.args.get('shipping_vendor_id', type=int)
-        order_filter = request.args.get('order_id', type=int)
-        search = request.args.get('search', '').strip()
-
         # Build query with joins
         query = db.session.query(Shipment).join(Order).join(ShippingVendor)
+        query = filter_shipments(query, request.args)
 
-        # Apply filters
-        if status_filter:
-            query = query.filter(Shipment.status == status_filter)
-        if vendor_filter:
-            query = query.filter(Shipment.shipping_vendor_id == vendor_filter)
-        if order_filter:
-            query = query.filter(Shipment.order_id == order_filter)
-        if search:
-            query = query.filter(
-                func.concat(Shipment.tracking_no, ' ',
-                            ShippingVendor.name).contains(search)
-            )
-
-        # Order by most recent shipment date first
-        query = query.order_by(Shipment.ship_date.desc())
-
-        # Paginate
-        pagination = query.paginate(
-            page=page, per_page=per_page, error_out=False
-        )
+        # Most recent shipment date first; page or cursor mode
+        items, pagination = paginate_query(query, [
+            (Shipment.ship_date, True),
+            (Shipment.shipment_id, True)
+        ])
 
         shipments = []
-        for shipment in pagination.items:
+        for shipment in items:
             shipments.append({
                 'shipment_id': shipment.shipment_id,
                 'ship_date': shipment.ship_date.isoformat(),
@@ -70,16 +74,14 @@ def get_shipments():
         return jsonify({
             'success': True,
             'data': shipments,
-            'pagination': {
-                'page': pagination.page,
-                'pages': pagination.pages,
-                'per_page': pagination.per_page,
-                'total': pagination.total,
-                'has_next': pagination.has_next,
-                'has_prev': pagination.has_prev
-            }
+            'pagination': pagination
         })
 
+    except InvalidCursor as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
     except Exception as e:
         return jsonify({
             'success': False,
@@ -156,7 +158,7 @@ def create_shipment():
                 'error': 'Order not found'
             }), 404
 
-        if order.status in ['Cancelled', 'Shipped']:
+        if order.status.lower() in CANCELLED_STATUSES + SHIPPED_STATUSES:
             return jsonify({
                 'success': False,
                 'error': f'Cannot ship order with status: {order.status}'
@@ -230,6 +232,9 @@ def create_shipment():
 
         db.session.add(shipment)
 
+        # Take whatever the order still has reserved out of the lots
+        pick_order(order.order_id)
+
         # Update order status to Shipped
         order.status = 'Shipped'
 
@@ -244,6 +249,12 @@ def create_shipment():
             }
         }), 201
 
+    except InsufficientStock as e:
+        db.session.rollback()
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
     except IntegrityError as e:
         db.session.rollback()
         return jsonify({
@@ -461,18 +472,7 @@ def create_shipping_vendor():
 def get_shipment_stats():
     """Get shipment statistics"""
     try:
-        total_shipments = Shipment.query.count()
-        in_transit = Shipment.query.filter(
-            Shipment.status == 'In Transit').count()
-        delivered = Shipment.query.filter(
-            Shipment.status == 'Delivered').count()
-        delayed = Shipment.query.filter(Shipment.status == 'Delayed').count()
-
-        # Recent shipments (last 7 days)
-        from datetime import timedelta
-        week_ago = datetime.utcnow() - timedelta(days=7)
-        recent_shipments = Shipment.query.filter(
-            Shipment.ship_date >= week_ago).count()
+        stats = shipment_stats()
 
         # Top shipping vendors
         vendor_stats = db.session.query(
@@ -487,11 +487,7 @@ def get_shipment_stats():
         return jsonify({
             'success': True,
             'data': {
-                'total_shipments': total_shipments,
-                'in_transit': in_transit,
-                'delivered': delivered,
-                'delayed': delayed,
-                'recent_shipments': recent_shipments,
+                **stats,
                 'top_vendors': top_vendors
             }
         })
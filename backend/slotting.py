@@ -0,0 +1,193 @@
+"""Velocity-based slotting recommendations
+
+Ranks SKUs by pick velocity and recommends moving fast movers from storage
+into forward-pick locations (``location_type = 'picking'``), within each
+location's free capacity. SKUs that sit in a forward location without a
+single pick in the window are moved back to storage first, so their space
+counts as free.
+
+Velocity is computed from the window's order lines (``Order_Item`` joined
+to ``Order``, cancelled orders excluded) plus outbound
+``Inventory_Movement`` rows that do not come from an order. The rows are
+read as flat columns and aggregated with NumPy (``np.bincount`` over dense
+product_id / location_id arrays), so a nightly run over a few hundred
+thousand SKUs is a handful of queries and array operations. Only the
+placement loop is Python, and it runs once per recommended move.
+"""
+
+import math
+from datetime import date, datetime, timedelta
+import numpy as np
+from sqlalchemy import func, select
+from models import (db, Order, OrderItem, InventoryMovement, InventoryLot,
+                    Location, Product)
+from reservations import CANCELLED_STATUSES
+
+FORWARD_LOCATION_TYPE = 'picking'
+STORAGE_LOCATION_TYPE = 'storage'
+DEFAULT_WINDOW_DAYS = 30
+# Days of demand a promoted SKU should hold in its forward location
+DEFAULT_COVER_DAYS = 7
+DEFAULT_MOVE_LIMIT = 100
+
+
+def _columns(statement, count):
+    """Run ``statement`` and return its columns as int64 arrays"""
+    # Core execution on the session's connection skips the ORM result layer
+    rows = db.session.connection().execute(statement).all()
+    if not rows:
+        return [np.zeros(0, dtype=np.int64) for _ in range(count)]
+    # zip(*rows) transposes plain tuples; np.array(rows) would probe every
+    # Row for the array interface
+    return [np.fromiter(column, dtype=np.int64, count=len(rows))
+            for column in zip(*rows)]
+
+
+def compute_velocity(since, size):
+    """``(picks, units)`` per product_id since ``since``, as dense arrays"""
+    product_ids, quantities = _columns(
+        select(OrderItem.product_id, OrderItem.quantity)
+        .join(Order, Order.order_id == OrderItem.order_id)
+        .where(Order.order_date >= since,
+               func.lower(Order.status).notin_(CANCELLED_STATUSES)), 2)
+    moved_ids, moved = _columns(
+        select(InventoryMovement.product_id, -InventoryMovement.quantity)
+        .where(InventoryMovement.movement_date >= since,
+               InventoryMovement.quantity < 0,
+               InventoryMovement.movement_type == 'outbound',
+               db.or_(InventoryMovement.reference_type.is_(None),
+                      InventoryMovement.reference_type != 'order')), 2)
+
+    product_ids = np.concatenate([product_ids, moved_ids])
+    quantities = np.concatenate([quantities, moved])
+    picks = np.bincount(product_ids, minlength=size)[:size]
+    units = np.bincount(product_ids, weights=quantities, minlength=size)[:size]
+    return picks, units
+
+
+def _load_locations():
+    rows = db.session.execute(select(
+        Location.location_id, Location.location_type, Location.status,
+        Location.capacity, Location.current_stock)).all()
+    size = max((row.location_id for row in rows), default=0) + 1
+    forward = np.zeros(size, dtype=bool)
+    storage = np.zeros(size, dtype=bool)
+    free = np.zeros(size, dtype=np.int64)
+    for row in rows:
+        if row.status != 'active':
+            continue
+        forward[row.location_id] = row.location_type == FORWARD_LOCATION_TYPE
+        storage[row.location_id] = row.location_type == STORAGE_LOCATION_TYPE
+        free[row.location_id] = max((row.capacity or 0) - (row.current_stock or 0), 0)
+    return forward, storage, free
+
+
+def _best_fit(free, candidates, quantity):
+    """Location with the least free space that still takes ``quantity``,
+    else the one with the most; returns ``(location_id, room)``"""
+    room = np.where(candidates, free, -1)
+    fits = room >= quantity
+    if fits.any():
+        location_id = int(np.argmin(np.where(fits, room, np.iinfo(np.int64).max)))
+    else:
+        location_id = int(np.argmax(room))
+    return location_id, int(room[location_id])
+
+
+def recommend_moves(window_days=DEFAULT_WINDOW_DAYS,
+                    cover_days=DEFAULT_COVER_DAYS, limit=DEFAULT_MOVE_LIMIT,
+                    today=None):
+    """Ranked list of slotting moves (dicts), demotions first
+
+    Each move names the product, source and destination location and the
+    quantity, with the product's picks and units per day in the window.
+    """
+    today = today or date.today()
+    since = datetime.combine(today - timedelta(days=window_days),
+                             datetime.min.time())
+
+    forward, storage, free = _load_locations()
+    lot_products, lot_locations, lot_quantities = _columns(
+        select(InventoryLot.product_id, InventoryLot.location_id,
+               InventoryLot.quantity).where(InventoryLot.quantity > 0), 3)
+    size = int(max(lot_products.max(initial=0),
+                   db.session.query(db.func.max(Product.product_id)).scalar() or 0)) + 1
+    picks, units = compute_velocity(since, size)
+    picks_per_day = picks / window_days
+    units_per_day = units / window_days
+
+    lot_forward = forward[lot_locations]
+    lot_storage = storage[lot_locations]
+    forward_stock = np.bincount(lot_products, weights=lot_quantities * lot_forward,
+                                minlength=size)
+
+    moves = []
+
+    # Forward slots held by SKUs nobody picked: back to storage
+    idle = np.flatnonzero(lot_forward & (picks[lot_products] == 0))
+    idle = idle[np.argsort(-lot_quantities[idle], kind='stable')]
+    for lot in idle:
+        if len(moves) >= limit:
+            break
+        quantity = int(lot_quantities[lot])
+        to_location, room = _best_fit(free, storage, quantity)
+        if room < quantity:
+            continue
+        free[to_location] -= quantity
+        free[lot_locations[lot]] += quantity
+        moves.append(('demote', int(lot_products[lot]),
+                      int(lot_locations[lot]), to_location, quantity))
+
+    # Largest storage lot per product is the replenishment source
+    storage_lots = np.flatnonzero(lot_storage)
+    storage_lots = storage_lots[np.lexsort(
+        (-lot_quantities[storage_lots], lot_products[storage_lots]))]
+    first = np.unique(lot_products[storage_lots], return_index=True)[1]
+    source_lot = np.full(size, -1, dtype=np.int64)
+    source_lot[lot_products[storage_lots[first]]] = storage_lots[first]
+
+    # Fast movers with no forward stock, fastest first
+    candidates = np.flatnonzero((picks > 0) & (forward_stock == 0)
+                                & (source_lot >= 0))
+    candidates = candidates[np.lexsort((-units[candidates], -picks[candidates]))]
+    for product_id in candidates:
+        if len(moves) >= limit or not (free[forward] > 0).any():
+            break
+        lot = source_lot[product_id]
+        wanted = min(int(lot_quantities[lot]),
+                     max(1, math.ceil(units_per_day[product_id] * cover_days)))
+        to_location, room = _best_fit(free, forward, wanted)
+        quantity = min(wanted, room)
+        if quantity <= 0:
+            continue
+        free[to_location] -= quantity
+        moves.append(('promote', int(product_id), int(lot_locations[lot]),
+                      to_location, quantity))
+
+    return _describe(moves, picks_per_day, units_per_day)
+
+
+def _describe(moves, picks_per_day, units_per_day):
+    if not moves:
+        return []
+    product_ids = {move[1] for move in moves}
+    location_ids = {move[2] for move in moves} | {move[3] for move in moves}
+    names = dict(db.session.query(Product.product_id, Product.name).filter(
+        Product.product_id.in_(product_ids)))
+    codes = dict(db.session.query(Location.location_id, Location.location_code)
+                 .filter(Location.location_id.in_(location_ids)))
+
+    return [{
+        'rank': rank,
+        'action': action,
+        'product_id': product_id,
+        'product_name': names.get(product_id),
+        'from_location_id': from_location,
+        'from_location_code': codes.get(from_location),
+        'to_location_id': to_location,
+        'to_location_code': codes.get(to_location),
+        'quantity': quantity,
+        'picks_per_day': round(float(picks_per_day[product_id]), 3),
+        'units_per_day': round(float(units_per_day[product_id]), 3)
+    } for rank, (action, product_id, from_location, to_location, quantity)
+        in enumerate(moves, 1)]
@@ -0,0 +1,138 @@
+"""Single-pass statistics engine for the /stats endpoints
+
+Each endpoint's scalar metrics are declared below as ``{name: expression}``
+and computed by ``compute_stats`` in one ``SELECT`` over the table, using
+``SUM(CASE WHEN ... THEN ... ELSE 0 END)`` for conditional counts and totals
+instead of one ``COUNT``/``SUM`` query per metric.
+
+Breakdowns that need ``GROUP BY`` (by category, reason, vendor, ...) stay in
+the blueprints.
+"""
+
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from sqlalchemy import and_, case, func
+from models import (db, InventoryLot, Order, Shipment, Scrap, Customer,
+                    Location)
+
+
+def count(condition=None):
+    """Number of rows, optionally only those matching ``condition``"""
+    if condition is None:
+        return func.count()
+    return func.coalesce(func.sum(case((condition, 1), else_=0)), 0)
+
+
+def total(column, condition=None):
+    """Sum of ``column``, optionally only over rows matching ``condition``"""
+    if condition is None:
+        return func.coalesce(func.sum(column), 0)
+    return func.coalesce(func.sum(case((condition, column), else_=0)), 0)
+
+
+def distinct_count(column):
+    """Number of distinct non-NULL values of ``column``"""
+    return func.count(func.distinct(column))
+
+
+def within_day(column, day):
+    """``column`` falls on ``day``, as a range the column's index can serve
+
+    Use instead of ``func.date(column) == day``, which has to evaluate
+    DATE() on every row.
+    """
+    start = datetime.combine(day, datetime.min.time())
+    return and_(column >= start, column < start + timedelta(days=1))
+
+
+def _normalize(value):
+    if value is None:
+        return 0
+    if isinstance(value, Decimal):
+        return int(value) if value == value.to_integral_value() else float(value)
+    return value
+
+
+def compute_stats(model, metrics, *filters):
+    """Compute every metric in ``metrics`` with a single scan of ``model``"""
+    query = db.session.query(
+        *[expression.label(name) for name, expression in metrics.items()]
+    ).select_from(model)
+    if filters:
+        query = query.filter(*filters)
+    row = query.one()
+    return {name: _normalize(value) for name, value in row._mapping.items()}
+
+
+# ========== METRIC DEFINITIONS ==========
+
+
+def inventory_stats():
+    today = date.today()
+    week_ahead = today + timedelta(days=7)
+    return compute_stats(InventoryLot, {
+        'total_items': total(InventoryLot.quantity),
+        'unique_products': distinct_count(InventoryLot.product_id),
+        'used_locations': distinct_count(InventoryLot.location_id),
+        'low_stock_items': count(InventoryLot.quantity <= 10),
+        'critical_stock_items': count(InventoryLot.quantity <= 5),
+        'expired_items': count(InventoryLot.expiry_date < today),
+        'expiring_soon': count(InventoryLot.expiry_date.between(today, week_ahead))
+    })
+
+
+def order_stats():
+    week_ago = datetime.utcnow() - timedelta(days=7)
+    return compute_stats(Order, {
+        'total_orders': count(),
+        'pending_orders': count(Order.status == 'Pending'),
+        'shipped_orders': count(Order.status == 'Shipped'),
+        'cancelled_orders': count(Order.status == 'Cancelled'),
+        'recent_orders': count(Order.order_date >= week_ago)
+    })
+
+
+def shipment_stats():
+    week_ago = datetime.utcnow() - timedelta(days=7)
+    return compute_stats(Shipment, {
+        'total_shipments': count(),
+        'in_transit': count(Shipment.status == 'In Transit'),
+        'delivered': count(Shipment.status == 'Delivered'),
+        'delayed': count(Shipment.status == 'Delayed'),
+        'recent_shipments': count(Shipment.ship_date >= week_ago)
+    })
+
+
+def scrap_stats():
+    today = date.today()
+    thirty_days_ago = today - timedelta(days=30)
+    month_start = date(today.year, today.month, 1)
+    return compute_stats(Scrap, {
+        'total_scrapped': total(Scrap.quantity),
+        'total_records': count(),
+        'recent_scrap_30days': total(Scrap.quantity, Scrap.scrap_date >= thirty_days_ago),
+        'monthly_scrap': count(Scrap.scrap_date >= month_start),
+        'pending_count': count(Scrap.status == '待處理'),
+        'processing_count': count(Scrap.status == '處理中'),
+        'processed_count': count(Scrap.status == '已處理'),
+        'total_estimated_value': total(Scrap.estimated_value)
+    })
+
+
+def customer_stats():
+    today = datetime.now()
+    month_start = datetime(today.year, today.month, 1)
+    return compute_stats(Customer, {
+        'total_customers': count(),
+        'active_customers': count(Customer.status == 'active'),
+        'new_customers_month': count(Customer.created_at >= month_start)
+    })
+
+
+def location_stats():
+    return compute_stats(Location, {
+        'total_locations': count(),
+        'active_locations': count(Location.status == 'active'),
+        'total_capacity': total(Location.capacity),
+        'total_stock': total(Location.current_stock)
+    })
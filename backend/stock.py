@@ -0,0 +1,550 @@
+"""Maintained stock counters
+
+``Location.current_stock`` mirrors ``SUM(Inventory_Lot.quantity)`` for each
+location so fill level and utilization are plain column reads, and
+``Product_Stock.on_hand`` does the same per product so availability checks
+are a primary key lookup. Product_Stock is a table of its own rather than a
+Product column so counter updates never contend with the shared locks that
+Order_Item inserts take on Product rows. Counters are always updated after
+the lots, in location_id and then product_id order.
+
+Every ORM change to ``InventoryLot.quantity`` (new lots, updates, deletes) is
+picked up by the session flush hooks below and applied to the counters in the
+same transaction, so the blueprints keep writing lots the way they always have.
+New products get their Product_Stock row from the same hook. Code that
+changes lot quantities with Core statements (bulk UPDATEs, upserts) bypasses
+the ORM and must call ``adjust_stock`` itself.
+
+``apply_lot_delta`` is the atomic single-lot path used by stock movements.
+Batches that touch several lots create the missing ones with ``ensure_lots``
+and lock them all with ``lock_lots`` before the first write.
+``lock_product_lots`` and ``deduct_lots`` are the lock-safe path for taking
+stock out of lots (order creation); the decrement is a Core executemany, so
+it adjusts the counters itself.
+
+``Product_Stock.reserved`` is maintained by reservations.py through
+``adjust_reserved_stock``. ``Product_Stock.expired`` changes with the date
+rather than with writes, so ``refresh_expired_stock`` recomputes it daily.
+
+``reconcile_location_stock`` and ``reconcile_product_stock`` compare the
+counters with the lot and reservation tables and repair any drift; run them
+through ``reconcile_stock.py``.
+"""
+
+from collections import defaultdict
+from datetime import date
+from sqlalchemy import (and_, bindparam, delete, event, exists, func, insert,
+                        inspect, select, tuple_, update)
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from models import (db, Product, Location, InventoryLot, ProductStock,
+                    InventoryReservation)
+from search import refresh_lot_search_keys
+
+_PENDING_KEY = 'pending_location_stock_deltas'
+
+
+class InsufficientStock(ValueError):
+    pass
+
+
+class LotNotFound(ValueError):
+    pass
+
+
+def adjust_location_stock(deltas, connection=None):
+    """Apply ``{location_id: delta}`` to Location.current_stock
+
+    The increment is done in SQL (``current_stock = current_stock + delta``)
+    so concurrent writers never overwrite each other.
+    """
+    params = [{'b_location_id': location_id, 'b_delta': delta}
+              for location_id, delta in sorted(deltas.items()) if delta]
+    if not params:
+        return
+
+    # One executemany, in location_id order like every other writer
+    table = Location.__table__
+    connection = connection or db.session.connection()
+    connection.execute(
+        update(table)
+        .where(table.c.location_id == bindparam('b_location_id'))
+        .values(current_stock=table.c.current_stock + bindparam('b_delta')),
+        params
+    )
+
+
+def adjust_product_stock(deltas, connection=None):
+    """Apply ``{product_id: delta}`` to Product_Stock.on_hand, like ``adjust_location_stock``
+
+    Products without a Product_Stock row yet (a database upgraded without
+    running ``reconcile_stock.py``) get one from ``create_product_stock_rows``.
+    """
+    params = [{'b_product_id': product_id, 'b_delta': delta}
+              for product_id, delta in sorted(deltas.items()) if delta]
+    if not params:
+        return
+
+    table = ProductStock.__table__
+    connection = connection or db.session.connection()
+    result = connection.execute(
+        update(table)
+        .where(table.c.product_id == bindparam('b_product_id'))
+        .values(on_hand=table.c.on_hand + bindparam('b_delta')),
+        params
+    )
+    # rowcount counts matched rows (FOUND_ROWS), so a shortfall means rows
+    # are missing; the common path costs nothing extra
+    if result.rowcount < len(params):
+        create_product_stock_rows(
+            {row['b_product_id']: row['b_delta'] for row in params},
+            connection)
+
+
+def create_product_stock_rows(deltas, connection=None):
+    """Create the missing Product_Stock rows of ``{product_id: on_hand delta}``
+
+    A new row starts from the product's lots (``on_hand`` and ``expired``)
+    and ``reserved`` reservations.
+    The lots already include this transaction's change, so the delta is
+    only added (``ON DUPLICATE KEY UPDATE``) when another transaction
+    created the row in the meantime. Rows that exist are locked first and
+    left alone: their delta was applied by the caller's UPDATE, which also
+    gap-locked the missing keys, so no row can appear in between.
+
+    This is the fallback for databases upgraded without the
+    ``reconcile_stock.py`` backfill. Two transactions creating the same
+    row at once can deadlock on those gap locks (one is rolled back), so
+    run the backfill when upgrading.
+    """
+    table = ProductStock.__table__
+    connection = connection or db.session.connection()
+    existing = set(connection.execute(
+        select(table.c.product_id)
+        .where(table.c.product_id.in_(sorted(deltas)))
+        .order_by(table.c.product_id)
+        .with_for_update()
+    ).scalars())
+    missing = [product_id for product_id in sorted(deltas)
+               if product_id not in existing]
+    if not missing:
+        return
+
+    lots = InventoryLot.__table__
+    reservations = InventoryReservation.__table__
+    product_id = bindparam('b_product_id')
+    on_hand = select(func.coalesce(func.sum(lots.c.quantity), 0)).where(
+        lots.c.product_id == product_id).scalar_subquery()
+    reserved = select(func.coalesce(func.sum(reservations.c.quantity), 0)).where(
+        reservations.c.product_id == product_id,
+        reservations.c.status == 'reserved').scalar_subquery()
+    expired = select(func.coalesce(func.sum(lots.c.quantity), 0)).where(
+        lots.c.product_id == product_id,
+        lots.c.expiry_date < date.today(),
+        lots.c.quantity > 0).scalar_subquery()
+    statement = mysql_insert(table).from_select(
+        ['product_id', 'on_hand', 'reserved', 'expired'],
+        select(product_id, on_hand, reserved, expired))
+    connection.execute(
+        statement.on_duplicate_key_update(
+            on_hand=table.c.on_hand + bindparam('b_delta')),
+        [{'b_product_id': product_id, 'b_delta': deltas[product_id]}
+         for product_id in missing])
+
+
+def adjust_reserved_stock(deltas, connection=None):
+    """Apply ``{product_id: delta}`` to Product_Stock.reserved"""
+    params = [{'b_product_id': product_id, 'b_delta': delta}
+              for product_id, delta in sorted(deltas.items()) if delta]
+    if not params:
+        return
+
+    table = ProductStock.__table__
+    connection = connection or db.session.connection()
+    connection.execute(
+        update(table)
+        .where(table.c.product_id == bindparam('b_product_id'))
+        .values(reserved=table.c.reserved + bindparam('b_delta')),
+        params
+    )
+
+
+def adjust_stock(lot_deltas, connection=None):
+    """Apply ``{(product_id, location_id): delta}`` lot changes to every counter"""
+    location_deltas = defaultdict(int)
+    product_deltas = defaultdict(int)
+    for (product_id, location_id), delta in lot_deltas.items():
+        location_deltas[location_id] += delta
+        product_deltas[product_id] += delta
+    connection = connection or db.session.connection()
+    adjust_location_stock(location_deltas, connection)
+    adjust_product_stock(product_deltas, connection)
+
+
+def _committed_value(obj, name):
+    """Value of ``name`` as last loaded from the database"""
+    history = inspect(obj).attrs[name].history
+    if history.deleted:
+        return history.deleted[0]
+    return getattr(obj, name) if not history.added else None
+
+
+def _lot_quantity_deltas(session):
+    """Collect per-lot quantity deltas from pending InventoryLot changes
+
+    A lot whose product_id or location_id changed has its old quantity
+    taken off the old key and its new quantity added to the new one.
+    """
+    deltas = defaultdict(int)
+
+    with session.no_autoflush:
+        for obj in session.new:
+            if isinstance(obj, InventoryLot):
+                deltas[(obj.product_id, obj.location_id)] += obj.quantity or 0
+
+        for obj in session.deleted:
+            if isinstance(obj, InventoryLot):
+                key = (_committed_value(obj, 'product_id'),
+                       _committed_value(obj, 'location_id'))
+                deltas[key] -= _committed_value(obj, 'quantity') or 0
+
+        for obj in session.dirty:
+            if not isinstance(obj, InventoryLot) or obj in session.deleted:
+                continue
+            state = inspect(obj)
+            if not any(state.attrs[name].history.has_changes() for name in
+                       ('quantity', 'product_id', 'location_id')):
+                continue
+            old_key = (_committed_value(obj, 'product_id'),
+                       _committed_value(obj, 'location_id'))
+            deltas[old_key] -= _committed_value(obj, 'quantity') or 0
+            deltas[(obj.product_id, obj.location_id)] += obj.quantity or 0
+
+    return {key: delta for key, delta in deltas.items() if delta}
+
+
+@event.listens_for(db.session, 'before_flush')
+def _collect_location_stock_deltas(session, flush_context, instances):
+    session.info[_PENDING_KEY] = _lot_quantity_deltas(session)
+
+
+@event.listens_for(db.session, 'after_flush')
+def _apply_location_stock_deltas(session, flush_context):
+    # Applied after the flush so lots, locations and products inserted in
+    # the same flush already exist when the counters are updated
+    new_products = [obj.product_id for obj in session.new
+                    if isinstance(obj, Product)]
+    if new_products:
+        ensure_product_stock_rows(new_products, session.connection())
+
+    deltas = session.info.pop(_PENDING_KEY, None)
+    if deltas:
+        adjust_stock(deltas, session.connection())
+
+
+def ensure_product_stock_rows(product_ids=None, connection=None):
+    """Create missing Product_Stock rows (for ``product_ids``, or every product)
+
+    Returns the number of rows created.
+    """
+    table = ProductStock.__table__
+    missing = select(Product.product_id).where(~exists().where(
+        table.c.product_id == Product.product_id))
+    if product_ids is not None:
+        missing = missing.where(Product.product_id.in_(sorted(product_ids)))
+    connection = connection or db.session.connection()
+    return connection.execute(
+        insert(table).from_select(['product_id'], missing)).rowcount
+
+
+def apply_lot_delta(product_id, location_id, delta, counter_deltas=None):
+    """Atomically add ``delta`` to a lot and return ``(previous, new)``
+
+    Increments are one ``INSERT ... ON DUPLICATE KEY UPDATE`` that creates
+    the lot if needed; decrements are one ``UPDATE`` guarded by
+    ``quantity + delta >= 0``. Both store the new quantity through
+    ``LAST_INSERT_ID(expr)``, which MySQL returns with the statement result,
+    so no separate read (and no read-modify-write race) is involved.
+
+    The counters are adjusted right away unless ``counter_deltas`` is given;
+    batches pass a dict there and call ``adjust_stock`` once at the end, so
+    counter rows are locked in key order after every lot.
+
+    Raises InsufficientStock when a decrement would go below zero and
+    LotNotFound when a zero delta names a lot that does not exist.
+    """
+    table = InventoryLot.__table__
+    if delta > 0:
+        statement = mysql_insert(table).values(
+            product_id=product_id, location_id=location_id, quantity=delta)
+        result = db.session.execute(statement.on_duplicate_key_update(
+            quantity=func.last_insert_id(table.c.quantity + delta)))
+        # rowcount is 1 for a new lot and 2 for an updated one
+        if result.rowcount == 1:
+            new_quantity = delta
+            refresh_lot_search_keys(lot_keys=[(product_id, location_id)])
+        else:
+            new_quantity = result.lastrowid
+    else:
+        result = db.session.execute(
+            update(table)
+            .where(and_(table.c.product_id == product_id,
+                        table.c.location_id == location_id,
+                        table.c.quantity + delta >= 0))
+            .values(quantity=func.last_insert_id(table.c.quantity + delta))
+        )
+        if result.rowcount == 0:
+            if delta < 0:
+                raise InsufficientStock(
+                    'Insufficient inventory for this movement')
+            raise LotNotFound('Inventory lot not found')
+        new_quantity = result.lastrowid
+
+    if counter_deltas is None:
+        adjust_stock({(product_id, location_id): delta})
+    else:
+        counter_deltas[(product_id, location_id)] = (
+            counter_deltas.get((product_id, location_id), 0) + delta)
+    return new_quantity - delta, new_quantity
+
+
+def lock_product_lots(product_ids):
+    """Lock and return every lot of ``product_ids`` that has stock
+
+    ``SELECT ... FOR UPDATE`` in primary key order: every transaction
+    acquires lot locks in the same sequence, so two orders touching the same
+    products wait on each other instead of deadlocking.
+    """
+    return InventoryLot.query.filter(
+        InventoryLot.product_id.in_(list(product_ids)),
+        InventoryLot.quantity > 0
+    ).order_by(
+        InventoryLot.product_id, InventoryLot.location_id
+    ).with_for_update().all()
+
+
+def _sorted_lot_keys(keys):
+    """``(product_id, location_id)`` keys as ints, deduplicated, in PK order"""
+    return sorted({(int(product_id), int(location_id))
+                   for product_id, location_id in keys})
+
+
+def ensure_lots(keys):
+    """Create the lots in ``keys`` that do not exist yet, with quantity 0
+
+    The missing rows are inserted with one ``INSERT ... ON DUPLICATE KEY
+    UPDATE quantity = quantity`` in primary key order, so a lot created by a
+    concurrent transaction in between is left alone. Call it before
+    ``lock_lots`` for every lot a batch is going to add stock to. Returns
+    the keys that were missing.
+    """
+    keys = _sorted_lot_keys(keys)
+    if not keys:
+        return []
+    table = InventoryLot.__table__
+    existing = set(db.session.execute(
+        select(table.c.product_id, table.c.location_id)
+        .where(tuple_(table.c.product_id, table.c.location_id).in_(keys))
+    ).all())
+    missing = [key for key in keys if key not in existing]
+    if not missing:
+        return []
+
+    statement = mysql_insert(table).values(
+        product_id=bindparam('b_product_id'),
+        location_id=bindparam('b_location_id'),
+        quantity=0)
+    db.session.execute(
+        statement.on_duplicate_key_update(quantity=table.c.quantity),
+        [{'b_product_id': product_id, 'b_location_id': location_id}
+         for product_id, location_id in missing])
+    refresh_lot_search_keys(lot_keys=missing)
+    return missing
+
+
+def discard_empty_lots(keys):
+    """Delete the lots in ``keys`` that still hold nothing
+
+    Undoes ``ensure_lots`` for lots whose stock never arrived (a transfer
+    skipped in ``best_effort`` mode). The lots are already locked and
+    empty, so no counter changes.
+    """
+    keys = _sorted_lot_keys(keys)
+    if not keys:
+        return
+    table = InventoryLot.__table__
+    db.session.execute(delete(table).where(
+        tuple_(table.c.product_id, table.c.location_id).in_(keys),
+        table.c.quantity == 0))
+
+
+def lock_lots(keys):
+    """Lock the ``(product_id, location_id)`` lots in ``keys``
+
+    One ``SELECT ... FOR UPDATE`` in primary key order, like
+    ``lock_product_lots``. Only existing rows are locked: for a key without
+    a lot InnoDB takes a gap lock, and gap locks do not conflict with each
+    other, so two transactions that then insert the same lot deadlock.
+    Create the lots first with ``ensure_lots``. Returns the locked lots.
+    """
+    keys = _sorted_lot_keys(keys)
+    if not keys:
+        return []
+    return InventoryLot.query.filter(
+        tuple_(InventoryLot.product_id, InventoryLot.location_id).in_(keys)
+    ).order_by(
+        InventoryLot.product_id, InventoryLot.location_id
+    ).with_for_update().all()
+
+
+def deduct_lots(picks):
+    """Subtract ``[(lot, quantity), ...]`` from locked lots in one executemany UPDATE"""
+    picks = [(lot, quantity) for lot, quantity in picks if quantity]
+    if not picks:
+        return
+
+    table = InventoryLot.__table__
+    db.session.execute(
+        update(table)
+        .where(and_(table.c.product_id == bindparam('b_product_id'),
+                    table.c.location_id == bindparam('b_location_id')))
+        .values(quantity=table.c.quantity - bindparam('b_quantity')),
+        [{'b_product_id': lot.product_id,
+          'b_location_id': lot.location_id,
+          'b_quantity': quantity} for lot, quantity in picks]
+    )
+
+    deltas = defaultdict(int)
+    for lot, quantity in picks:
+        deltas[(lot.product_id, lot.location_id)] -= quantity
+        # The UPDATE bypassed the ORM; reload the quantity on next access
+        db.session.expire(lot, ['quantity'])
+    adjust_stock(deltas)
+
+
+def find_location_stock_drift():
+    """Return locations whose current_stock differs from their lots"""
+    actual = Location.get_stock_map()
+    drift = []
+    for location_id, stored in db.session.query(
+            Location.location_id, Location.current_stock).all():
+        expected = actual.get(location_id, 0)
+        if (stored or 0) != expected:
+            drift.append({
+                'location_id': location_id,
+                'stored': stored or 0,
+                'actual': expected
+            })
+    return drift
+
+
+def reconcile_location_stock(repair=True):
+    """Detect (and optionally repair) drift in Location.current_stock"""
+    drift = find_location_stock_drift()
+    if repair and drift:
+        table = Location.__table__
+        db.session.execute(
+            update(table)
+            .where(table.c.location_id == bindparam('b_location_id'))
+            .values(current_stock=bindparam('b_current_stock')),
+            [{'b_location_id': row['location_id'],
+              'b_current_stock': row['actual']} for row in drift]
+        )
+        db.session.commit()
+    return drift
+
+
+def find_product_stock_drift():
+    """Return products whose Product_Stock totals differ from the source tables
+
+    ``on_hand`` is compared with their lots and ``reserved`` with their
+    ``reserved`` Inventory_Reservation rows.
+    """
+    actual = dict(db.session.query(
+        InventoryLot.product_id, func.sum(InventoryLot.quantity)
+    ).group_by(InventoryLot.product_id).all())
+    actual_reserved = dict(db.session.query(
+        InventoryReservation.product_id, func.sum(InventoryReservation.quantity)
+    ).filter(
+        InventoryReservation.status == 'reserved'
+    ).group_by(InventoryReservation.product_id).all())
+
+    drift = []
+    # Products without a Product_Stock row show up with stored = 0
+    for product_id, stored, reserved in db.session.query(
+            Product.product_id, ProductStock.on_hand, ProductStock.reserved
+    ).outerjoin(
+            ProductStock, ProductStock.product_id == Product.product_id).all():
+        expected = int(actual.get(product_id) or 0)
+        expected_reserved = int(actual_reserved.get(product_id) or 0)
+        if (stored or 0) != expected or (reserved or 0) != expected_reserved:
+            drift.append({
+                'product_id': product_id,
+                'stored': stored or 0,
+                'actual': expected,
+                'stored_reserved': reserved or 0,
+                'actual_reserved': expected_reserved
+            })
+    return drift
+
+
+def reconcile_product_stock(repair=True):
+    """Detect (and optionally repair) drift in Product_Stock
+
+    Missing Product_Stock rows are created first when repairing.
+    """
+    if repair:
+        ensure_product_stock_rows()
+    drift = find_product_stock_drift()
+    if repair and drift:
+        table = ProductStock.__table__
+        db.session.execute(
+            update(table)
+            .where(table.c.product_id == bindparam('b_product_id'))
+            .values(on_hand=bindparam('b_on_hand'),
+                    reserved=bindparam('b_reserved')),
+            [{'b_product_id': row['product_id'],
+              'b_on_hand': row['actual'],
+              'b_reserved': row['actual_reserved']} for row in drift]
+        )
+    if repair:
+        db.session.commit()
+    return drift
+
+
+def expired_lot_totals(today=None):
+    """``{product_id: quantity}`` in lots whose expiry date has passed"""
+    today = today or date.today()
+    return {product_id: int(quantity) for product_id, quantity in
+            db.session.query(
+                InventoryLot.product_id, func.sum(InventoryLot.quantity)
+            ).filter(
+                InventoryLot.expiry_date < today,
+                InventoryLot.quantity > 0
+            ).group_by(InventoryLot.product_id).all()}
+
+
+def refresh_expired_stock(today=None):
+    """Set Product_Stock.expired from the lots that have expired by ``today``
+
+    Run daily (``refresh_expired_stock.py``): lots expire with the date,
+    not with a write, so this is what keeps ``expired`` current. Only
+    changed rows are updated, in product_id order. Returns the number of
+    products whose value changed.
+    """
+    actual = expired_lot_totals(today)
+    changed = [{'b_product_id': product_id,
+                'b_expired': actual.get(product_id, 0)}
+               for product_id, stored in db.session.query(
+                   ProductStock.product_id, ProductStock.expired
+               ).order_by(ProductStock.product_id).all()
+               if stored != actual.get(product_id, 0)]
+    if changed:
+        table = ProductStock.__table__
+        db.session.execute(
+            update(table)
+            .where(table.c.product_id == bindparam('b_product_id'))
+            .values(expired=bindparam('b_expired')),
+            changed
+        )
+    db.session.commit()
+    return len(changed)
@@ -1,6 +1,7 @@
 from flask import Blueprint, request, jsonify
 from models import db, Supplier, Product, supplier_product
 from auth import require_auth, require_role
+from search import apply_search, fuzzy_requested, SUPPLIER_SEARCH_COLUMNS
 
 suppliers_bp = Blueprint('suppliers', __name__, url_prefix='/api/suppliers')
 
@@ -16,11 +17,9 @@ def get_suppliers():
         query = Supplier.query
 
         if search:
-            query = query.filter(
-                Supplier.supplier_name.contains(search) |
-                Supplier.contact_name.contains(search) |
-                Supplier.email.contains(search)
-            )
+            query = apply_search(query, SUPPLIER_SEARCH_COLUMNS, search,
+                                 fuzzy_requested(request.args))
+        query = query.order_by(Supplier.supplier_id.asc())
 
         pagination = query.paginate(
             page=page,
@@ -7,7 +7,9 @@ Tests all endpoints from all backend modules
 import requests
 import json
 import time
-from datetime import datetime, date
+from datetime import datetime, date, timedelta
+from app import create_app
+from models import db, ProductStock
 
 BASE_URL = "http://localhost:5001/api"
 
@@ -17,6 +19,7 @@ class APITester:
         self.session = requests.Session()
         self.admin_token = None
         self.test_data = {}
+        self.app = None
 
     def log_test(self, test_name, status_code, response_data, expected_status=200):
         """Log test results"""
@@ -37,6 +40,356 @@ class APITester:
         except ValueError:
             return {"error": "Invalid JSON response", "content": response.text[:200]}
 
+    def product_stock(self, product_id):
+        """Product_Stock (on_hand, reserved), read straight from the database"""
+        if self.app is None:
+            self.app = create_app()
+        with self.app.app_context():
+            stock = db.session.get(ProductStock, product_id)
+            return (stock.on_hand, stock.reserved) if stock else (0, 0)
+
+    def check_stock(self, test_name, product_id, on_hand, reserved):
+        """Log whether Product_Stock holds the expected counters"""
+        actual = self.product_stock(product_id)
+        expected = (on_hand, reserved)
+        status = "✅" if actual == expected else "❌"
+        print(f"{status} {test_name} - Product_Stock (on_hand, reserved): {actual}")
+        if actual != expected:
+            print(f"   Expected: {expected}, Got: {actual}")
+        print("-" * 60)
+        return actual == expected
+
+    def lot_quantity(self, product_id, location_id):
+        """Quantity of one lot through the API (0 when there is none)"""
+        response = self.session.get(
+            f"{BASE_URL}/inventory/{product_id}/{location_id}")
+        if response.status_code != 200:
+            return 0
+        return self.safe_get_json(response)['data']['quantity']
+
+    def create_test_order(self, product_id, quantity, status='pending'):
+        """Create a one-line order and return its id (None on failure)"""
+        order_data = {
+            "customer_id": self.test_data['customer_id'],
+            "user_id": 1,  # Use admin user ID
+            "ship_to": "Test Address for Stock Tests",
+            "status": status,
+            "order_items": [
+                {"product_id": product_id, "quantity": quantity,
+                 "unit_price": 10.0}
+            ]
+        }
+        response = self.session.post(f"{BASE_URL}/orders", json=order_data)
+        response_data = self.safe_get_json(response)
+        self.log_test(f"Create Order ({quantity} units)",
+                      response.status_code, response_data, 201)
+        if response.status_code == 201 and 'data' in response_data:
+            return response_data['data']['order_id']
+        return None
+
+    def setup_stock_fixture(self):
+        """A fresh product with 50 units in one of two new locations
+
+        The stock tests below share it; every check is against counters
+        this run created, so existing data does not get in the way.
+        """
+        suffix = int(time.time())
+        response = self.session.post(f"{BASE_URL}/products", json={
+            "name": f"Test Stock Product API {suffix}",
+            "category": "Test",
+            "warranty_years": 1,
+            "price": 10.0
+        })
+        response_data = self.safe_get_json(response)
+        self.log_test("Create Stock Test Product", response.status_code,
+                      response_data, 201)
+        if response.status_code != 201:
+            return False
+        product_id = response_data['data']['product_id']
+
+        location_ids = []
+        for zone in ("A", "B"):
+            response = self.session.post(f"{BASE_URL}/locations", json={
+                "location_code": f"TEST-{zone}-{suffix}",
+                "location_name": f"Stock Test Location {zone}",
+                "zone": zone,
+                "shelf": "1",
+                "location_type": "storage",
+                "capacity": 1000,
+                "status": "active"
+            })
+            response_data = self.safe_get_json(response)
+            self.log_test(f"Create Stock Test Location {zone}",
+                          response.status_code, response_data, 201)
+            if response.status_code != 201:
+                return False
+            location_ids.append(response_data['data']['location_id'])
+
+        response = self.session.post(f"{BASE_URL}/inventory", json={
+            "product_id": product_id,
+            "location_id": location_ids[0],
+            "quantity": 50,
+            "expiry_date": (date.today() + timedelta(days=365)).isoformat()
+        })
+        self.log_test("Receive Stock Test Inventory", response.status_code,
+                      self.safe_get_json(response), 201)
+        if response.status_code != 201:
+            return False
+
+        self.test_data['stock_product_id'] = product_id
+        self.test_data['stock_location_ids'] = location_ids
+        return self.check_stock("Stock After Receiving", product_id, 50, 0)
+
+    def test_reservations(self):
+        """Test that orders reserve, pick and release Product_Stock"""
+        print("🔒 Testing Order Stock Reservations")
+
+        if 'customer_id' not in self.test_data or not self.setup_stock_fixture():
+            print("❌ Stock fixture missing. Skipping reservation tests.")
+            return
+        product_id = self.test_data['stock_product_id']
+
+        # More than is on hand is refused and reserves nothing
+        response = self.session.post(f"{BASE_URL}/orders", json={
+            "customer_id": self.test_data['customer_id'],
+            "user_id": 1,
+            "ship_to": "Test Address for Stock Tests",
+            "order_items": [{"product_id": product_id, "quantity": 51}]
+        })
+        self.log_test("Create Order Beyond Stock", response.status_code,
+                      self.safe_get_json(response), 400)
+        self.check_stock("Stock After Refused Order", product_id, 50, 0)
+
+        # Non-positive quantities are refused
+        response = self.session.post(f"{BASE_URL}/orders", json={
+            "customer_id": self.test_data['customer_id'],
+            "user_id": 1,
+            "ship_to": "Test Address for Stock Tests",
+            "order_items": [{"product_id": product_id, "quantity": 0}]
+        })
+        self.log_test("Create Order With Zero Quantity", response.status_code,
+                      self.safe_get_json(response), 400)
+
+        # Create reserves, pick takes the stock out of the lots
+        order_id = self.create_test_order(product_id, 10)
+        if order_id is None:
+            return
+        self.check_stock("Stock After Order Created", product_id, 50, 10)
+
+        response = self.session.post(f"{BASE_URL}/orders/{order_id}/pick",
+                                     json={"strategy": "fefo"})
+        self.log_test("Pick Order", response.status_code,
+                      self.safe_get_json(response))
+        self.check_stock("Stock After Pick", product_id, 40, 0)
+
+        # Picking again takes nothing more
+        response = self.session.post(f"{BASE_URL}/orders/{order_id}/pick")
+        self.log_test("Pick Order Again", response.status_code,
+                      self.safe_get_json(response))
+        self.check_stock("Stock After Second Pick", product_id, 40, 0)
+
+        # Shipping picks whatever is still reserved
+        on_hand = 40
+        response = self.session.get(f"{BASE_URL}/shipments/vendors")
+        vendors = self.safe_get_json(response).get('data') or []
+        order_id = self.create_test_order(product_id, 5)
+        if order_id is None:
+            return
+        self.check_stock("Stock After Order Created", product_id, on_hand, 5)
+        if vendors:
+            response = self.session.post(f"{BASE_URL}/shipments", json={
+                "order_id": order_id,
+                "shipping_vendor_id": vendors[0]['user_id'],
+                "tracking_no": f"TEST-STOCK-{int(time.time())}",
+                "shipping_address": "Test Shipping Address"
+            })
+            self.log_test("Ship Order", response.status_code,
+                          self.safe_get_json(response), 201)
+            on_hand -= 5
+            self.check_stock("Stock After Shipment", product_id, on_hand, 0)
+
+            # A shipped order takes no more items
+            response = self.session.post(
+                f"{BASE_URL}/orders/{order_id}/items",
+                json={"product_id": product_id, "quantity": 1})
+            self.log_test("Add Item To Shipped Order", response.status_code,
+                          self.safe_get_json(response), 400)
+            self.check_stock("Stock After Refused Item", product_id,
+                             on_hand, 0)
+        else:
+            print("⚠️ No shipping vendor. Skipping shipment stock test.")
+
+        # Cancelling releases the reservation
+        if not vendors:
+            response = self.session.put(f"{BASE_URL}/orders/{order_id}",
+                                        json={"status": "cancelled"})
+        else:
+            order_id = self.create_test_order(product_id, 5)
+            if order_id is None:
+                return
+            self.check_stock("Stock After Order Created", product_id,
+                             on_hand, 5)
+            response = self.session.put(f"{BASE_URL}/orders/{order_id}",
+                                        json={"status": "cancelled"})
+        self.log_test("Cancel Order", response.status_code,
+                      self.safe_get_json(response))
+        self.check_stock("Stock After Cancel", product_id, on_hand, 0)
+
+        # Items added to and deleted from an open order move the reservation
+        order_id = self.create_test_order(product_id, 5, status='Pending')
+        if order_id is None:
+            return
+        response = self.session.post(f"{BASE_URL}/orders/{order_id}/items",
+                                     json={"product_id": product_id,
+                                           "quantity": 3})
+        response_data = self.safe_get_json(response)
+        self.log_test("Add Order Item", response.status_code,
+                      response_data, 201)
+        self.check_stock("Stock After Item Added", product_id, on_hand, 8)
+        if response.status_code == 201 and 'data' in response_data:
+            item_id = response_data['data']['order_item_id']
+            response = self.session.delete(
+                f"{BASE_URL}/orders/items/{item_id}")
+            self.log_test("Delete Order Item", response.status_code,
+                          self.safe_get_json(response))
+            self.check_stock("Stock After Item Deleted", product_id,
+                             on_hand, 5)
+
+        # Deleting a picked order puts its stock back
+        response = self.session.post(f"{BASE_URL}/orders/{order_id}/pick")
+        self.log_test("Pick Order", response.status_code,
+                      self.safe_get_json(response))
+        self.check_stock("Stock After Pick", product_id, on_hand - 5, 0)
+        response = self.session.delete(f"{BASE_URL}/orders/{order_id}")
+        self.log_test("Delete Picked Order", response.status_code,
+                      self.safe_get_json(response))
+        self.check_stock("Stock After Delete", product_id, on_hand, 0)
+
+    def test_stock_movements(self):
+        """Test the movement batch and transfer endpoints"""
+        print("🔁 Testing Inventory Movement Batch and Transfer Endpoints")
+
+        if 'stock_product_id' not in self.test_data:
+            print("❌ Stock fixture missing. Skipping movement tests.")
+            return
+        product_id = self.test_data['stock_product_id']
+        source_id, destination_id = self.test_data['stock_location_ids']
+        on_hand, reserved = self.product_stock(product_id)
+        source_quantity = self.lot_quantity(product_id, source_id)
+
+        # Atomic batch: one bad row (nothing to take out of the empty
+        # location) rolls the whole batch back
+        batch = [
+            {"product_id": product_id, "location_id": source_id,
+             "movement_type": "inbound", "quantity": 10},
+            {"product_id": product_id, "location_id": destination_id,
+             "movement_type": "outbound", "quantity": 5}
+        ]
+        response = self.session.post(f"{BASE_URL}/inventory/movements/batch",
+                                     json={"movements": batch})
+        self.log_test("Atomic Movement Batch With Bad Row",
+                      response.status_code, self.safe_get_json(response), 400)
+        self.check_stock("Stock After Rolled Back Batch", product_id,
+                         on_hand, reserved)
+
+        # Best effort: the good row is applied, the bad one reported
+        response = self.session.post(f"{BASE_URL}/inventory/movements/batch",
+                                     json={"movements": batch,
+                                           "mode": "best_effort"})
+        response_data = self.safe_get_json(response)
+        self.log_test("Best Effort Movement Batch", response.status_code,
+                      response_data)
+        if response.status_code == 200 and response_data.get('applied_count') != 1:
+            print(f"❌ Expected 1 applied movement, got {response_data.get('applied_count')}")
+        self.check_stock("Stock After Best Effort Batch", product_id,
+                         on_hand + 10, reserved)
+        on_hand += 10
+        source_quantity += 10
+
+        # Transfers move stock between lots; the product total stays put
+        response = self.session.post(f"{BASE_URL}/inventory/transfers", json={
+            "product_id": product_id,
+            "from_location_id": source_id,
+            "to_location_id": destination_id,
+            "quantity": 20
+        })
+        self.log_test("Transfer Inventory", response.status_code,
+                      self.safe_get_json(response))
+        self.check_stock("Stock After Transfer", product_id, on_hand, reserved)
+        lots = (self.lot_quantity(product_id, source_id),
+                self.lot_quantity(product_id, destination_id))
+        status = "✅" if lots == (source_quantity - 20, 20) else "❌"
+        print(f"{status} Lot Quantities After Transfer - {lots}")
+        print("-" * 60)
+
+        # Moving more than the source holds is refused
+        response = self.session.post(f"{BASE_URL}/inventory/transfers", json={
+            "transfers": [{
+                "product_id": product_id,
+                "from_location_id": destination_id,
+                "to_location_id": source_id,
+                "quantity": 1000
+            }]
+        })
+        self.log_test("Transfer Beyond Source Stock", response.status_code,
+                      self.safe_get_json(response), 400)
+        self.check_stock("Stock After Refused Transfer", product_id,
+                         on_hand, reserved)
+
+    def test_picking_waves(self):
+        """Test wave preview and wave picking"""
+        print("🌊 Testing Wave Picking Endpoints")
+
+        if 'stock_product_id' not in self.test_data:
+            print("❌ Stock fixture missing. Skipping wave tests.")
+            return
+        product_id = self.test_data['stock_product_id']
+        on_hand, reserved = self.product_stock(product_id)
+
+        order_ids = [self.create_test_order(product_id, quantity)
+                     for quantity in (4, 6)]
+        if None in order_ids:
+            return
+        self.check_stock("Stock After Wave Orders", product_id,
+                         on_hand, reserved + 10)
+
+        # Preview: a pick list, nothing taken
+        response = self.session.post(f"{BASE_URL}/picking/waves",
+                                     json={"order_ids": order_ids})
+        response_data = self.safe_get_json(response)
+        self.log_test("Preview Wave", response.status_code, response_data)
+        if response.status_code == 200:
+            total = response_data['data']['total_quantity']
+            status = "✅" if total == 10 else "❌"
+            print(f"{status} Wave Preview Quantity - {total}")
+            print("-" * 60)
+        self.check_stock("Stock After Wave Preview", product_id,
+                         on_hand, reserved + 10)
+
+        # Pick: both orders picked in one transaction
+        response = self.session.post(f"{BASE_URL}/picking/waves",
+                                     json={"order_ids": order_ids,
+                                           "pick": True})
+        response_data = self.safe_get_json(response)
+        self.log_test("Pick Wave", response.status_code, response_data)
+        if response.status_code == 200:
+            picked = response_data['data']['order_ids']
+            status = "✅" if sorted(picked) == sorted(order_ids) else "❌"
+            print(f"{status} Wave Picked Orders - {picked}")
+            print("-" * 60)
+        self.check_stock("Stock After Wave Pick", product_id,
+                         on_hand - 10, reserved)
+
+        # Bad requests
+        response = self.session.post(f"{BASE_URL}/picking/waves",
+                                     json={"limit": "ten"})
+        self.log_test("Wave With Bad Limit", response.status_code,
+                      self.safe_get_json(response), 400)
+        response = self.session.post(f"{BASE_URL}/picking/waves",
+                                     json={"order_ids": list(range(1, 502))})
+        self.log_test("Wave With Too Many Orders", response.status_code,
+                      self.safe_get_json(response), 400)
+
     def test_health(self):
         """Test health endpoint"""
         print("🏥 Testing Health Endpoint")
@@ -474,6 +827,11 @@ class APITester:
             self.test_shipments()
             self.test_scrap()
 
+            # Stock counter tests
+            self.test_reservations()
+            self.test_stock_movements()
+            self.test_picking_waves()
+
             # Reporting and analytics
             self.test_reports()
 
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Query plan regression checks for date-bucketed queries
+Runs EXPLAIN against the configured MySQL database and fails when a date
+filter can no longer use its index (e.g. someone wraps the column in DATE())
+
+Usage:
+    python test_query_plans.py
+"""
+
+import sys
+from datetime import date
+from sqlalchemy import func, select, text
+from sqlalchemy.dialects import mysql
+from app import create_app
+from models import db, Order
+from stats import within_day
+
+
+def _sql(statement):
+    return str(statement.compile(dialect=mysql.dialect(),
+                                 compile_kwargs={'literal_binds': True}))
+
+
+# (name, SQL, table alias in the plan, index the date filter must be able to use)
+PLAN_CHECKS = [
+    ('Sales dashboard: today\'s orders',
+     _sql(select(func.count()).select_from(Order)
+          .where(within_day(Order.order_date, date.today()))),
+     'Order', 'idx_order_date'),
+    ('v_shipments_today', 'SELECT * FROM v_shipments_today',
+     's', 'idx_ship_date'),
+    ('v_orders_arrived_today', 'SELECT * FROM v_orders_arrived_today',
+     'Order', 'idx_order_expected_delivery'),
+    ('v_orders_unshipped_today', 'SELECT * FROM v_orders_unshipped_today',
+     'o', 'idx_order_expected_delivery'),
+    ('v_orders_delayed_shipping', 'SELECT * FROM v_orders_delayed_shipping',
+     'o', 'idx_order_date'),
+    ('v_orders_to_ship_this_week', 'SELECT * FROM v_orders_to_ship_this_week',
+     'Order', 'idx_order_expected_delivery'),
+    ('v_sales_30d', 'SELECT * FROM v_sales_30d', 'o', 'idx_order_date'),
+    ('v_orders_status_7d', 'SELECT * FROM v_orders_status_7d',
+     'o', 'idx_order_date'),
+    ('v_scrap_cost_month', 'SELECT * FROM v_scrap_cost_month',
+     'Scrap', 'idx_scrap_date'),
+]
+
+
+def explain(sql):
+    rows = db.session.execute(text(f'EXPLAIN {sql}')).mappings().all()
+    return {row['table']: row for row in rows}
+
+
+def check_plan(name, sql, table, index):
+    """The index must be a candidate for ``table`` (``possible_keys``)
+
+    Whether the optimizer then picks it depends on table size and data
+    distribution, so ``key`` is only reported, not asserted.
+    """
+    plan = explain(sql)
+    row = plan.get(table)
+    if row is None:
+        print(f"❌ {name} - table {table} not in plan: {sorted(plan)}")
+        return False
+
+    possible_keys = (row['possible_keys'] or '').split(',')
+    if index not in possible_keys:
+        print(f"❌ {name} - {index} not usable on {table} "
+              f"(possible_keys: {row['possible_keys']}, type: {row['type']})")
+        return False
+
+    print(f"✅ {name} - {table} can use {index} (chosen: {row['key']}, type: {row['type']})")
+    return True
+
+
+def main():
+    app = create_app()
+
+    with app.app_context():
+        print("🔍 Checking date filters against their indexes...")
+        results = [check_plan(*check) for check in PLAN_CHECKS]
+
+    failed = results.count(False)
+    print("-" * 60)
+    if failed:
+        print(f"❌ {failed} of {len(results)} plan checks failed")
+        return 1
+    print(f"✅ All {len(results)} plan checks passed")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -4,6 +4,7 @@ from werkzeug.security import generate_password_hash, check_password_hash
 from sqlalchemy import func
 from sqlalchemy.exc import IntegrityError
 from auth import decode_jwt_token
+from search import apply_search, fuzzy_requested, USER_SEARCH_COLUMNS
 
 users_bp = Blueprint('users', __name__, url_prefix='/api/users')
 
@@ -40,7 +41,8 @@ def get_users():
         if role_filter:
             query = query.filter(User.role_id == role_filter)
         if search:
-            query = query.filter(User.account.contains(search))
+            query = apply_search(query, USER_SEARCH_COLUMNS, search,
+                                 fuzzy_requested(request.args))
 
         # Order by account name
         query = query.order_by(User.account.asc())
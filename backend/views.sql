@@ -1,9 +1,12 @@
 --出貨與訂單管理功能--
+-- 日期條件一律寫成半開區間 (col >= 起 AND col < 迄)，不要對欄位套 DATE()/DATEDIFF()/DATE_FORMAT()，
+-- 否則無法使用 idx_order_date / idx_ship_date / idx_scrap_date 等索引（見 test_query_plans.py）
 /* ========== 今日出貨清單 ========== */
 CREATE OR REPLACE VIEW v_shipments_today AS
 SELECT s.*
 FROM Shipment s
-WHERE DATE(s.ship_date) = CURDATE();
+WHERE s.ship_date >= CURDATE()
+  AND s.ship_date < CURDATE() + INTERVAL 1 DAY;
 
 /* ========== 尚未處理的 ========== */
 CREATE OR REPLACE VIEW v_orders_pending AS
@@ -23,7 +26,7 @@ CREATE OR REPLACE VIEW v_orders_unshipped_today AS
 SELECT o.*
 FROM `Order` o
 LEFT JOIN Shipment s ON s.order_id = o.order_id
-WHERE DATE(o.expected_delivery_date) = CURDATE()
+WHERE o.expected_delivery_date = CURDATE()
   AND o.status = 'pending'
   AND s.shipment_id IS NULL;
 
@@ -33,7 +36,7 @@ SELECT o.*
 FROM `Order` o
 LEFT JOIN Shipment s ON s.order_id = o.order_id
 WHERE o.status = 'pending'
-  AND DATEDIFF(CURDATE(), o.order_date) > 3;
+  AND o.order_date < CURDATE() - INTERVAL 3 DAY; -- 等同 DATEDIFF(CURDATE(), order_date) > 3，但可用 idx_order_date
 
 /* ==========本週即將出貨訂單預覽 ========== */
 CREATE OR REPLACE VIEW v_orders_to_ship_this_week AS
@@ -132,9 +135,8 @@ WHERE il.quantity < p.reorder_point;
 CREATE OR REPLACE VIEW v_products_out_of_stock AS
 SELECT p.*
 FROM Product p
-LEFT JOIN Inventory_Lot il ON il.product_id = p.product_id
-GROUP BY p.product_id
-HAVING COALESCE(SUM(il.quantity), 0) = 0;
+LEFT JOIN Product_Stock ps ON ps.product_id = p.product_id
+WHERE COALESCE(ps.on_hand, 0) = 0;
 
 /* ==========庫存批號即將到期 (30 天內) ========== */
 CREATE OR REPLACE VIEW v_lot_expiry_alert AS
@@ -170,9 +172,9 @@ HAVING COALESCE(MAX(o.order_date), '1900-01-01') < CURDATE() - INTERVAL 60 DAY;
 CREATE OR REPLACE VIEW v_inventory_by_category AS
 SELECT
   p.category,
-  SUM(il.quantity) AS total_qty
+  SUM(ps.on_hand) AS total_qty
 FROM Product p
-LEFT JOIN Inventory_Lot il ON il.product_id = p.product_id
+LEFT JOIN Product_Stock ps ON ps.product_id = p.product_id
 GROUP BY p.category;
 
 
@@ -190,16 +192,15 @@ WITH shipped_30d AS (
 SELECT
   p.product_id,
   p.name,
-  COALESCE(SUM(il.quantity),0)                 AS on_hand,
+  COALESCE(ps.on_hand,0)                       AS on_hand,
   COALESCE(s.sold_qty_30d,0)                   AS sold_30d,
   CASE
     WHEN COALESCE(s.sold_qty_30d,0) = 0 THEN NULL
-    ELSE ROUND( (SUM(il.quantity) / s.sold_qty_30d) * 30 , 1 )
+    ELSE ROUND( (ps.on_hand / s.sold_qty_30d) * 30 , 1 )
   END AS days_of_supply
 FROM Product p
-LEFT JOIN Inventory_Lot il ON il.product_id = p.product_id
-LEFT JOIN shipped_30d s     ON s.product_id = p.product_id
-GROUP BY p.product_id;
+LEFT JOIN Product_Stock ps ON ps.product_id = p.product_id
+LEFT JOIN shipped_30d s     ON s.product_id = p.product_id;
 
 --報廢與異常--
 /* ========== 產品報廢率 (%) ========== */
@@ -236,7 +237,8 @@ SELECT
   SUM(estimated_value)             AS total_scrap_cost,
   COUNT(*)                         AS scrap_records
 FROM Scrap
-WHERE DATE_FORMAT(scrap_date,'%Y-%m') = DATE_FORMAT(CURDATE(),'%Y-%m')
+WHERE scrap_date >= DATE_FORMAT(CURDATE(),'%Y-%m-01')
+  AND scrap_date < DATE_FORMAT(CURDATE(),'%Y-%m-01') + INTERVAL 1 MONTH
 GROUP BY DATE_FORMAT(scrap_date,'%Y-%m');
 
 
@@ -246,11 +248,9 @@ SELECT
   l.location_id,
   l.location_code,
   l.capacity,
-  COALESCE(SUM(il.quantity),0) AS occupied
+  l.current_stock AS occupied
 FROM Location l
-LEFT JOIN Inventory_Lot il ON il.location_id = l.location_id
-GROUP BY l.location_id, l.capacity
-HAVING occupied >= l.capacity;
+WHERE l.current_stock >= l.capacity;
 
 
 --供應商與物流--